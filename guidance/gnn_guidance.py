@@ -15,6 +15,7 @@ from gnn.gnn_dataset import GraphDictDataset, graph_batch_collate
 from gnn.gnn_utils import train_model, get_single_model_prediction
 from guidance import BaseSearchGuidance
 from planning import PlanningTimeout, PlanningFailure
+from planning import tracing
 
 
 class GNNSearchGuidance(BaseSearchGuidance):
@@ -100,9 +101,11 @@ class GNNSearchGuidance(BaseSearchGuidance):
     def score_object(self, obj, state):
         if state != self._last_processed_state:
             # Create input graph from state
-            graph, node_to_objects = self._state_to_graph(state)
+            with tracing.span("gnn_featurize", num_objects=len(state.objects)):
+                graph, node_to_objects = self._state_to_graph(state)
             # Predict graph
-            prediction = self._predict_graph(graph)
+            with tracing.span("gnn_predict"):
+                prediction = self._predict_graph(graph)
             # Derive object scores
             object_scores = {o: prediction["nodes"][n][0]
                              for n, o in node_to_objects.items()}
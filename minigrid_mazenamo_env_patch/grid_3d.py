@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import math
+from copy import copy
 from typing import Any, Callable
 
 import numpy as np
@@ -17,14 +18,29 @@ from minigrid.utils.rendering import (
 )
 
 
+# Encoding of a cell without object
+EMPTY_ENCODING = (OBJECT_TO_IDX["empty"], 0, 0)
+# Agent direction code of the cells without the agent, see Grid.render
+NO_AGENT = 4
+
+
 class Grid:
     """
     Represent a grid and operations on it
+
+    Besides the objects, the grid keeps their encoding in a NumPy array,
+    which set() updates, so encode(), copy() and render() work on arrays.
+    An object whose encoding changes in place must be set again.
     """
 
     # Static cache of pre-renderer tiles
     tile_cache: dict[tuple[Any, ...], Any] = {}
 
+    # Pre-rendered tiles per tile size, stacked in one array, and the index
+    # of the tile of each cell key (see render) in that array
+    tile_atlas: dict[int, np.ndarray] = {}
+    atlas_index: dict[tuple[int, int], int] = {}
+
     def __init__(self, width: int, height: int):
         assert width >= 3
         assert height >= 3
@@ -33,6 +49,9 @@ class Grid:
         self.height: int = height
 
         self.grid: list[WorldObj | None | list[WorldObj]] = [None] * (width * height)
+        # Encoding of the top object of each cell, indexed by [i, j]
+        self.encoding: np.ndarray = np.empty((width, height, 3), dtype=np.uint8)
+        self.encoding[:, :] = EMPTY_ENCODING
 
     def __contains__(self, key: Any) -> bool:
         if isinstance(key, WorldObj):
@@ -61,17 +80,37 @@ class Grid:
         return False
 
     def __eq__(self, other: Grid) -> bool:
-        grid1 = self.encode()
-        grid2 = other.encode()
-        return np.array_equal(grid2, grid1)
+        return np.array_equal(other.encoding, self.encoding)
 
     def __ne__(self, other: Grid) -> bool:
         return not self == other
 
     def copy(self) -> Grid:
-        from copy import deepcopy
+        """
+        Copy the grid and its objects, visiting only the occupied cells
+
+        Objects are copied shallowly, so their attributes can be set
+        independently of the original ones; an object in several cells is
+        copied once.
+        """
 
-        return deepcopy(self)
+        grid = Grid(self.width, self.height)
+        grid.encoding[:] = self.encoding
+        copies: dict[int, WorldObj] = {}
+
+        def copy_obj(obj: WorldObj) -> WorldObj:
+            if id(obj) not in copies:
+                copies[id(obj)] = copy(obj)
+            return copies[id(obj)]
+
+        occupied = self.encoding[:, :, 0].T.ravel() != OBJECT_TO_IDX["empty"]
+        for idx in np.flatnonzero(occupied).tolist():
+            cell = self.grid[idx]
+            if isinstance(cell, list):
+                grid.grid[idx] = [copy_obj(obj) for obj in cell]
+            else:
+                grid.grid[idx] = copy_obj(cell)
+        return grid
 
     def set(self, i: int, j: int, v: WorldObj | None | list[WorldObj]):
         assert (
@@ -81,6 +120,12 @@ class Grid:
             0 <= j < self.height
         ), f"row index {j} outside of grid of height {self.height}"
         self.grid[j * self.width + i] = v
+        if v is None:
+            self.encoding[i, j] = EMPTY_ENCODING
+        elif isinstance(v, list):
+            self.encoding[i, j] = v[-1].encode()
+        else:
+            self.encoding[i, j] = v.encode()
 
     def get(self, i: int, j: int) -> WorldObj | None | list[WorldObj]:
         assert 0 <= i < self.width
@@ -219,46 +264,74 @@ class Grid:
         Render this grid at a given scale
         :param r: target renderer object
         :param tile_size: tile size in pixels
-        """
 
-        if highlight_mask is None:
-            highlight_mask = np.zeros(shape=(self.width, self.height), dtype=bool)
+        Each cell is given an integer key from its encoding, the agent
+        direction and its highlight. The tiles of new keys are rendered once
+        into the atlas, and the frame is then gathered from the atlas with
+        one fancy indexing operation.
+        """
 
-        # Compute the total grid size
-        width_px = self.width * tile_size
-        height_px = self.height * tile_size
+        # Key of each cell, indexed by [i, j]
+        encoding = self.encoding.astype(np.int64)
+        keys = (encoding[:, :, 0] << 16) | (encoding[:, :, 1] << 8) | encoding[:, :, 2]
+        agent = np.full((self.width, self.height), NO_AGENT, dtype=np.int64)
+        if (
+            agent_dir is not None
+            and 0 <= agent_pos[0] < self.width
+            and 0 <= agent_pos[1] < self.height
+        ):
+            agent[agent_pos[0], agent_pos[1]] = agent_dir
+        keys = keys * (NO_AGENT + 1) + agent
+        if highlight_mask is not None:
+            keys = keys * 2 + highlight_mask
+        else:
+            keys = keys * 2
+
+        unique_keys, first, inverse = np.unique(
+            keys, return_index=True, return_inverse=True
+        )
+        tile_ids = np.array(
+            [
+                self._atlas_tile(key, idx, tile_size)
+                for key, idx in zip(unique_keys.tolist(), first.tolist())
+            ]
+        )
 
-        img = np.zeros(shape=(height_px, width_px, 3), dtype=np.uint8)
+        # Pixel row r of the tiles of row j of the grid is gathered from row r
+        # of their atlas tiles, so the frame comes out in its final layout.
+        atlas = Grid.tile_atlas[tile_size]
+        atlas = atlas.reshape(len(atlas), tile_size, tile_size * 3)
+        cell_tiles = tile_ids[inverse.reshape(keys.shape).T]
+        rows = np.arange(tile_size)
+        img = atlas[cell_tiles[:, np.newaxis, :], rows[np.newaxis, :, np.newaxis]]
+        return img.reshape(self.height * tile_size, self.width * tile_size, 3)
 
-        # Render the grid
-        for j in range(0, self.height):
-            for i in range(0, self.width):
-                cell = self.get(i, j)
+    def _atlas_tile(self, key: int, idx: int, tile_size: int) -> int:
+        """
+        Index in the atlas of the tile of a cell key, rendering it if needed
+        :param idx: flat index into the [i, j] array of a cell with this key
+        """
 
-                agent_here = np.array_equal(agent_pos, (i, j))
-                assert highlight_mask is not None
-                if isinstance(cell, list):
-                    tile_img = Grid.render_tile(
-                        cell[-1],
-                        agent_dir=agent_dir if agent_here else None,
-                        highlight=highlight_mask[i, j],
-                        tile_size=tile_size,
-                    )
-                else:
-                    tile_img = Grid.render_tile(
-                        cell,
-                        agent_dir=agent_dir if agent_here else None,
-                        highlight=highlight_mask[i, j],
-                        tile_size=tile_size,
-                    )
-
-                ymin = j * tile_size
-                ymax = (j + 1) * tile_size
-                xmin = i * tile_size
-                xmax = (i + 1) * tile_size
-                img[ymin:ymax, xmin:xmax, :] = tile_img
+        atlas_key = (key, tile_size)
+        if atlas_key in Grid.atlas_index:
+            return Grid.atlas_index[atlas_key]
+
+        cell = self.get(idx // self.height, idx % self.height)
+        agent_dir = key // 2 % (NO_AGENT + 1)
+        tile_img = Grid.render_tile(
+            cell[-1] if isinstance(cell, list) else cell,
+            agent_dir=None if agent_dir == NO_AGENT else agent_dir,
+            highlight=bool(key % 2),
+            tile_size=tile_size,
+        )
 
-        return img
+        tile_img = np.asarray(tile_img).astype(np.uint8)[np.newaxis]
+        atlas = Grid.tile_atlas.get(tile_size)
+        Grid.tile_atlas[tile_size] = (
+            tile_img if atlas is None else np.concatenate([atlas, tile_img])
+        )
+        Grid.atlas_index[atlas_key] = len(Grid.tile_atlas[tile_size]) - 1
+        return Grid.atlas_index[atlas_key]
 
     def encode(self, vis_mask: np.ndarray | None = None) -> np.ndarray:
         """
@@ -266,26 +339,10 @@ class Grid:
         """
 
         if vis_mask is None:
-            vis_mask = np.ones((self.width, self.height), dtype=bool)
+            return self.encoding.copy()
 
-        array = np.zeros((self.width, self.height, 3), dtype="uint8")
-
-        for i in range(self.width):
-            for j in range(self.height):
-                assert vis_mask is not None
-                if vis_mask[i, j]:
-                    v = self.get(i, j)
-
-                    if v is None:
-                        array[i, j, 0] = OBJECT_TO_IDX["empty"]
-                        array[i, j, 1] = 0
-                        array[i, j, 2] = 0
-                    elif isinstance(v, list):
-                        array[i, j, :] = v[-1].encode()
-                    else:
-                        array[i, j, :] = v.encode()
-
-        return array
+        # Cells outside of the mask are left as zeros
+        return np.where(vis_mask[:, :, np.newaxis], self.encoding, 0).astype(np.uint8)
 
     @staticmethod
     def decode(array: np.ndarray) -> tuple[Grid, np.ndarray]:
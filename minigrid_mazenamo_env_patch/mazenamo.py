@@ -10,6 +10,22 @@ import numpy as np
 from enum import IntEnum
 from gymnasium import spaces
 
+# Cell values of a MazeNamo grid array
+EMPTY = 0
+WALL = 1
+HEAVY_OBJECT = 2
+LIGHT_OBJECT = 3
+ROBOT = 4
+GOAL = 5
+
+# Object placed on the cells of each value
+CELL_OBJECTS = {
+    WALL: Wall,
+    HEAVY_OBJECT: lambda: MoveableHeavyBox("blue"),
+    LIGHT_OBJECT: lambda: MoveableLightBox("yellow"),
+    GOAL: Goal,
+}
+
 class Actions(IntEnum):
     # Turn left, turn right, move forward
     left = 0
@@ -72,6 +88,12 @@ class MazeNamoEnv(MiniGridEnv):
 
     - `MiniGrid-Namo-v0`
 
+    ## Grid
+
+    The layout is a `(width, height)` integer array of the cell values above,
+    indexed by `[x, y]`. Pass it with `reset(options={"grid": grid})`, the
+    `grid` argument of the constructor or `gen_grid`; later resets reuse it.
+
     """
 
     def __init__(
@@ -81,10 +103,12 @@ class MazeNamoEnv(MiniGridEnv):
         agent_start_dir=0,
         agent_view_size=5,
         max_steps: int | None = None,
+        grid: np.ndarray | None = None,
         **kwargs,
     ):
         self.agent_start_pos = agent_start_pos
         self.agent_start_dir = agent_start_dir
+        self.grid_array = None if grid is None else np.asarray(grid)
 
         mission_space = MissionSpace(mission_func=self._gen_mission)
 
@@ -108,40 +132,54 @@ class MazeNamoEnv(MiniGridEnv):
         # Actions are discrete integer values
         self.action_space = spaces.Discrete(len(self.actions))
 
-    def gen_grid(self, width, height):
+    def gen_grid(self, width, height, grid: np.ndarray | None = None):
+        if grid is not None:
+            self.grid_array = np.asarray(grid)
         self._gen_grid(width, height)
 
+    def reset(
+        self,
+        *,
+        seed: int | None = None,
+        options: dict[str, Any] | None = None,
+    ) -> tuple[ObsType, dict[str, Any]]:
+        if options is not None and options.get("grid") is not None:
+            self.grid_array = np.asarray(options["grid"])
+        return super().reset(seed=seed, options=options)
+
     @staticmethod
     def _gen_mission():
         return "get to the green goal square"
 
     def _gen_grid(self, width, height):
-        EMPTY = 0
-        WALL = 1
-        HEAVY_OBJECT = 2
-        LIGHT_OBJECT = 3
-        ROBOT = 4
-        GOAL = 5
-
-        grid_array = np.load("mazenamo_grid.npy")
+        if self.grid_array is None:
+            raise ValueError(
+                "No MazeNamo grid given, use reset(options={'grid': grid})"
+            )
+        assert self.grid_array.shape == (
+            width,
+            height,
+        ), f"grid of shape {self.grid_array.shape} for a {width}x{height} env"
+
+        # Cell values in the order of Grid.grid, i.e. cell (i, j) at j * width + i
+        cells = self.grid_array.T.ravel()
 
         # Create an empty grid
         self.grid = Grid(width, height)
 
-        for i in range(width):
-            for j in range(height):
-                if grid_array[i][j] == WALL:
-                    self.put_obj(Wall(), i, j)
-                elif grid_array[i][j] == HEAVY_OBJECT:
-                    self.put_obj(MoveableHeavyBox("blue"), i, j)
-                elif grid_array[i][j] == LIGHT_OBJECT:
-                    self.put_obj(MoveableLightBox("yellow"), i, j)
-                elif grid_array[i][j] == ROBOT:
-                    self.agent_pos = (i, j)
-                    self.agent_dir = self.agent_start_dir
-                elif grid_array[i][j] == GOAL:
-                    self.put_obj(Goal(), i, j)
-                    self.goal_pos = (i, j)
+        # Only the cells holding an object are visited
+        for idx in np.flatnonzero(np.isin(cells, list(CELL_OBJECTS))).tolist():
+            obj = CELL_OBJECTS[cells[idx]]()
+            obj.init_pos = obj.cur_pos = (idx % width, idx // width)
+            self.grid.set(*obj.cur_pos, obj)
+
+        robot = np.flatnonzero(cells == ROBOT)
+        if len(robot):
+            self.agent_pos = (int(robot[-1] % width), int(robot[-1] // width))
+            self.agent_dir = self.agent_start_dir
+        goal = np.flatnonzero(cells == GOAL)
+        if len(goal):
+            self.goal_pos = (int(goal[-1] % width), int(goal[-1] // width))
 
         self.mission = "get to the green goal square"
 
@@ -15,8 +15,10 @@ Usage example:
 >>> action = env.action_space.sample()
 >>> obs, reward, done, debug_info = env.step(action)
 """
-from pddlgym.parser import PDDLDomainParser, PDDLProblemParser, PDDLParser
+from pddlgym.parser import (PDDLDomainParser, PDDLParser,
+                            LazyPDDLProblemParser, PROBLEM_CACHE_DIR, domain_hash)
 from pddlgym.inference import find_satisfying_assignments, check_goal
+from pddlgym.derived import DerivedLiteralEvaluator
 from pddlgym.structs import ground_literal, Literal, State, ProbabilisticEffect, LiteralConjunction
 from pddlgym.spaces import LiteralSpace, LiteralSetSpace, LiteralActionSpace
 
@@ -220,11 +222,20 @@ class PDDLEnv(gym.Env):
     dynamic_action_space : bool
         Let self.action_space dynamically change on each iteration to
         include only valid actions (must match operator preconditions).
+    problem_cache_dir : str or None
+        Directory for the on-disk cache of parsed problems, or None to
+        always parse problem files.
+    prune_static_groundings : bool
+        If True, the ground actions of a LiteralSpace action space are
+        restricted to those whose static operator preconditions hold in
+        the problem. Other actions can never be applied.
     """
     def __init__(self, domain_file, problem_dir, render=None, seed=0,
                  raise_error_on_invalid_action=False,
                  operators_as_actions=False,
-                 dynamic_action_space=False):
+                 dynamic_action_space=False,
+                 problem_cache_dir=PROBLEM_CACHE_DIR,
+                 prune_static_groundings=False):
         self._state = None
         self._domain_file = domain_file
         self._problem_dir = problem_dir
@@ -240,16 +251,25 @@ class PDDLEnv(gym.Env):
 
         # Parse the PDDL files
         self.domain, self.problems = self.load_pddl(domain_file, problem_dir,
-            operators_as_actions=self.operators_as_actions)
+            operators_as_actions=self.operators_as_actions,
+            problem_cache_dir=problem_cache_dir)
 
         # Determine if the domain is STRIPS
         self._domain_is_strips = _check_domain_for_strips(self.domain)
         self._inference_mode = "csp" if self._domain_is_strips else "prolog"
 
+        # Derived predicates are maintained incrementally when possible
+        self._has_derived_predicates = any(
+            p.is_derived for p in self.domain.predicates.values())
+        self._derived_evaluator = None
+        if self._has_derived_predicates and DerivedLiteralEvaluator.supports(self.domain):
+            self._derived_evaluator = DerivedLiteralEvaluator(self.domain)
+
         # Initialize action space with problem-independent components
         actions = list(self.domain.actions)
         self.action_predicates = [self.domain.predicates[a] for a in actions]
         self._dynamic_action_space = dynamic_action_space
+        static_domain = self.domain if prune_static_groundings else None
         if dynamic_action_space:
             if self.domain.operators_as_actions and self._domain_is_strips:
                 self._action_space = LiteralActionSpace(
@@ -260,11 +280,13 @@ class PDDLEnv(gym.Env):
                 self._action_space = LiteralSpace(
                     self.action_predicates, lit_valid_test=self._action_valid_test,
                     type_hierarchy=self.domain.type_hierarchy,
-                    type_to_parent_types=self.domain.type_to_parent_types)
+                    type_to_parent_types=self.domain.type_to_parent_types,
+                    domain=static_domain)
 
         else:
             self._action_space = LiteralSpace(self.action_predicates,
-                type_to_parent_types=self.domain.type_to_parent_types)
+                type_to_parent_types=self.domain.type_to_parent_types,
+                domain=static_domain)
 
         # Initialize observation space with problem-independent components
         self._observation_space = LiteralSetSpace(
@@ -273,9 +295,12 @@ class PDDLEnv(gym.Env):
             type_to_parent_types=self.domain.type_to_parent_types)
 
     @staticmethod
-    def load_pddl(domain_file, problem_dir, operators_as_actions=False):
+    def load_pddl(domain_file, problem_dir, operators_as_actions=False,
+                  problem_cache_dir=None):
         """
-        Parse domain and problem PDDL files.
+        Parse the domain PDDL file and create lazy handles for the problem
+        PDDL files, which are parsed (or read from problem_cache_dir) on
+        first use.
 
         Parameters
         ----------
@@ -285,20 +310,24 @@ class PDDLEnv(gym.Env):
             Path to a directory of PDDL problem files.
         operators_as_actions : bool
             See class docstirng.
+        problem_cache_dir : str or None
+            See class docstring.
 
         Returns
         -------
         domain : PDDLDomainParser
-        problems : [ PDDLProblemParser ]
+        problems : [ LazyPDDLProblemParser ]
         """
         domain = PDDLDomainParser(domain_file, 
             expect_action_preds=(not operators_as_actions),
             operators_as_actions=operators_as_actions)
+        dom_hash = domain_hash(domain) if problem_cache_dir is not None else None
         problems = []
         problem_files = [f for f in glob.glob(os.path.join(problem_dir, "*.pddl"))]
         for problem_file in sorted(problem_files):
-            problem = PDDLProblemParser(problem_file, domain.domain_name, 
-                domain.types, domain.predicates, domain.actions, domain.constants)
+            problem = LazyPDDLProblemParser(problem_file, domain.domain_name, 
+                domain.types, domain.predicates, domain.actions, domain.constants,
+                cache_dir=problem_cache_dir, domain_hash=dom_hash)
             problems.append(problem)
         return domain, problems
 
@@ -446,6 +475,12 @@ class PDDLEnv(gym.Env):
             return self._render(self._state.literals, *args, **kwargs)
 
     def _handle_derived_literals(self, state):
+        if not self._has_derived_predicates:
+            return state
+        if self._derived_evaluator is not None:
+            # Only propagates the base literals that changed since the
+            # previously evaluated state (semi-naive insertion, DRed deletion)
+            return self._derived_evaluator(state)
         # first remove any old derived literals since they're outdated
         to_remove = set()
         for lit in state.literals:
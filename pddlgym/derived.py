@@ -0,0 +1,382 @@
+"""Incremental evaluation of derived predicates.
+
+Derived predicates whose bodies are (disjunctions of, optionally
+existentially quantified) conjunctions of literals form a Datalog program
+in which negation only touches non-derived predicates. For such domains,
+DerivedLiteralEvaluator maintains the derived literals across transitions:
+insertions are propagated semi-naively from the changed facts only, and
+deletions use DRed (over-delete, then re-derive).
+
+Domains with other derived predicate bodies (forall, nested disjunctions,
+negated derived predicates) are not supported; see
+DerivedLiteralEvaluator.supports.
+"""
+from pddlgym.structs import Literal, LiteralConjunction, LiteralDisjunction, Exists
+
+from collections import defaultdict
+
+
+class _DerivedRule:
+    """One conjunctive rule `head(head_vars) :- pos_lits, not neg_lits`.
+    """
+    def __init__(self, head, head_vars, pos_lits, neg_lits):
+        self.head = head
+        self.head_vars = head_vars
+        self.pos_lits = pos_lits
+        # Negative literals are stored in their positive form
+        self.neg_lits = neg_lits
+        bound = {v for lit in pos_lits for v in lit.variables}
+        # Variables that no positive literal binds must be enumerated
+        self.unbound_vars = sorted({v for lit in neg_lits for v in lit.variables
+                                    if _is_variable(v) and v not in bound} |
+                                   {v for v in head_vars if v not in bound})
+
+
+def _is_variable(term):
+    return term.startswith("?")
+
+
+class DerivedLiteralEvaluator:
+    """Maintain the derived literals of a sequence of states.
+
+    Parameters
+    ----------
+    domain : PDDLDomain
+        The domain whose derived predicates are evaluated.
+        Must satisfy DerivedLiteralEvaluator.supports(domain).
+    """
+    def __init__(self, domain):
+        assert self.supports(domain)
+        self._type_to_parent_types = domain.type_to_parent_types
+        self._constants = list(domain.constants or [])
+        self._derived_names = {p.name for p in domain.predicates.values()
+                               if p.is_derived}
+        self._rules = []
+        for pred in domain.predicates.values():
+            if not pred.is_derived:
+                continue
+            head_vars = [param_type(param_name) for param_name, param_type
+                         in zip(pred.param_names, pred.var_types)]
+            for pos_lits, neg_lits in self._body_to_clauses(pred.body):
+                self._rules.append(_DerivedRule(pred, head_vars, pos_lits, neg_lits))
+        # Predicate name -> [(rule, literal index)]
+        self._pos_occurrences = defaultdict(list)
+        self._neg_occurrences = defaultdict(list)
+        self._rules_by_head = defaultdict(list)
+        for rule in self._rules:
+            for i, lit in enumerate(rule.pos_lits):
+                self._pos_occurrences[lit.predicate.name].append((rule, i))
+            for i, lit in enumerate(rule.neg_lits):
+                self._neg_occurrences[lit.predicate.name].append((rule, i))
+            self._rules_by_head[rule.head.name].append(rule)
+        self._reset(None)
+
+    @classmethod
+    def supports(cls, domain):
+        """Whether every derived predicate of the domain can be evaluated
+        incrementally.
+        """
+        derived_names = {p.name for p in domain.predicates.values() if p.is_derived}
+        for pred in domain.predicates.values():
+            if not pred.is_derived:
+                continue
+            clauses = cls._body_to_clauses(pred.body)
+            if clauses is None:
+                return False
+            for _, neg_lits in clauses:
+                if any(lit.predicate.name in derived_names for lit in neg_lits):
+                    return False
+        return True
+
+    @classmethod
+    def _body_to_clauses(cls, body):
+        """Flatten a body into [(pos_lits, neg_lits)], or None if unsupported.
+        """
+        if isinstance(body, LiteralDisjunction):
+            clauses = []
+            for disjunct in body.literals:
+                disjunct_clauses = cls._body_to_clauses(disjunct)
+                if disjunct_clauses is None:
+                    return None
+                clauses.extend(disjunct_clauses)
+            return clauses
+        if isinstance(body, Exists):
+            if body.is_negative:
+                return None
+            return cls._body_to_clauses(body.body)
+        if isinstance(body, Literal):
+            body = LiteralConjunction([body])
+        if not isinstance(body, LiteralConjunction):
+            return None
+        pos_lits, neg_lits = [], []
+        for lit in body.literals:
+            if isinstance(lit, Exists) and not lit.is_negative:
+                sub_clauses = cls._body_to_clauses(lit.body)
+                if sub_clauses is None or len(sub_clauses) != 1:
+                    return None
+                pos_lits.extend(sub_clauses[0][0])
+                neg_lits.extend(sub_clauses[0][1])
+                continue
+            if not isinstance(lit, Literal) or lit.negated_as_failure or lit.is_anti:
+                return None
+            if lit.is_negative:
+                neg_lits.append(lit.positive)
+            else:
+                pos_lits.append(lit)
+        return [(pos_lits, neg_lits)]
+
+    def _reset(self, objects):
+        self._objects = objects
+        # Base literals of the last evaluated state, None before the first
+        self._base = None
+        # Derived literals of the last evaluated state
+        self._derived = set()
+        # Predicate name -> set of argument tuples (base and derived)
+        self._facts = defaultdict(set)
+        # (predicate name, argument index, object) -> set of argument tuples
+        self._index = defaultdict(set)
+        # (predicate name, argument tuple) -> derived Literal
+        self._derived_literals = {}
+        self._type_to_objs = None
+        if objects is not None:
+            self._type_to_objs = defaultdict(list)
+            for obj in sorted(set(objects) | set(self._constants)):
+                for t in self._type_to_parent_types.get(obj.var_type, {obj.var_type}):
+                    self._type_to_objs[t].append(obj)
+
+    def __call__(self, state):
+        """Return the state with its derived literals brought up to date.
+
+        The first state of an object set is evaluated in full; after that,
+        only the difference between the base literals of this state and of
+        the previously evaluated state is propagated.
+        """
+        if state.objects is not self._objects and state.objects != self._objects:
+            self._reset(state.objects)
+        if self._base is None:
+            base = frozenset(lit for lit in state.literals
+                             if lit.predicate.name not in self._derived_names)
+            self._evaluate(base)
+            self._base = base
+            return state.with_literals(base | self._derived)
+        base = state.literals - self._derived
+        added = base - self._base
+        # Drop stale derived literals that the given state carried over
+        stale = {lit for lit in added if lit.predicate.name in self._derived_names}
+        if stale:
+            base = base - stale
+            added = added - stale
+        deleted = self._base - base
+        if added or deleted:
+            self._update(added, deleted)
+            self._base = base
+        return state.with_literals(base | self._derived)
+
+    ### Fact store ###
+    def _add_fact(self, name, args):
+        self._facts[name].add(args)
+        for i, obj in enumerate(args):
+            self._index[(name, i, obj)].add(args)
+
+    def _remove_fact(self, name, args):
+        self._facts[name].discard(args)
+        for i, obj in enumerate(args):
+            self._index[(name, i, obj)].discard(args)
+
+    def _has_fact(self, name, args):
+        return args in self._facts[name]
+
+    ### Maintenance ###
+    def _evaluate(self, base):
+        """Derive all literals of the first state from scratch.
+
+        Every rule is joined against the base facts, so rules without
+        positive literals, e.g. `(free ?a) :- (not (blocked ?a))`, hold from
+        the start; the derived facts are then propagated semi-naively.
+        """
+        for lit in base:
+            self._add_fact(lit.predicate.name, tuple(lit.variables))
+        delta = {self._head(rule, binding) for rule in self._rules
+                 for binding in self._join(rule, rule.pos_lits, {})}
+        self._add_derived_literals(self._propagate(delta))
+
+    def _update(self, added, deleted):
+        added = [(lit.predicate.name, tuple(lit.variables)) for lit in added]
+        deleted = [(lit.predicate.name, tuple(lit.variables)) for lit in deleted]
+
+        # DRed step 1: over-delete everything with a derivation that used a
+        # deleted fact, or a negative literal falsified by an added fact.
+        overdeleted = set()
+        frontier = set()
+        for name, args in deleted:
+            frontier.update(self._fire_positive(name, args))
+        for name, args in added:
+            frontier.update(self._fire_negative(name, args))
+        while frontier:
+            frontier = {fact for fact in frontier if fact not in overdeleted
+                        and self._has_fact(*fact)}
+            overdeleted.update(frontier)
+            new_frontier = set()
+            for name, args in frontier:
+                new_frontier.update(self._fire_positive(name, args))
+            frontier = new_frontier
+
+        # Apply the base changes and drop the over-deleted facts.
+        for name, args in deleted:
+            self._remove_fact(name, args)
+        for name, args in added:
+            self._add_fact(name, args)
+        for name, args in overdeleted:
+            self._remove_fact(name, args)
+
+        # DRed step 2: re-derive over-deleted facts with other derivations.
+        rederived = [fact for fact in overdeleted if self._is_derivable(*fact)]
+        for name, args in rederived:
+            self._add_fact(name, args)
+
+        # Semi-naive insertion from the added, re-derived and enabled facts.
+        delta = set()
+        for name, args in added + rederived:
+            delta.update(self._fire_positive(name, args))
+        for name, args in deleted:
+            delta.update(self._fire_negative(name, args))
+        inserted = rederived + self._propagate(delta)
+
+        for fact in overdeleted:
+            if not self._has_fact(*fact):
+                self._derived.discard(self._derived_literals.pop(fact))
+        self._add_derived_literals(inserted)
+
+    def _propagate(self, delta):
+        """Insert the given derived facts and everything they derive.
+
+        Returns the facts that were not stored yet.
+        """
+        inserted = []
+        while delta:
+            delta = {fact for fact in delta if not self._has_fact(*fact)}
+            for name, args in delta:
+                self._add_fact(name, args)
+            inserted.extend(delta)
+            new_delta = set()
+            for name, args in delta:
+                new_delta.update(self._fire_positive(name, args))
+            delta = new_delta
+        return inserted
+
+    def _add_derived_literals(self, inserted):
+        for fact in inserted:
+            if fact not in self._derived_literals:
+                name, args = fact
+                lit = self._rules_by_head[name][0].head(*args)
+                self._derived_literals[fact] = lit
+                self._derived.add(lit)
+
+    def _fire_positive(self, name, args):
+        """Heads of rules with a positive literal matched by the given fact.
+        """
+        for rule, i in self._pos_occurrences.get(name, ()):
+            binding = self._bind(rule.pos_lits[i], args, {})
+            if binding is None:
+                continue
+            others = rule.pos_lits[:i] + rule.pos_lits[i+1:]
+            for full_binding in self._join(rule, others, binding):
+                yield self._head(rule, full_binding)
+
+    def _fire_negative(self, name, args):
+        """Heads of rules with a negative literal matched by the given fact,
+        evaluated as if that negative literal held.
+        """
+        for rule, i in self._neg_occurrences.get(name, ()):
+            binding = self._bind(rule.neg_lits[i], args, {})
+            if binding is None:
+                continue
+            others = rule.neg_lits[:i] + rule.neg_lits[i+1:]
+            for full_binding in self._join(rule, rule.pos_lits, binding,
+                                           neg_lits=others):
+                yield self._head(rule, full_binding)
+
+    def _is_derivable(self, name, args):
+        for rule in self._rules_by_head[name]:
+            binding = {}
+            for var, obj in zip(rule.head_vars, args):
+                if binding.setdefault(var, obj) != obj:
+                    break
+            else:
+                for _ in self._join(rule, rule.pos_lits, binding):
+                    return True
+        return False
+
+    @staticmethod
+    def _head(rule, binding):
+        return (rule.head.name, tuple(binding[v] for v in rule.head_vars))
+
+    ### Joins ###
+    def _type_matches(self, obj, var):
+        parents = self._type_to_parent_types.get(obj.var_type)
+        if parents is None:
+            return obj.var_type == var.var_type
+        return var.var_type in parents
+
+    def _bind(self, lit, args, binding):
+        """Extend binding so that lit matches args, or return None.
+        """
+        binding = dict(binding)
+        for term, obj in zip(lit.variables, args):
+            if not _is_variable(term):
+                if term != obj:
+                    return None
+            elif term in binding:
+                if binding[term] != obj:
+                    return None
+            elif self._type_matches(obj, term):
+                binding[term] = obj
+            else:
+                return None
+        return binding
+
+    def _ground_args(self, lit, binding):
+        return tuple(binding[t] if _is_variable(t) else t for t in lit.variables)
+
+    def _candidates(self, lit, binding):
+        name = lit.predicate.name
+        best = None
+        for i, term in enumerate(lit.variables):
+            if _is_variable(term):
+                if term not in binding:
+                    continue
+                obj = binding[term]
+            else:
+                obj = term
+            matches = self._index.get((name, i, obj), ())
+            if best is None or len(matches) < len(best):
+                best = matches
+        if best is None:
+            best = self._facts.get(name, ())
+        return best
+
+    def _join(self, rule, pos_lits, binding, neg_lits=None):
+        """Yield complete bindings for the rule extending the given one.
+        """
+        if neg_lits is None:
+            neg_lits = rule.neg_lits
+        if pos_lits:
+            # Evaluate the most constrained literal first
+            lit = max(pos_lits, key=lambda l: sum(1 for t in l.variables
+                                                  if not _is_variable(t) or t in binding))
+            rest = [l for l in pos_lits if l is not lit]
+            for args in self._candidates(lit, binding):
+                new_binding = self._bind(lit, args, binding)
+                if new_binding is not None:
+                    yield from self._join(rule, rest, new_binding, neg_lits)
+            return
+        unbound = [v for v in rule.unbound_vars if v not in binding]
+        if unbound:
+            var = unbound[0]
+            for obj in self._type_to_objs.get(var.var_type, ()):
+                yield from self._join(rule, pos_lits, {**binding, var: obj}, neg_lits)
+            return
+        for lit in neg_lits:
+            if self._has_fact(lit.predicate.name, self._ground_args(lit, binding)):
+                return
+        yield binding
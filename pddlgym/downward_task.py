@@ -0,0 +1,124 @@
+"""Build Fast Downward translator tasks directly from pddlgym structs.
+
+The translator normally reads a domain and a problem file. DownwardTaskBuilder
+instead converts a PDDLDomain once and then turns States into
+downward_translate.pddl.Task objects in memory, so that grounding needs
+neither temporary files nor re-parsing of the problem.
+"""
+from pddlgym.structs import Literal, LiteralConjunction, LiteralDisjunction, \
+    ForAll, Exists
+from pddlgym.downward_translate import normalize
+from pddlgym.downward_translate import pddl
+from pddlgym.downward_translate import relevance
+from pddlgym.downward_translate.pddl_parser import lisp_parser
+from pddlgym.downward_translate.pddl_parser import parsing_functions
+from pddlgym.downward_translate.pddl_parser import pddl_file
+
+
+class DownwardTaskBuilder:
+    """Convert States of one domain into translator tasks.
+
+    Parameters
+    ----------
+    domain : PDDLDomain or str
+        The domain of all states passed to the builder, or its file name.
+    """
+    def __init__(self, domain):
+        self.domain = domain
+        # The translator normalizes tasks in place, so only the nested list
+        # form of the domain is cached and a fresh copy is built per task.
+        if isinstance(domain, str):
+            self._domain_pddl = pddl_file.parse_pddl_file("domain", domain)
+        else:
+            self._domain_pddl = lisp_parser.parse_nested_list(
+                domain.pddl_str().splitlines())
+
+    def __call__(self, state, task_name="myproblem"):
+        """Create a translator task for the given state.
+        """
+        (domain_name, requirements, types, type_dict, constants, predicates,
+         predicate_dict, functions, actions, axioms) = \
+            parsing_functions.parse_domain_pddl(self._domain_pddl)
+
+        # pddlgym gives the objects of untyped domains the type "default",
+        # which is only declared if the domain was written by pddlgym
+        default_type = "default" if "default" in type_dict else "object"
+        constant_names = {obj.name for obj in constants}
+        objects = list(constants)
+        for obj in sorted(state.objects):
+            if obj.name not in constant_names:
+                objects.append(pddl.TypedObject(
+                    obj.name, self._type_name(obj, default_type)))
+
+        init = set()
+        for lit in state.literals:
+            # Negative facts are implicit under the closed world assumption,
+            # and the translator adds the equality facts itself.
+            if lit.is_negative or lit.is_anti or lit.predicate.name == "=":
+                continue
+            init.add(pddl.Atom(lit.predicate.name, self._args(lit)))
+        init = list(init)
+        init += [pddl.Atom("=", (obj.name, obj.name)) for obj in objects]
+
+        goal = parsing_functions.parse_condition(
+            self._condition_to_nested_list(state.goal, default_type),
+            type_dict, predicate_dict)
+
+        return pddl.Task(
+            domain_name, task_name, requirements, types, objects,
+            predicates, functions, init, goal, actions, axioms, False)
+
+    def relevant_objects(self, state):
+        """Return the objects of the state that may contribute to reaching
+        its goal, according to the backward relevance analysis of the
+        translator.
+
+        The analysis over-approximates: an object is only discarded if no
+        chain of actions back from the goal can use it. It is much cheaper
+        than grounding, so planning.my_planner uses it to filter objects
+        before scoring them (relevance_prefilter).
+        """
+        task = self(state)
+        normalize.normalize(task)
+        names = relevance.analyze(task).objects
+        return frozenset(obj for obj in state.objects if obj.name in names)
+
+    @staticmethod
+    def _type_name(obj, default_type):
+        if obj.var_type == "default":
+            return default_type
+        return str(obj.var_type)
+
+    @staticmethod
+    def _args(lit):
+        return tuple(v.name if hasattr(v, "name") else str(v)
+                     for v in lit.variables)
+
+    @classmethod
+    def _condition_to_nested_list(cls, cond, default_type):
+        """Convert a goal to the nested list form read by the translator.
+        """
+        if isinstance(cond, Literal):
+            if cond.negated_as_failure:
+                raise NotImplementedError("Negation as failure in goal")
+            if cond.is_anti:
+                atom = [cond.predicate.inverted_anti.name] + list(cls._args(cond))
+                return ["not", atom]
+            atom = [cond.predicate.positive.name] + list(cls._args(cond))
+            if cond.is_negative:
+                return ["not", atom]
+            return atom
+        if isinstance(cond, LiteralConjunction):
+            return ["and"] + [cls._condition_to_nested_list(l, default_type) for l in cond.literals]
+        if isinstance(cond, LiteralDisjunction):
+            return ["or"] + [cls._condition_to_nested_list(l, default_type) for l in cond.literals]
+        if isinstance(cond, (ForAll, Exists)):
+            tag = "forall" if isinstance(cond, ForAll) else "exists"
+            params = []
+            for v in cond.variables:
+                params.extend([v.name, "-", cls._type_name(v, default_type)])
+            quantified = [tag, params, cls._condition_to_nested_list(cond.body, default_type)]
+            if cond.is_negative:
+                return ["not", quantified]
+            return quantified
+        raise NotImplementedError("Unsupported goal: {}".format(cond))
@@ -4,6 +4,7 @@
 import sys
 import itertools
 
+from . import options
 from . import pddl
 from . import timers
 from functools import reduce
@@ -297,6 +298,9 @@ class Queue:
         return result
 
 def compute_model(prog):
+    if options.model_engine == "relational":
+        from . import relational_model
+        return relational_model.compute_model(prog)
     with timers.timing("Preparing model"):
         rules = convert_rules(prog)
         unifier = Unifier(rules)
@@ -304,7 +308,7 @@ def compute_model(prog):
         fact_atoms = sorted(fact.atom for fact in prog.facts)
         queue = Queue(fact_atoms)
 
-    print("Generated %d rules." % len(rules))
+    timers.report("Generated %d rules." % len(rules), rules=len(rules))
     with timers.timing("Computing model"):
         relevant_atoms = 0
         auxiliary_atoms = 0
@@ -319,10 +323,14 @@ def compute_model(prog):
             for rule, cond_index in matches:
                 rule.update_index(next_atom, cond_index)
                 rule.fire(next_atom, cond_index, queue.push)
-    print("%d relevant atoms" % relevant_atoms)
-    print("%d auxiliary atoms" % auxiliary_atoms)
-    print("%d final queue length" % len(queue.queue))
-    print("%d total queue pushes" % queue.num_pushes)
+    timers.report("%d relevant atoms" % relevant_atoms,
+                  relevant_atoms=relevant_atoms)
+    timers.report("%d auxiliary atoms" % auxiliary_atoms,
+                  auxiliary_atoms=auxiliary_atoms)
+    timers.report("%d final queue length" % len(queue.queue),
+                  final_queue_length=len(queue.queue))
+    timers.report("%d total queue pushes" % queue.num_pushes,
+                  total_queue_pushes=queue.num_pushes)
     return queue.queue
 
 if __name__ == "__main__":
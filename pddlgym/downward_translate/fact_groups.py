@@ -74,7 +74,8 @@ def choose_groups(groups, reachable_facts):
         group = queue.pop()
         uncovered_facts.difference_update(group)
         result.append(group)
-    print(len(uncovered_facts), "uncovered facts")
+    timers.report("%d uncovered facts" % len(uncovered_facts),
+                  uncovered_facts=len(uncovered_facts))
     result += [[fact] for fact in uncovered_facts]
     return result
 
@@ -1,4 +1,5 @@
-import sys
+import heapq
+import itertools
 
 from . import pddl
 from . import pddl_to_prolog
@@ -23,48 +24,46 @@ class OccurrencesTracker:
     def variables(self):
         return set(self.occurrences)
 
-class CostMatrix:
+class JoinQueue:
+    """Priority queue of the pairs of joinees that can still be joined,
+    ordered by join cost.
+
+    Joinees are identified by the order in which they are added. Among
+    pairs of equal cost, the one with the earliest added joinees is
+    returned first."""
     def __init__(self, joinees):
-        self.joinees = []
-        self.cost_matrix = []
+        self.variables = {}
+        self.queue = []
+        self.num_added = 0
         for joinee in joinees:
             self.add_entry(joinee)
     def add_entry(self, joinee):
-        new_row = [self.compute_join_cost(joinee, other) for other in self.joinees]
-        self.cost_matrix.append(new_row)
-        self.joinees.append(joinee)
-    def delete_entry(self, index):
-        for row in self.cost_matrix[index + 1:]:
-            del row[index]
-        del self.cost_matrix[index]
-        del self.joinees[index]
-    def find_min_pair(self):
-        assert len(self.joinees) >= 2
-        min_cost = (sys.maxsize, sys.maxsize)
-        for i, row in enumerate(self.cost_matrix):
-            for j, entry in enumerate(row):
-                if entry < min_cost:
-                    min_cost = entry
-                    left_index, right_index = i, j
-        return left_index, right_index
+        joinee_id = self.num_added
+        self.num_added += 1
+        joinee_vars = pddl_to_prolog.get_variables([joinee])
+        for other_id, other_vars in self.variables.items():
+            cost = compute_join_cost(joinee_vars, other_vars)
+            heapq.heappush(self.queue, (cost, joinee_id, other_id))
+        self.variables[joinee_id] = joinee_vars
+        return joinee_id
     def remove_min_pair(self):
-        left_index, right_index = self.find_min_pair()
-        left, right = self.joinees[left_index], self.joinees[right_index]
-        assert left_index > right_index
-        self.delete_entry(left_index)
-        self.delete_entry(right_index)
-        return (left, right)
-    def compute_join_cost(self, left_joinee, right_joinee):
-        left_vars = pddl_to_prolog.get_variables([left_joinee])
-        right_vars = pddl_to_prolog.get_variables([right_joinee])
-        if len(left_vars) > len(right_vars):
-            left_vars, right_vars = right_vars, left_vars
-        common_vars = left_vars & right_vars
-        return (len(left_vars) - len(common_vars),
-                len(right_vars) - len(common_vars),
-                -len(common_vars))
+        while True:
+            _, left_id, right_id = heapq.heappop(self.queue)
+            if left_id in self.variables and right_id in self.variables:
+                break
+        del self.variables[left_id]
+        del self.variables[right_id]
+        return left_id, right_id
     def can_join(self):
-        return len(self.joinees) >= 2
+        return len(self.variables) >= 2
+
+def compute_join_cost(left_vars, right_vars):
+    if len(left_vars) > len(right_vars):
+        left_vars, right_vars = right_vars, left_vars
+    common_vars = left_vars & right_vars
+    return (len(left_vars) - len(common_vars),
+            len(right_vars) - len(common_vars),
+            -len(common_vars))
 
 class ResultList:
     def __init__(self, rule, name_generator):
@@ -81,14 +80,39 @@ class ResultList:
         self.result.append(rule)
         return rule.effect
 
+# Rule signature -> joined pairs of joinee ids. The join order only depends
+# on the arguments of the conditions and the effect, so it is shared by all
+# rules with the same signature, also across translations of a domain.
+_join_orders = {}
+
+def get_rule_signature(rule):
+    return (tuple(tuple(cond.args) for cond in rule.conditions),
+            tuple(rule.effect.args))
+
 def greedy_join(rule, name_generator):
     assert len(rule.conditions) >= 2
-    cost_matrix = CostMatrix(rule.conditions)
+    signature = get_rule_signature(rule)
+    join_order = _join_orders.get(signature)
+    if join_order is None:
+        join_queue = JoinQueue(rule.conditions)
+        join_order = []
+    else:
+        join_queue = None
     occurrences = OccurrencesTracker(rule)
     result = ResultList(rule, name_generator)
+    joinees_by_id = list(rule.conditions)
 
-    while cost_matrix.can_join():
-        joinees = list(cost_matrix.remove_min_pair())
+    for step in itertools.count():
+        if join_queue is None:
+            if step == len(join_order):
+                break
+            left_id, right_id = join_order[step]
+        else:
+            if not join_queue.can_join():
+                break
+            left_id, right_id = join_queue.remove_min_pair()
+            join_order.append((left_id, right_id))
+        joinees = [joinees_by_id[left_id], joinees_by_id[right_id]]
         for joinee in joinees:
             occurrences.update(joinee, -1)
 
@@ -101,9 +125,13 @@ def greedy_join(rule, name_generator):
             if retained_vars != joinee_vars:
                 joinees[i] = result.add_rule("project", [joinee], sorted(retained_vars))
         joint_condition = result.add_rule("join", joinees, sorted(effect_vars))
-        cost_matrix.add_entry(joint_condition)
+        joinees_by_id.append(joint_condition)
+        if join_queue is not None:
+            join_queue.add_entry(joint_condition)
         occurrences.update(joint_condition, +1)
 
+    if join_queue is not None:
+        _join_orders[signature] = join_order
     # assert occurrences.variables() == set(rule.effect.args)
     # for var in set(rule.effect.args):
     #     assert occurrences.occurrences[var] == 2 * rule.effect.args.count(var)
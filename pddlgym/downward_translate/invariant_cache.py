@@ -0,0 +1,119 @@
+# Per-domain cache of the invariants found by invariant_finder.
+#
+# Invariant synthesis only looks at the predicates and actions of the
+# normalized task, plus the parameter pairs of each action that are never
+# instantiated with equal objects (see BalanceChecker). The cache key hashes
+# exactly these, so all problems of a domain that agree on the latter share
+# one entry. Grouping the invariants by the initial state and instantiating
+# them is still done per task.
+#
+# Entries live in memory and, unless options.invariant_cache_dir is None,
+# in one pickle file per key on disk.
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from . import invariants
+from . import options
+
+# Bump when the key or the stored representation changes
+CACHE_VERSION = 2
+
+_memory_cache = {}
+
+
+def task_key(task, inequal_params):
+    """Hash the parts of a normalized task that invariant synthesis uses.
+
+    inequal_params maps each action to the parameter position pairs that
+    are never instantiated with equal objects.
+    """
+    # Format the task by hand instead of capturing Action.dump: swapping
+    # sys.stdout is not thread-safe and would pick up prints from other
+    # threads
+    lines = ["%s %s" % (CACHE_VERSION,
+                        options.invariant_generation_max_candidates)]
+    for type in task.types:
+        lines.append("%s %s" % (type, type.supertype_names))
+    for predicate in task.predicates:
+        lines.append(str(predicate))
+    for action in task.actions:
+        lines.append("%s(%s)" % (action.name,
+                                 ", ".join(map(str, action.parameters))))
+        _condition_lines(action.precondition, "  ", lines)
+        for eff in action.effects:
+            lines.append("eff %s" % ", ".join(map(str, eff.parameters)))
+            _condition_lines(eff.condition, "  ", lines)
+            lines.append("  %s" % eff.literal)
+        lines.append("cost %s" % action.cost)
+        lines.append("%s %s" % (action.num_external_parameters,
+                                inequal_params.get(action, [])))
+    text = "\n".join(lines)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _condition_lines(condition, indent, lines):
+    lines.append(indent + condition._dump())
+    for part in condition.parts:
+        _condition_lines(part, indent + "  ", lines)
+
+
+def load(key, max_time):
+    """Return the cached invariants for the key, or None.
+
+    Invariants that were found before the time limit was reached are only
+    returned if the limit they were found with was at least max_time.
+    """
+    entry = _memory_cache.get(key)
+    if entry is None:
+        entry = _read(key)
+        if entry is None:
+            return None
+        _memory_cache[key] = entry
+    complete, entry_max_time, parts_list = entry
+    if not complete and entry_max_time < max_time:
+        return None
+    return [invariants.Invariant([invariants.InvariantPart(*part) for part in parts])
+            for parts in parts_list]
+
+
+def store(key, found_invariants, complete, max_time):
+    parts_list = [[(part.predicate, part.order, part.omitted_pos)
+                   for part in sorted(invariant.parts, key=str)]
+                  for invariant in found_invariants]
+    entry = (complete, max_time, parts_list)
+    _memory_cache[key] = entry
+    _write(key, entry)
+
+
+def _cache_fname(key):
+    return os.path.join(options.invariant_cache_dir, key + ".pkl")
+
+
+def _read(key):
+    if options.invariant_cache_dir is None:
+        return None
+    try:
+        with open(_cache_fname(key), "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _write(key, entry):
+    if options.invariant_cache_dir is None:
+        return
+    try:
+        os.makedirs(options.invariant_cache_dir, exist_ok=True)
+        # Write to a temp file and rename so concurrent readers never see a
+        # partial pickle
+        fd, tmp_fname = tempfile.mkstemp(dir=options.invariant_cache_dir,
+                                         suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_fname, _cache_fname(key))
+    except OSError:
+        # Caching is best-effort
+        pass
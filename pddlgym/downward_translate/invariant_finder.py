@@ -5,17 +5,21 @@ from collections import deque, defaultdict
 import itertools
 import time
 
+from . import invariant_cache
 from . import invariants
 from . import options
 from . import pddl
 from . import timers
 
 class BalanceChecker:
-    def __init__(self, task, reachable_action_params):
+    def __init__(self, task, reachable_action_params, inequal_params=None):
         self.predicates_to_add_actions = defaultdict(set)
         self.action_to_heavy_action = {}
         for act in task.actions:
-            action = self.add_inequality_preconds(act, reachable_action_params)
+            if inequal_params is None:
+                action = self.add_inequality_preconds(act, reachable_action_params)
+            else:
+                action = self.add_inequality_preconds_for(act, inequal_params[act])
             too_heavy_effects = []
             create_heavy_act = False
             heavy_act = action
@@ -45,15 +49,10 @@ class BalanceChecker:
     def add_inequality_preconds(self, action, reachable_action_params):
         if reachable_action_params is None or len(action.parameters) < 2:
             return action
-        inequal_params = []
-        combs = itertools.combinations(range(len(action.parameters)), 2)
-        for pos1, pos2 in combs:
-            for params in reachable_action_params[action]:
-                if params[pos1] == params[pos2]:
-                    break
-            else:
-                inequal_params.append((pos1, pos2))
+        inequal_params = get_inequal_params(action, reachable_action_params)
+        return self.add_inequality_preconds_for(action, inequal_params)
 
+    def add_inequality_preconds_for(self, action, inequal_params):
         if inequal_params:
             precond_parts = [action.precondition]
             for pos1, pos2 in inequal_params:
@@ -68,6 +67,21 @@ class BalanceChecker:
         else:
             return action
 
+def get_inequal_params(action, reachable_action_params):
+    """Parameter position pairs that no reachable instantiation of the
+    action binds to the same object."""
+    if reachable_action_params is None or len(action.parameters) < 2:
+        return []
+    inequal_params = []
+    combs = itertools.combinations(range(len(action.parameters)), 2)
+    for pos1, pos2 in combs:
+        for params in reachable_action_params[action]:
+            if params[pos1] == params[pos2]:
+                break
+        else:
+            inequal_params.append((pos1, pos2))
+    return inequal_params
+
 def get_fluents(task):
     fluent_names = set()
     for action in task.actions:
@@ -83,13 +97,16 @@ def get_initial_invariants(task):
             part = invariants.InvariantPart(predicate.name, order, omitted_arg)
             yield invariants.Invariant((part,))
 
-def find_invariants(task, reachable_action_params):
+def find_invariants(task, reachable_action_params, status=None,
+                    inequal_params=None):
+    # If given, status["timed_out"] records whether the time limit was hit.
     limit = options.invariant_generation_max_candidates
     candidates = deque(itertools.islice(get_initial_invariants(task), 0, limit))
-    print(len(candidates), "initial candidates")
+    timers.report("%d initial candidates" % len(candidates),
+                  initial_invariant_candidates=len(candidates))
     seen_candidates = set(candidates)
 
-    balance_checker = BalanceChecker(task, reachable_action_params)
+    balance_checker = BalanceChecker(task, reachable_action_params, inequal_params)
 
     def enqueue_func(invariant):
         if len(seen_candidates) < limit and invariant not in seen_candidates:
@@ -100,7 +117,10 @@ def find_invariants(task, reachable_action_params):
     while candidates:
         candidate = candidates.popleft()
         if time.process_time() - start_time > options.invariant_generation_max_time:
-            print("Time limit reached, aborting invariant generation")
+            timers.report("Time limit reached, aborting invariant generation",
+                          invariant_generation_timed_out=True)
+            if status is not None:
+                status["timed_out"] = True
             return
         if candidate.check_balance(balance_checker, enqueue_func):
             yield candidate
@@ -128,7 +148,19 @@ def useful_groups(invariants, initial_facts):
 
 def get_groups(task, reachable_action_params=None):
     with timers.timing("Finding invariants", block=True):
-        invariants = sorted(find_invariants(task, reachable_action_params))
+        inequal_params = {action: get_inequal_params(action, reachable_action_params)
+                          for action in task.actions}
+        key = invariant_cache.task_key(task, inequal_params)
+        max_time = options.invariant_generation_max_time
+        invariants = invariant_cache.load(key, max_time)
+        if invariants is None:
+            status = {"timed_out": False}
+            invariants = sorted(find_invariants(task, reachable_action_params, status,
+                                                inequal_params))
+            invariant_cache.store(key, invariants, not status["timed_out"], max_time)
+        else:
+            timers.report("Reusing %d cached invariants" % len(invariants),
+                          cached_invariants=len(invariants))
     with timers.timing("Checking invariant weight"):
         result = list(useful_groups(invariants, task.init))
     return result
@@ -1,8 +1,22 @@
+# Translator options.
+#
+# Modules read options as attributes of this module, e.g.
+# options.use_partial_encoding. The values come from the TranslateOptions
+# object that is active in the current context (see use()), or else from the
+# process defaults, which setup() fills from the command line. Since the active
+# options are held in a context variable, translations with different options
+# can run concurrently in different threads.
+
 import argparse
-import sys
+import contextlib
+import contextvars
+import os
+
+DEFAULT_INVARIANT_CACHE_DIR = os.environ.get("PDDLGYM_INVARIANT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "pddlgym", "invariants")) or None
 
 
-def parse_args():
+def get_argparser():
     argparser = argparse.ArgumentParser()
     argparser.add_argument(
         "domain", help="path to domain pddl file")
@@ -28,14 +42,33 @@ def parse_args():
     argparser.add_argument(
         "--sas-file", default="output.sas",
         help="path to the SAS output file (default: %(default)s)")
+    argparser.add_argument(
+        "--sas-format", default="text", choices=["text", "binary"],
+        help="format of the SAS output file. Only the 'text' format can be "
+        "read by the search component; 'binary' is a compact format for "
+        "caching tasks that is loaded with SASTask.load_binary "
+        "(default: %(default)s)")
     argparser.add_argument(
         "--invariant-generation-max-time", default=300, type=int,
         help="max time for invariant generation (default: %(default)ds)")
+    argparser.add_argument(
+        "--invariant-cache-dir", default=DEFAULT_INVARIANT_CACHE_DIR,
+        help="directory in which found invariants are cached per domain "
+        "(default: %(default)s)")
+    argparser.add_argument(
+        "--no-invariant-cache", dest="invariant_cache_dir",
+        action="store_const", const=None,
+        help="always run invariant synthesis and do not cache invariants on disk")
     argparser.add_argument(
         "--add-implied-preconditions", action="store_true",
         help="infer additional preconditions. This setting can cause a "
         "severe performance penalty due to weaker relevance analysis "
         "(see issue7).")
+    argparser.add_argument(
+        "--relevance-analysis", action="store_true",
+        help="before grounding, remove the actions, axioms and objects that "
+        "cannot contribute to reaching the goal according to a backward "
+        "relevance analysis of the lifted task")
     argparser.add_argument(
         "--keep-unreachable-facts",
         dest="filter_unreachable_facts", action="store_false",
@@ -57,13 +90,84 @@ def parse_args():
         help="How to assign layers to derived variables. 'min' attempts to put as "
         "many variables into the same layer as possible, while 'max' puts each variable "
         "into its own layer unless it is part of a cycle.")
-    return argparser.parse_args()
+    argparser.add_argument(
+        "--model-engine", default="queue", choices=["queue", "relational"],
+        help="How to compute the relaxed reachability model. 'queue' processes "
+        "one atom at a time, while 'relational' evaluates the rules semi-naively "
+        "over sets of tuples with hash joins. Both compute the same model.")
+    return argparser
+
+
+def parse_args(args=None):
+    return get_argparser().parse_args(args)
+
+
+class TranslateOptions:
+    """Values of all translator options.
+
+    Options that are not given keep the default of the corresponding
+    command line argument, e.g. TranslateOptions(model_engine="relational").
+    domain and task default to None.
+    """
+    def __init__(self, **kwargs):
+        values = vars(parse_args(["domain", "task"]))
+        values["domain"] = values["task"] = None
+        unknown = set(kwargs) - set(values)
+        if unknown:
+            raise TypeError("Unknown translator options: %s" %
+                            ", ".join(sorted(unknown)))
+        values.update(kwargs)
+        self.__dict__.update(values)
+
+    def replace(self, **kwargs):
+        """Return a copy in which the given options are changed."""
+        values = dict(vars(self))
+        values.update(kwargs)
+        return TranslateOptions(**values)
+
+    def __repr__(self):
+        return "TranslateOptions(%s)" % ", ".join(
+            "%s=%r" % item for item in sorted(vars(self).items()))
+
+
+_default_options = None
+_current_options = contextvars.ContextVar("translate_options", default=None)
+
+
+def current():
+    """Return the options that are active in the current context."""
+    global _default_options
+    opts = _current_options.get()
+    if opts is not None:
+        return opts
+    if _default_options is None:
+        _default_options = TranslateOptions()
+    return _default_options
+
+
+@contextlib.contextmanager
+def use(opts):
+    """Make opts the active options within the block."""
+    token = _current_options.set(opts)
+    try:
+        yield opts
+    finally:
+        _current_options.reset(token)
+
+
+def __getattr__(name):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    try:
+        return getattr(current(), name)
+    except AttributeError:
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name)) from None
 
 
 def copy_args_to_module(args):
-    module_dict = sys.modules[__name__].__dict__
-    for key, value in vars(args).items():
-        module_dict[key] = value
+    global _default_options
+    _default_options = TranslateOptions(**vars(args))
 
 
 def setup():
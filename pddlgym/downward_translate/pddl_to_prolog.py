@@ -64,7 +64,7 @@ class PrologProgram:
                 for var in sorted(eff_vars):
                     rule.add_condition(pddl.Atom("@object", [var]))
         if must_add_predicate:
-            print("Unbound effect variables: Adding @object predicate.")
+            timers.report("Unbound effect variables: Adding @object predicate.")
             self.facts += [Fact(pddl.Atom("@object", [obj])) for obj in self.objects]
     def split_duplicate_arguments(self):
         """Make sure that no variable occurs twice within the same symbolic fact,
@@ -76,7 +76,7 @@ class PrologProgram:
         printed_message = False
         for rule in self.rules:
             if rule.rename_duplicate_variables() and not printed_message:
-                print("Duplicate arguments: Adding equality conditions.")
+                timers.report("Duplicate arguments: Adding equality conditions.")
                 printed_message = True
 
     def convert_trivial_rules(self):
@@ -92,7 +92,7 @@ class PrologProgram:
                 self.add_fact(pddl.Atom(rule.effect.predicate, rule.effect.args))
                 must_delete_rules.append(i)
         if must_delete_rules:
-            print("Trivial rules: Converted to facts.")
+            timers.report("Trivial rules: Converted to facts.")
             for rule_no in must_delete_rules[::-1]:
                 del self.rules[rule_no]
 
@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+
+# Set-at-a-time alternative to build_model.compute_model.
+#
+# The Datalog program is evaluated semi-naively: in each round, every rule
+# is fired for the new tuples (the delta) of its condition relations only,
+# which are joined against hash indexes of the tuples seen so far. Objects
+# are encoded as integers, so relations are sets of integer tuples. The
+# model contains exactly the atoms computed by build_model.compute_model;
+# only the order of the derived atoms may differ.
+
+import itertools
+
+from collections import defaultdict
+from operator import itemgetter
+
+from . import build_model
+from . import pddl
+from . import timers
+
+
+def tuple_getter(indices):
+    if not indices:
+        return lambda row: ()
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indices)
+
+
+class Condition:
+    def __init__(self, cond, encode):
+        self.predicate = cond.predicate
+        self.arity = len(cond.args)
+        # (position, object) pairs that a matching tuple must contain
+        self.constants = [(pos, encode(arg)) for pos, arg in enumerate(cond.args)
+                          if not isinstance(arg, int) and arg[0] != "?"]
+        # Effect variable number -> position in the tuple
+        self.var_positions = {arg: pos for pos, arg in enumerate(cond.args)
+                              if isinstance(arg, int)}
+    def matches(self, rows):
+        if not self.constants:
+            return rows
+        return [row for row in rows
+                if all(row[pos] == obj for pos, obj in self.constants)]
+
+class BuildRule:
+    def __init__(self, effect, conditions, encode):
+        self.predicate = effect.predicate
+        self.conditions = [Condition(cond, encode) for cond in conditions]
+        self.effect = self._make_effect(
+            [None if isinstance(arg, int) else encode(arg) for arg in effect.args])
+    def _make_effect(self, effect_constants):
+        """Return a function that maps the concatenated tuples of all
+        conditions to the effect tuple."""
+        offsets = []
+        offset = 0
+        for cond in self.conditions:
+            offsets.append(offset)
+            offset += cond.arity
+        indices = []
+        constants = []
+        for var_no, constant in enumerate(effect_constants):
+            if constant is not None:
+                indices.append(offset + len(constants))
+                constants.append(constant)
+                continue
+            for cond_offset, cond in zip(offsets, self.conditions):
+                if var_no in cond.var_positions:
+                    indices.append(cond_offset + cond.var_positions[var_no])
+                    break
+        getter = tuple_getter(indices)
+        if not constants:
+            return getter
+        constants = tuple(constants)
+        return lambda row: getter(row + constants)
+
+class JoinRule(BuildRule):
+    def __init__(self, effect, conditions, encode):
+        super().__init__(effect, conditions, encode)
+        left, right = self.conditions
+        common_vars = sorted(left.var_positions.keys() & right.var_positions.keys())
+        self.keys = [tuple_getter([cond.var_positions[var] for var in common_vars])
+                     for cond in self.conditions]
+        self.rows_by_key = (defaultdict(list), defaultdict(list))
+    def fire(self, cond_index, delta, emit):
+        # The new tuples are joined with all tuples of the other condition
+        # indexed so far, and only then indexed themselves, so each pair of
+        # tuples is joined exactly once.
+        rows = self.conditions[cond_index].matches(delta)
+        if not rows:
+            return
+        key = self.keys[cond_index]
+        other_rows_by_key = self.rows_by_key[1 - cond_index]
+        effect = self.effect
+        predicate = self.predicate
+        if cond_index == 0:
+            for row in rows:
+                for other in other_rows_by_key.get(key(row), ()):
+                    emit(predicate, effect(row + other))
+        else:
+            for row in rows:
+                for other in other_rows_by_key.get(key(row), ()):
+                    emit(predicate, effect(other + row))
+        rows_by_key = self.rows_by_key[cond_index]
+        for row in rows:
+            rows_by_key[key(row)].append(row)
+
+class ProductRule(BuildRule):
+    def __init__(self, effect, conditions, encode):
+        super().__init__(effect, conditions, encode)
+        self.rows_by_index = [[] for _ in self.conditions]
+    def fire(self, cond_index, delta, emit):
+        rows = self.conditions[cond_index].matches(delta)
+        if not rows:
+            return
+        factors = list(self.rows_by_index)
+        factors[cond_index] = rows
+        self.rows_by_index[cond_index] = self.rows_by_index[cond_index] + rows
+        if not all(factors):
+            return
+        effect = self.effect
+        for combination in itertools.product(*factors):
+            emit(self.predicate, effect(sum(combination, ())))
+
+class ProjectRule(BuildRule):
+    def fire(self, cond_index, delta, emit):
+        effect = self.effect
+        for row in self.conditions[0].matches(delta):
+            emit(self.predicate, effect(row))
+
+RULE_TYPES = {
+    "join": JoinRule,
+    "product": ProductRule,
+    "project": ProjectRule,
+    }
+
+def compute_model(prog):
+    with timers.timing("Preparing model"):
+        objects = []
+        object_ids = {}
+        def encode(obj):
+            obj_id = object_ids.get(obj)
+            if obj_id is None:
+                obj_id = object_ids[obj] = len(objects)
+                objects.append(obj)
+            return obj_id
+
+        rules = []
+        rules_by_predicate = defaultdict(list)
+        for rule in prog.rules:
+            effect, conditions = build_model.variables_to_numbers(
+                rule.effect, rule.conditions)
+            rule = RULE_TYPES[rule.type](effect, conditions, encode)
+            for cond_index, cond in enumerate(rule.conditions):
+                rules_by_predicate[cond.predicate].append((rule, cond_index))
+            rules.append(rule)
+
+        fact_atoms = sorted(fact.atom for fact in prog.facts)
+        relations = defaultdict(set)
+        delta = defaultdict(list)
+        for atom in fact_atoms:
+            row = tuple(encode(arg) for arg in atom.args)
+            if row not in relations[atom.predicate]:
+                relations[atom.predicate].add(row)
+                delta[atom.predicate].append(row)
+
+    timers.report("Generated %d rules." % len(rules), rules=len(rules))
+    with timers.timing("Computing model"):
+        derived = []
+        def emit(predicate, row):
+            relation = relations[predicate]
+            if row not in relation:
+                relation.add(row)
+                new_delta[predicate].append(row)
+                derived.append((predicate, row))
+
+        rounds = 0
+        while delta:
+            rounds += 1
+            new_delta = defaultdict(list)
+            for predicate, rows in delta.items():
+                for rule, cond_index in rules_by_predicate.get(predicate, ()):
+                    rule.fire(cond_index, rows, emit)
+            delta = new_delta
+
+        model = fact_atoms + [
+            pddl.Atom(predicate, [objects[obj] for obj in row])
+            for predicate, row in derived]
+    auxiliary_atoms = sum(1 for atom in model
+                          if isinstance(atom.predicate, str) and "$" in atom.predicate)
+    relevant_atoms = len(model) - auxiliary_atoms
+    timers.report("%d relevant atoms" % relevant_atoms,
+                  relevant_atoms=relevant_atoms)
+    timers.report("%d auxiliary atoms" % auxiliary_atoms,
+                  auxiliary_atoms=auxiliary_atoms)
+    timers.report("%d semi-naive rounds" % rounds, semi_naive_rounds=rounds)
+    return model
@@ -0,0 +1,213 @@
+#! /usr/bin/env python3
+
+# Backward goal-relevance analysis of a normalized task.
+#
+# Starting from the goal, atoms are chained backwards through the actions
+# and axioms that can change them: the preconditions and effect conditions of
+# an action with an effect on a relevant atom, and the body of an axiom whose
+# head is relevant, are relevant as well. Atoms are represented by patterns,
+# i.e., a predicate and a tuple of arguments that are objects or None for
+# "any object". Parameters that are not bound when unifying an effect (or an
+# axiom head) with a relevant pattern range over all objects of their type.
+#
+# Actions and axioms that cannot change a relevant atom are never needed to
+# reach the goal, and relevant ones are never needed with irrelevant objects.
+# Restricting the task to the relevant actions, axioms and objects therefore
+# preserves all plans (up to irrelevant steps), but grounds fewer atoms and
+# operators.
+
+import copy
+
+from collections import defaultdict
+
+from . import instantiate
+from . import pddl
+from . import timers
+
+# Patterns of a predicate beyond this number are replaced by the most
+# general pattern to keep the analysis cheap.
+MAX_PATTERNS_PER_PREDICATE = 1000
+
+
+class Relevance:
+    def __init__(self, task, predicates, objects, actions, axioms):
+        self.task = task
+        self.predicates = predicates
+        self.objects = objects
+        self.actions = actions
+        self.axioms = axioms
+
+    def is_relevant_atom(self, atom):
+        return (atom.predicate in self.predicates and
+                all(arg in self.objects for arg in atom.args))
+
+    def restrict_task(self):
+        """Return a shallow copy of the task that only contains the relevant
+        objects, initial atoms, actions and axioms."""
+        task = copy.copy(self.task)
+        task.objects = [obj for obj in self.task.objects
+                        if obj.name in self.objects]
+        task.init = [atom for atom in self.task.init
+                     if (atom.predicate == "=" or atom.predicate in self.predicates)
+                     and all(arg in self.objects for arg in atom.args)]
+        task.actions = [action for action in self.task.actions
+                        if action in self.actions]
+        task.axioms = [axiom for axiom in self.task.axioms
+                       if axiom in self.axioms]
+        return task
+
+    def report(self):
+        task = self.task
+        num_init = sum(1 for atom in task.init
+                       if atom.predicate != "=" and self.is_relevant_atom(atom))
+        timers.report("%d of %d objects relevant" % (
+            len(self.objects), len(task.objects)),
+            relevant_objects=len(self.objects))
+        timers.report("%d of %d initial atoms relevant" % (
+            num_init, sum(1 for atom in task.init if atom.predicate != "=")),
+            relevant_initial_atoms=num_init)
+        timers.report("%d of %d actions relevant" % (
+            len(self.actions), len(task.actions)),
+            relevant_actions=len(self.actions))
+        timers.report("%d of %d axioms relevant" % (
+            len(self.axioms), len(task.axioms)),
+            relevant_axioms=len(self.axioms))
+
+
+def collect_literals(condition, literals, parameters):
+    if isinstance(condition, pddl.Literal):
+        literals.append(condition)
+        return
+    if isinstance(condition, (pddl.UniversalCondition, pddl.ExistentialCondition)):
+        parameters.extend(condition.parameters)
+    for part in condition.parts:
+        collect_literals(part, literals, parameters)
+
+
+def unify(args, pattern):
+    """Return a binding of the variables in args that matches the pattern,
+    or None."""
+    binding = {}
+    for arg, obj in zip(args, pattern):
+        if arg.startswith("?"):
+            if obj is None:
+                continue
+            if binding.setdefault(arg, obj) != obj:
+                return None
+        elif obj is not None and arg != obj:
+            return None
+    return binding
+
+
+class RelevanceAnalysis:
+    def __init__(self, task):
+        self.task = task
+        self.objects_by_type = instantiate.get_objects_by_type(
+            task.objects, task.types)
+        # Predicate -> list of (number, schema, parameters, head args,
+        # conditions) for all effects and axioms
+        self.producers = defaultdict(list)
+        producers = []
+        for action in task.actions:
+            for effect in action.effects:
+                producers.append(
+                    (effect.literal.predicate, action,
+                     action.parameters + effect.parameters,
+                     effect.literal.args, [action.precondition, effect.condition]))
+        for axiom in task.axioms:
+            producers.append(
+                (axiom.name, axiom, axiom.parameters,
+                 [par.name for par in axiom.parameters[:axiom.num_external_parameters]],
+                 [axiom.condition]))
+        for number, (predicate, *producer) in enumerate(producers):
+            self.producers[predicate].append((number, *producer))
+        self.patterns = defaultdict(set)
+        self.queue = []
+        self.objects = set()
+        self.schemas = set()
+        self.seen_bindings = set()
+
+    def add_pattern(self, predicate, pattern):
+        if predicate == "=":
+            return
+        patterns = self.patterns[predicate]
+        general = (None,) * len(pattern)
+        if pattern in patterns or general in patterns:
+            return
+        if len(patterns) >= MAX_PATTERNS_PER_PREDICATE:
+            pattern = general
+        patterns.add(pattern)
+        self.objects.update(obj for obj in pattern if obj is not None)
+        self.queue.append((predicate, pattern))
+
+    def add_literals(self, condition, binding):
+        literals = []
+        parameters = []
+        collect_literals(condition, literals, parameters)
+        for par in parameters:
+            self.objects.update(self.objects_by_type[par.type_name])
+        # Quantified variables may shadow parameters
+        binding = {var: obj for var, obj in binding.items()
+                   if var not in {par.name for par in parameters}}
+        for literal in literals:
+            self.add_pattern(literal.predicate, tuple(
+                binding.get(arg) if arg.startswith("?") else arg
+                for arg in literal.args))
+
+    def chain(self, predicate, pattern):
+        for number, schema, parameters, args, conditions in self.producers[predicate]:
+            binding = unify(args, pattern)
+            if binding is None:
+                continue
+            key = (number, frozenset(binding.items()))
+            if key in self.seen_bindings:
+                continue
+            self.seen_bindings.add(key)
+            self.schemas.add(schema)
+            for par in parameters:
+                if par.name in binding:
+                    self.objects.add(binding[par.name])
+                else:
+                    self.objects.update(self.objects_by_type[par.type_name])
+            for condition in conditions:
+                self.add_literals(condition, binding)
+
+    def run(self):
+        self.add_literals(self.task.goal, {})
+        while self.queue:
+            self.chain(*self.queue.pop())
+        return Relevance(
+            self.task, set(self.patterns), self.objects,
+            {schema for schema in self.schemas
+             if isinstance(schema, pddl.Action)},
+            {schema for schema in self.schemas
+             if isinstance(schema, pddl.Axiom)})
+
+
+def analyze(task):
+    """Return the Relevance of the normalized task."""
+    return RelevanceAnalysis(task).run()
+
+
+def restrict_task(task):
+    relevance = analyze(task)
+    relevance.report()
+    return relevance.restrict_task()
+
+
+if __name__ == "__main__":
+    from . import normalize
+    from . import options
+    from . import pddl_parser
+    options.setup()
+    task = pddl_parser.open()
+    normalize.normalize(task)
+    relevance = analyze(task)
+    relevance.report()
+    _, atoms, actions, _, _ = instantiate.explore(task)
+    _, relevant_atoms, relevant_actions, _, _ = instantiate.explore(
+        relevance.restrict_task())
+    print("%d of %d atoms pruned" % (
+        len(atoms) - len(relevant_atoms), len(atoms)))
+    print("%d of %d operators pruned" % (
+        len(actions) - len(relevant_actions), len(actions)))
@@ -1,5 +1,20 @@
+import array
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
 SAS_FILE_VERSION = 3
 
+# The binary format (see SASTask.to_bytes) stores a task as a sequence of
+# packed arrays in native byte order. It is meant for caching translated
+# tasks and for handing them to other processes, not for Fast Downward.
+SAS_BINARY_MAGIC = b"SASB"
+SAS_BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<4sI7sB")
+_BINARY_SECTION = struct.Struct("<c7xQ")
+
 DEBUG = False
 
 
@@ -95,6 +110,129 @@ class SASTask:
         for axiom in self.axioms:
             axiom.output(stream)
 
+    def to_bytes(self):
+        """Encode the task in the binary format.
+
+        Variables, conditions and effects are stored as flat arrays of the
+        smallest sufficient integer type, with offset arrays delimiting the parts of each mutex group,
+        operator and axiom, and names as newline-separated UTF-8 strings.
+        """
+        writer = _BinaryWriter()
+        writer.ints([int(self.metric)])
+        writer.ints(self.variables.ranges)
+        writer.ints(self.variables.axiom_layers)
+        writer.strings(value for values in self.variables.value_names
+                       for value in values)
+        writer.pair_lists(mutex.facts for mutex in self.mutexes)
+        writer.ints(self.init.values)
+        writer.pair_lists([self.goal.pairs])
+        writer.strings(op.name for op in self.operators)
+        writer.ints([op.cost for op in self.operators])
+        writer.pair_lists(op.prevail for op in self.operators)
+        pre_post_offsets = [0]
+        pre_post = []
+        for op in self.operators:
+            for var, pre, post, cond in op.pre_post:
+                pre_post.extend((var, pre, post))
+            pre_post_offsets.append(len(pre_post) // 3)
+        writer.ints(pre_post_offsets)
+        writer.ints(pre_post)
+        writer.pair_lists(cond for op in self.operators
+                          for _, _, _, cond in op.pre_post)
+        writer.pair_lists(axiom.condition for axiom in self.axioms)
+        writer.ints([value for axiom in self.axioms for value in axiom.effect])
+        return writer.getvalue()
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Decode a task from a bytes-like object such as the result of
+        to_bytes, an mmap or a shared memory buffer.
+
+        The components are restored exactly as they were encoded, without
+        sorting them again, so that the task outputs the same text.
+        """
+        reader = _BinaryReader(buffer)
+        metric = bool(reader.ints()[0])
+        ranges = reader.ints().tolist()
+        axiom_layers = reader.ints().tolist()
+        names = iter(reader.strings())
+        value_names = [[next(names) for _ in range(rang)] for rang in ranges]
+        variables = SASVariables(ranges, axiom_layers, value_names)
+        mutexes = [_restore(SASMutexGroup, facts=facts)
+                   for facts in reader.pair_lists()]
+        init = SASInit(reader.ints().tolist())
+        goal = _restore(SASGoal, pairs=reader.pair_lists()[0])
+        names = reader.strings()
+        costs = reader.ints().tolist()
+        prevails = reader.pair_lists()
+        pre_post_offsets = reader.ints().tolist()
+        pre_post = reader.ints().tolist()
+        conds = iter(reader.pair_lists())
+        operators = []
+        for op_no, (name, cost, prevail) in enumerate(zip(names, costs, prevails)):
+            start, end = pre_post_offsets[op_no], pre_post_offsets[op_no + 1]
+            op_pre_post = [(pre_post[3 * i], pre_post[3 * i + 1],
+                            pre_post[3 * i + 2], next(conds))
+                           for i in range(start, end)]
+            operators.append(_restore(SASOperator, name=name, prevail=prevail,
+                                      pre_post=op_pre_post, cost=cost))
+        conditions = reader.pair_lists()
+        effects = _pairs(reader.ints().tolist())
+        axioms = [_restore(SASAxiom, condition=condition, effect=effect)
+                  for condition, effect in zip(conditions, effects)]
+        return _restore(cls, variables=variables, mutexes=mutexes, init=init,
+                        goal=goal, operators=operators, axioms=axioms,
+                        metric=metric)
+
+    def output_binary(self, filename):
+        """Write the task to a file in the binary format.
+
+        The file is replaced atomically, so concurrent readers see either
+        the old or the new task.
+        """
+        data = self.to_bytes()
+        dirname = os.path.dirname(os.path.abspath(filename))
+        fd, tmp_filename = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            os.unlink(tmp_filename)
+            raise
+
+    @classmethod
+    def load_binary(cls, filename):
+        """Read a task written by output_binary, memory-mapping the file."""
+        with open(filename, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return cls.from_buffer(buffer)
+
+    def to_shared_memory(self, name=None):
+        """Copy the binary encoding of the task into a new shared memory
+        block and return it.
+
+        Other processes can load the task with from_shared_memory(block.name).
+        The caller is responsible for closing and unlinking the block.
+        """
+        from multiprocessing import shared_memory
+        data = self.to_bytes()
+        block = shared_memory.SharedMemory(name=name, create=True,
+                                           size=max(len(data), 1))
+        block.buf[:len(data)] = data
+        return block
+
+    @classmethod
+    def from_shared_memory(cls, name):
+        """Load a task from a shared memory block created by
+        to_shared_memory."""
+        from multiprocessing import shared_memory
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            return cls.from_buffer(block.buf)
+        finally:
+            block.close()
+
     def get_encoding_size(self):
         task_size = 0
         task_size += self.variables.get_encoding_size()
@@ -475,3 +613,99 @@ class SASAxiom:
 
     def get_encoding_size(self):
         return 1 + len(self.condition)
+
+
+def _pairs(values):
+    values = iter(values)
+    return list(zip(values, values))
+
+
+def _restore(cls, **attributes):
+    # Create an instance without the normalization done by __init__
+    obj = cls.__new__(cls)
+    obj.__dict__.update(attributes)
+    return obj
+
+
+_INT_RANGES = {
+    typecode: (-2 ** (8 * size - 1), 2 ** (8 * size - 1) - 1)
+    for typecode, size in [("b", 1), ("h", 2), ("i", 4), ("q", 8)]}
+
+
+class _BinaryWriter:
+    def __init__(self):
+        self.sections = []
+
+    def _add(self, typecode, count, data):
+        self.sections.append(_BINARY_SECTION.pack(typecode.encode(), count))
+        self.sections.append(data)
+        self.sections.append(bytes(-len(data) % 8))
+
+    def ints(self, values):
+        values = array.array("q", values)
+        low, high = (min(values), max(values)) if values else (0, 0)
+        for typecode in "bhi":
+            if _INT_RANGES[typecode][0] <= low and high <= _INT_RANGES[typecode][1]:
+                values = array.array(typecode, values)
+                break
+        self._add(values.typecode, len(values), values.tobytes())
+
+    def strings(self, values):
+        data = "\n".join(values).encode("utf-8")
+        self._add("s", len(data), data)
+
+    def pair_lists(self, pair_lists):
+        offsets = [0]
+        values = []
+        for pairs in pair_lists:
+            for var, val in pairs:
+                values.append(var)
+                values.append(val)
+            offsets.append(len(values) // 2)
+        self.ints(offsets)
+        self.ints(values)
+
+    def getvalue(self):
+        header = _BINARY_HEADER.pack(
+            SAS_BINARY_MAGIC, SAS_BINARY_VERSION, bytes(7),
+            sys.byteorder == "little")
+        return b"".join([header] + self.sections)
+
+
+class _BinaryReader:
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer).cast("B")
+        magic, version, _, little_endian = _BINARY_HEADER.unpack_from(
+            self.buffer)
+        if magic != SAS_BINARY_MAGIC or version != SAS_BINARY_VERSION:
+            raise ValueError("Not a binary SAS task of version %d" %
+                             SAS_BINARY_VERSION)
+        if bool(little_endian) != (sys.byteorder == "little"):
+            raise ValueError("Binary SAS task has a different byte order")
+        self.pos = _BINARY_HEADER.size
+
+    def _next(self):
+        typecode, count = _BINARY_SECTION.unpack_from(self.buffer, self.pos)
+        typecode = typecode.decode()
+        self.pos += _BINARY_SECTION.size
+        size = count if typecode == "s" else count * array.array(typecode).itemsize
+        data = self.buffer[self.pos:self.pos + size]
+        self.pos += size + (-size % 8)
+        return typecode, data
+
+    def ints(self):
+        typecode, data = self._next()
+        assert typecode in _INT_RANGES, typecode
+        return data.cast(typecode)
+
+    def strings(self):
+        typecode, data = self._next()
+        assert typecode == "s", typecode
+        if not data:
+            return []
+        return str(data, "utf-8").split("\n")
+
+    def pair_lists(self):
+        offsets = self.ints().tolist()
+        pairs = _pairs(self.ints().tolist())
+        return [pairs[start:end] for start, end in zip(offsets, offsets[1:])]
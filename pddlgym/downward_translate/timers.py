@@ -1,4 +1,5 @@
 import contextlib
+import contextvars
 import os
 import sys
 import time
@@ -19,8 +20,60 @@ class Timer:
             time.time() - self.start_time)
 
 
+class TimingRecorder:
+    """Collects the timing() blocks run and the report() output made while
+    it is active (see recording()).
+
+    records is a list of dicts with the keys "name", "depth" (the nesting
+    level of the block), "cpu" (CPU seconds of the calling thread) and
+    "wall" (wall-clock seconds), in the order in which the blocks started.
+    statistics maps the names of the reported statistics to their values,
+    and messages lists the reported lines that carry no statistics.
+    """
+    def __init__(self):
+        self.records = []
+        self.depth = 0
+        self.statistics = {}
+        self.messages = []
+
+
+_recorder = contextvars.ContextVar("timing_recorder", default=None)
+
+
+@contextlib.contextmanager
+def recording(recorder=None):
+    """Record timings and reports in the recorder instead of printing them."""
+    if recorder is None:
+        recorder = TimingRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextlib.contextmanager
+def _recorded_timing(recorder, text):
+    record = {"name": text, "depth": recorder.depth}
+    recorder.records.append(record)
+    recorder.depth += 1
+    start_clock = time.thread_time()
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["cpu"] = time.thread_time() - start_clock
+        record["wall"] = time.perf_counter() - start_time
+        recorder.depth -= 1
+
+
 @contextlib.contextmanager
 def timing(text, block=False):
+    recorder = _recorder.get()
+    if recorder is not None:
+        with _recorded_timing(recorder, text):
+            yield
+        return
     timer = Timer()
     if block:
         print("%s..." % text)
@@ -33,3 +86,18 @@ def timing(text, block=False):
     else:
         print(timer)
     sys.stdout.flush()
+
+
+def report(text, **statistics):
+    """Print a line of translator output.
+
+    While a recorder is active, the statistics are stored in it instead,
+    or the text if no statistics are given.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        print(text)
+    elif statistics:
+        recorder.statistics.update(statistics)
+    else:
+        recorder.messages.append(text)
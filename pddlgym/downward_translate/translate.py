@@ -1,6 +1,7 @@
 #! /usr/bin/env python3
 
 
+import contextvars
 import os
 import sys
 import traceback
@@ -12,23 +13,25 @@ if not python_version_supported():
     sys.exit("Error: Translator only supports Python >= 3.6.")
 
 
-from collections import defaultdict
+import signal
+
+from collections import Counter, defaultdict
 from copy import deepcopy
 from itertools import product
 
-import axiom_rules
-import fact_groups
-import instantiate
-import normalize
-import options
-import pddl
-import pddl_parser
-import sas_tasks
-import signal
-import simplify
-import timers
-import tools
-import variable_order
+from . import axiom_rules
+from . import fact_groups
+from . import instantiate
+from . import normalize
+from . import options
+from . import pddl
+from . import pddl_parser
+from . import relevance
+from . import sas_tasks
+from . import simplify
+from . import timers
+from . import tools
+from . import variable_order
 
 # TODO: The translator may generate trivial derived variables which are always
 # true, for example if there ia a derived predicate in the input that only
@@ -48,8 +51,8 @@ DEBUG = False
 TRANSLATE_OUT_OF_MEMORY = 20
 TRANSLATE_OUT_OF_TIME = 21
 
-simplified_effect_condition_counter = 0
-added_implied_precondition_counter = 0
+# Statistics of the current pddl_to_sas call
+_counters = contextvars.ContextVar("translate_counters")
 
 
 def strips_to_sas_dictionary(groups, assert_partial):
@@ -297,12 +300,10 @@ def build_sas_operator(name, condition, effects_by_variable, cost, ranges,
                 if prune_stupid_effect_conditions(var, post,
                                                   eff_condition_lists,
                                                   effects_on_var):
-                    global simplified_effect_condition_counter
-                    simplified_effect_condition_counter += 1
+                    _counters.get()["simplified_effect_conditions"] += 1
                 if (options.add_implied_preconditions and pre == -1 and
                         (var, 1 - post) in implied_precondition):
-                    global added_implied_precondition_counter
-                    added_implied_precondition_counter += 1
+                    _counters.get()["added_implied_preconditions"] += 1
                     pre = 1 - post
             for eff_condition in eff_condition_lists:
                 # we do not need to represent a precondition as effect condition
@@ -513,14 +514,18 @@ def trivial_task(solvable):
                              operators, axioms, metric)
 
 def solvable_sas_task(msg):
-    print("%s! Generating solvable task..." % msg)
+    timers.report("%s! Generating solvable task..." % msg)
     return trivial_task(solvable=True)
 
 def unsolvable_sas_task(msg):
-    print("%s! Generating unsolvable task..." % msg)
+    timers.report("%s! Generating unsolvable task..." % msg)
     return trivial_task(solvable=False)
 
 def pddl_to_sas(task):
+    if options.relevance_analysis:
+        with timers.timing("Restricting task to relevant part", block=True):
+            task = relevance.restrict_task(task)
+
     with timers.timing("Instantiating", block=True):
         (relaxed_reachable, atoms, actions, axioms,
          reachable_action_params) = instantiate.explore(task)
@@ -563,20 +568,27 @@ def pddl_to_sas(task):
             # information for the full encoding can incur an
             # unacceptable (quadratic) blowup in the task representation
             # size. See issue771 for details.
-            print("using full encoding: between-variable mutex information skipped.")
+            timers.report("using full encoding: between-variable mutex information skipped.")
             mutex_key = []
 
-    with timers.timing("Translating task", block=True):
-        sas_task = translate_task(
-            strips_to_sas, ranges, translation_key,
-            mutex_dict, mutex_ranges, mutex_key,
-            task.init, goal_list, actions, axioms, task.use_min_cost_metric,
-            implied_facts)
-
-    print("%d effect conditions simplified" %
-          simplified_effect_condition_counter)
-    print("%d implied preconditions added" %
-          added_implied_precondition_counter)
+    counters = Counter()
+    token = _counters.set(counters)
+    try:
+        with timers.timing("Translating task", block=True):
+            sas_task = translate_task(
+                strips_to_sas, ranges, translation_key,
+                mutex_dict, mutex_ranges, mutex_key,
+                task.init, goal_list, actions, axioms, task.use_min_cost_metric,
+                implied_facts)
+    finally:
+        _counters.reset(token)
+
+    timers.report("%d effect conditions simplified" %
+                  counters["simplified_effect_conditions"],
+                  simplified_effect_conditions=counters["simplified_effect_conditions"])
+    timers.report("%d implied preconditions added" %
+                  counters["added_implied_preconditions"],
+                  added_implied_preconditions=counters["added_implied_preconditions"])
 
     if options.filter_unreachable_facts:
         with timers.timing("Detecting unreachable propositions", block=True):
@@ -607,7 +619,7 @@ def build_mutex_key(strips_to_sas, groups):
                 assert len(represented_by) == 1
                 group_key.append(represented_by[0])
             else:
-                print("not in strips_to_sas, left out:", fact)
+                timers.report("not in strips_to_sas, left out: %s" % (fact,))
         group_keys.append(group_key)
     return group_keys
 
@@ -679,6 +691,79 @@ def dump_statistics(sas_task):
         print("Translator peak memory: %d KB" % peak_memory)
 
 
+def remove_delete_effects(task):
+    for action in task.actions:
+        for index, effect in reversed(list(enumerate(action.effects))):
+            if effect.literal.negated:
+                del action.effects[index]
+
+
+def _is_filename(obj):
+    return isinstance(obj, (str, os.PathLike))
+
+
+def _open_task(domain, problem):
+    """Create a pddl.Task from file names or pddlgym objects."""
+    if _is_filename(domain) and _is_filename(problem):
+        return pddl_parser.open(domain_filename=os.fspath(domain),
+                                task_filename=os.fspath(problem))
+    # Imported here since pddlgym itself uses the translator
+    from pddlgym.downward_task import DownwardTaskBuilder
+    from pddlgym.parser import PDDLProblemParser
+    from pddlgym.structs import State
+    if _is_filename(domain):
+        domain = os.fspath(domain)
+    elif _is_filename(problem):
+        problem = PDDLProblemParser(
+            os.fspath(problem), domain.domain_name, domain.types,
+            domain.predicates, domain.actions, domain.constants)
+    if not isinstance(problem, State):
+        # A PDDLProblemParser
+        problem = State(frozenset(problem.initial_state),
+                        frozenset(problem.objects), problem.goal)
+    return DownwardTaskBuilder(domain)(problem)
+
+
+def translate(domain, problem, **opts):
+    """Translate a PDDL task into a SASTask.
+
+    Parameters
+    ----------
+    domain : str or os.PathLike or PDDLDomain
+        The domain file or a parsed pddlgym domain.
+    problem : str or os.PathLike or State or PDDLProblemParser
+        The problem file, a pddlgym State (whose goal is used) or a parsed
+        pddlgym problem.
+    **opts
+        Translator options, named as in options.TranslateOptions, e.g.
+        model_engine="relational". They only apply to this call, so
+        translate can run concurrently in several threads or processes.
+
+    Returns
+    -------
+    sas_task : SASTask
+        The translated task. Nothing is printed: the timings of the
+        translation steps, the statistics (e.g. the number of generated
+        rules) and other messages of the translator are stored in
+        sas_task.timings, sas_task.statistics and sas_task.messages, as
+        collected by timers.TimingRecorder.
+    """
+    translate_options = options.TranslateOptions(**opts)
+    with options.use(translate_options), timers.recording() as recorder:
+        with timers.timing("Translating", block=True):
+            with timers.timing("Parsing"):
+                task = _open_task(domain, problem)
+            with timers.timing("Normalizing task"):
+                normalize.normalize(task)
+            if options.generate_relaxed_task:
+                remove_delete_effects(task)
+            sas_task = pddl_to_sas(task)
+    sas_task.timings = recorder.records
+    sas_task.statistics = recorder.statistics
+    sas_task.messages = recorder.messages
+    return sas_task
+
+
 def main():
     timer = timers.Timer()
     with timers.timing("Parsing", True):
@@ -689,18 +774,17 @@ def main():
         normalize.normalize(task)
 
     if options.generate_relaxed_task:
-        # Remove delete effects.
-        for action in task.actions:
-            for index, effect in reversed(list(enumerate(action.effects))):
-                if effect.literal.negated:
-                    del action.effects[index]
+        remove_delete_effects(task)
 
     sas_task = pddl_to_sas(task)
     dump_statistics(sas_task)
 
     with timers.timing("Writing output"):
-        with open(options.sas_file, "w") as output_file:
-            sas_task.output(output_file)
+        if options.sas_format == "binary":
+            sas_task.output_binary(options.sas_file)
+        else:
+            with open(options.sas_file, "w") as output_file:
+                sas_task.output(output_file)
     print("Done! %s" % timer)
 
 
@@ -724,6 +808,7 @@ if __name__ == "__main__":
         # Reserve about 10 MB of emergency memory.
         # https://stackoverflow.com/questions/19469608/
         emergency_memory = b"x" * 10**7
+        options.setup()
         main()
     except MemoryError:
         del emergency_memory
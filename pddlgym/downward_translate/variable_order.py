@@ -3,6 +3,7 @@ from itertools import chain
 import heapq
 
 from . import sccs
+from . import timers
 
 DEBUG = False
 
@@ -228,8 +229,9 @@ class VariableOrder:
             if facts and len({var for var, _ in facts}) > 1:
                 group.facts = facts
                 new_mutexes.append(group)
-        print("%s of %s mutex groups necessary." % (len(new_mutexes),
-                                                    len(mutexes)))
+        timers.report("%s of %s mutex groups necessary." % (
+            len(new_mutexes), len(mutexes)),
+            necessary_mutex_groups=len(new_mutexes))
         mutexes[:] = new_mutexes
 
     def _apply_to_operators(self, operators):
@@ -249,8 +251,9 @@ class VariableOrder:
                               for var, val in op.prevail
                               if var in self.new_var]
                 new_ops.append(op)
-        print("%s of %s operators necessary." % (len(new_ops),
-                                                 len(operators)))
+        timers.report("%s of %s operators necessary." % (
+            len(new_ops), len(operators)),
+            necessary_operators=len(new_ops))
         operators[:] = new_ops
 
     def _apply_to_axioms(self, axioms):
@@ -263,8 +266,9 @@ class VariableOrder:
                                 if var in self.new_var]
                 ax.effect = (self.new_var[eff_var], eff_val)
                 new_axioms.append(ax)
-        print("%s of %s axiom rules necessary." % (len(new_axioms),
-                                                   len(axioms)))
+        timers.report("%s of %s axiom rules necessary." % (
+            len(new_axioms), len(axioms)),
+            necessary_axioms=len(new_axioms))
         axioms[:] = new_axioms
 
 
@@ -278,7 +282,8 @@ def find_and_apply_variable_order(sas_task, reorder_vars=True,
             order = list(range(len(sas_task.variables.ranges)))
         if filter_unimportant_vars:
             necessary = cg.calculate_important_vars(sas_task.goal)
-            print("%s of %s variables necessary." % (len(necessary),
-                                                     len(order)))
+            timers.report("%s of %s variables necessary." % (
+                len(necessary), len(order)),
+                necessary_variables=len(necessary))
             order = [var for var in order if necessary[var]]
         VariableOrder(order).apply_to_task(sas_task)
@@ -4,8 +4,22 @@ from pddlgym.structs import (Type, Predicate, LiteralConjunction, LiteralDisjunc
                              Not, Anti, ForAll, Exists, ProbabilisticEffect,
                              TypedEntity, ground_literal, DerivedPredicate)
 
+import hashlib
+import os
+import pickle
 import re
+import tempfile
 
+# A PDDL comment runs from ";" to the end of the line
+_COMMENT_RE = re.compile(r";[^\n]*")
+_TOKEN_RE = re.compile(r"[()]|[^\s()]+")
+
+# Parsed problems are cached here across runs; set PDDLGYM_PROBLEM_CACHE_DIR
+# to an empty string to disable caching.
+PROBLEM_CACHE_DIR = os.environ.get("PDDLGYM_PROBLEM_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "pddlgym", "problems")) or None
+# Bump when the parsed representation changes
+PROBLEM_CACHE_VERSION = 1
 
 FAST_DOWNWARD_STR = """
 (define (problem {problem}) (:domain {domain})
@@ -97,29 +111,31 @@ class PDDLParser:
         """Parse the given string (representing either preconditions or effects)
         into a literal. Check against params to make sure typing is correct.
         """
-        assert string[0] == "("
-        assert string[-1] == ")"
-        if string.startswith("(and") and string[4] in (" ", "\n", "("):
-            clauses = self._find_all_balanced_expressions(string[4:-1].strip())
-            return LiteralConjunction([self._parse_into_literal(clause, params, 
-                                       is_effect=is_effect) for clause in clauses])
-        if string.startswith("(or") and string[3] in (" ", "\n", "("):
-            clauses = self._find_all_balanced_expressions(string[3:-1].strip())
-            return LiteralDisjunction([self._parse_into_literal(clause, params,
-                                       is_effect=is_effect) for clause in clauses])
-        if string.startswith("(imply") and string[6] in (" ", "\n", "("):
-            clauses = self._find_all_balanced_expressions(string[6:-1].strip())
-            assert len(clauses) == 2
+        return self._parse_expression_into_literal(
+            self._parse_expression(string), params, is_effect=is_effect)
+
+    def _parse_expression_into_literal(self, expr, params, is_effect=False):
+        """Parse the given nested list (see _parse_expression) into a literal.
+        Check against params to make sure typing is correct.
+        """
+        assert isinstance(expr, list), "Expected an expression, got {}".format(expr)
+        head = expr[0] if expr else None
+        if head == "and":
+            return LiteralConjunction([self._parse_expression_into_literal(clause, params,
+                                       is_effect=is_effect) for clause in expr[1:]])
+        if head == "or":
+            return LiteralDisjunction([self._parse_expression_into_literal(clause, params,
+                                       is_effect=is_effect) for clause in expr[1:]])
+        if head == "imply":
+            assert len(expr) == 3
             assert not is_effect, "Imply is only allowed in preconditions"
-            premise = self._parse_into_literal(clauses[0], params, is_effect=is_effect)
-            implic = self._parse_into_literal(clauses[1], params, is_effect=is_effect)
+            premise = self._parse_expression_into_literal(expr[1], params, is_effect=is_effect)
+            implic = self._parse_expression_into_literal(expr[2], params, is_effect=is_effect)
             return LiteralDisjunction([Not(premise), implic])
-        if string.startswith("(forall") and string[7] in (" ", "\n", "("):
-            new_binding, clause = self._find_all_balanced_expressions(
-                string[7:-1].strip())
-            new_name, new_type_name = new_binding.strip()[1:-1].split("-", 1)
-            new_name = new_name.strip()
-            new_type_name = new_type_name.strip()
+        if head == "forall":
+            _, new_binding, clause = expr
+            assert len(new_binding) == 3 and new_binding[1] == "-"
+            new_name, _, new_type_name = new_binding
             assert new_name not in params, "ForAll variable {} already exists".format(new_name)
             new_entity_type = self.types[new_type_name]
             new_entity = TypedEntity(new_name, new_entity_type)
@@ -128,17 +144,17 @@ class PDDLParser:
             else:
                 new_params = params.copy()
                 new_params[new_name] = self.types[new_type_name]
-            result = ForAll(self._parse_into_literal(clause, new_params, is_effect=is_effect),
+            result = ForAll(self._parse_expression_into_literal(clause, new_params,
+                                                                is_effect=is_effect),
                             new_entity)
             return result
-        if string.startswith("(exists") and string[7] in (" ", "\n", "("):
-            new_binding, clause = self._find_all_balanced_expressions(
-                string[7:-1].strip())
-            if new_binding[1:-1] == "":
+        if head == "exists":
+            _, new_binding, clause = expr
+            if not new_binding:
                 # Handle existential goal with no arguments.
-                body = self._parse_into_literal(clause, params, is_effect=is_effect)
+                body = self._parse_expression_into_literal(clause, params, is_effect=is_effect)
                 return body
-            variables = self.parse_objects(new_binding[1:-1], self.types, 
+            variables = self.parse_objects(new_binding, self.types,
                 uses_typing=self.uses_typing)
             if isinstance(params, list):
                 for v in variables:
@@ -146,7 +162,7 @@ class PDDLParser:
             else:
                 for v in variables:
                     params[v.name] = v.var_type
-            body = self._parse_into_literal(clause, params, is_effect=is_effect)
+            body = self._parse_expression_into_literal(clause, params, is_effect=is_effect)
             result = Exists(variables, body)
             if isinstance(params, list):
                 for v in variables:
@@ -155,26 +171,23 @@ class PDDLParser:
                 for v in variables:
                     del params[v.name]
             return result
-        if string.startswith("(probabilistic") and string[14] in (" ", "\n", "("):
+        if head == "probabilistic":
             assert is_effect, "We only support probabilistic effects"
             lits = []
             probs = []
-            expr = string[14:-1].strip()
-            for match in re.finditer("(\d*\.?\d+)", expr):
-                prob = float(match.group())
-                subexpr = self._find_balanced_expression(expr[match.end():].strip(), 0)
-                lit = self._parse_into_literal(subexpr, params, is_effect=is_effect)
+            for prob, subexpr in zip(expr[1::2], expr[2::2]):
+                lit = self._parse_expression_into_literal(subexpr, params, is_effect=is_effect)
                 lits.append(lit)
-                probs.append(prob)
+                probs.append(float(prob))
             return ProbabilisticEffect(lits, probs)
-        if string.startswith("(not") and string[4] in (" ", "\n", "("):
-            clause = string[4:-1].strip()
+        if head == "not":
+            assert len(expr) == 2
+            clause = expr[1]
             if is_effect:
-                return Anti(self._parse_into_literal(clause, params, is_effect=is_effect))
+                return Anti(self._parse_expression_into_literal(clause, params, is_effect=is_effect))
             else:
-                return Not(self._parse_into_literal(clause, params, is_effect=is_effect))
-        string = string[1:-1].split()
-        pred, args = string[0], string[1:]
+                return Not(self._parse_expression_into_literal(clause, params, is_effect=is_effect))
+        pred, args = head, expr[1:]
         typed_args = []
         # Validate types against the given params dict.
         assert pred in self.predicates, "Predicate {} is not defined".format(pred)
@@ -184,7 +197,9 @@ class PDDLParser:
                 raise Exception("Argument {} not in params {}".format(arg, params))
             assert arg in params, "Argument {} is not in the params".format(arg)
             if isinstance(params, dict):
-                typed_arg = TypedEntity(arg, params[arg])
+                typed_arg = params[arg]
+                if not isinstance(typed_arg, TypedEntity):
+                    typed_arg = TypedEntity(arg, typed_arg)
             else:
                 typed_arg = params[params.index(arg)]
             typed_args.append(typed_arg)
@@ -192,46 +207,30 @@ class PDDLParser:
 
     @staticmethod
     def parse_objects(objects, types, uses_typing=False):
-        if uses_typing:
-            split_objects = []
-            remaining_str = objects
-            while True:
-                try:
-                    obj, remaining_str = re.split(r"\s-\s|\n-\s", remaining_str, 1)
-                except ValueError:
-                    break
-                if " " in remaining_str:
-                    object_type, remaining_str = re.split(r"[\s]+|[\n]+", remaining_str, 1)
-                else:
-                    object_type = remaining_str
-                    remaining_str = ""
-                split_objects.append(obj + " - " + object_type)
-            objects = split_objects
-        else:
-            objects = objects.split()
+        """Parse a (typed) list of names, given as a string or as a list
+        of tokens, into a sorted list of TypedEntity objects.
+        """
+        if isinstance(objects, str):
+            objects = PDDLParser._tokenize(objects)
         obj_names = []
         obj_type_names = []
-        for obj in objects:
-            if uses_typing:
-                obj_name, obj_type_name = obj.strip().split(" - ")
-                obj_name = obj_name.strip()
-                obj_type_name = obj_type_name.strip()
-                if len(obj_name.split()) > 1:
-                    for single_obj_name in obj_name.split():
-                        obj_names.append(single_obj_name.strip())
-                        obj_type_names.append(obj_type_name)
-                else:
-                    obj_names.append(obj_name)
-                    obj_type_names.append(obj_type_name)
-            else:
-                obj_name = obj.strip()
-                if " - " in obj_name:
-                    obj_name, temp = obj_name.split(" - ")
-                    obj_name = obj_name.strip()
-                    assert temp == "default"
-                obj_type_name = "default"
-                obj_names.append(obj_name)
-                obj_type_names.append(obj_type_name)
+        pending_names = []
+        tokens = iter(objects)
+        for token in tokens:
+            assert isinstance(token, str), "Unexpected expression {}".format(token)
+            if token != "-":
+                pending_names.append(token)
+                continue
+            obj_type_name = next(tokens)
+            if not uses_typing:
+                assert obj_type_name == "default"
+            obj_names.extend(pending_names)
+            obj_type_names.extend([obj_type_name] * len(pending_names))
+            pending_names = []
+        # With typing, trailing names without a type annotation are ignored
+        if not uses_typing:
+            obj_names.extend(pending_names)
+            obj_type_names.extend(["default"] * len(pending_names))
         to_return = set()
         for obj_name, obj_type_name in zip(obj_names, obj_type_names):
             if obj_type_name not in types:
@@ -245,12 +244,43 @@ class PDDLParser:
 
     def _purge_comments(self, pddl_str):
         # Purge comments from the given string.
-        while True:
-            match = re.search(r";(.*)\n", pddl_str)
-            if match is None:
-                return pddl_str
-            start, end = match.start(), match.end()
-            pddl_str = pddl_str[:start]+pddl_str[end-1:]
+        return _COMMENT_RE.sub("", pddl_str)
+
+    @staticmethod
+    def _tokenize(string):
+        """Split a (comment-free) PDDL string into parentheses and names.
+        """
+        return _TOKEN_RE.findall(string)
+
+    @staticmethod
+    def _parse_nested_list(tokens):
+        """Build nested lists from a token list in a single pass, similar
+        to downward_translate.pddl_parser.lisp_parser. Returns the list of
+        top-level expressions.
+        """
+        stack = [[]]
+        for token in tokens:
+            if token == "(":
+                expr = []
+                stack[-1].append(expr)
+                stack.append(expr)
+            elif token == ")":
+                stack.pop()
+                assert stack, "Unbalanced ')'"
+            else:
+                stack[-1].append(token)
+        assert len(stack) == 1, "Missing ')'"
+        return stack[0]
+
+    @classmethod
+    def _parse_expression(cls, string):
+        """Parse a string holding exactly one balanced expression into
+        nested lists.
+        """
+        exprs = cls._parse_nested_list(cls._tokenize(string))
+        assert len(exprs) == 1 and isinstance(exprs[0], list), \
+            "Expected one expression, got {}".format(string)
+        return exprs[0]
 
     @staticmethod
     def _find_balanced_expression(string, index):
@@ -321,6 +351,8 @@ class PDDLDomain:
         self.actions = actions
         self.operators_as_actions = operators_as_actions
         self.is_probabilistic = is_probabilistic
+        # Cached domain PDDL text, see pddl_str
+        self._pddl_str = None
 
     @property
     def type_to_parent_types(self):
@@ -343,6 +375,7 @@ class PDDLDomain:
                         op.effects.literals[i] = chosen_effect
             for rem in toremove:  # remove effects where NOCHANGE is max-probability
                 op.effects.literals.remove(rem)
+        self.invalidate_pddl_str()
 
     def _organize_parent_types(self):
         """Create dict of type -> parent types from type hierarchy
@@ -366,6 +399,23 @@ class PDDLDomain:
     def write(self, fname):
         """Write the domain PDDL string to a file.
         """
+        with open(fname, 'w') as f:
+            f.write(self.pddl_str())
+
+    def pddl_str(self):
+        """Get the domain PDDL string. It is generated once and cached, so
+        call invalidate_pddl_str after modifying the domain in place.
+        """
+        if self.__dict__.get("_pddl_str") is None:
+            self._pddl_str = self._create_pddl_str()
+        return self._pddl_str
+
+    def invalidate_pddl_str(self):
+        """Drop the cached domain PDDL string.
+        """
+        self._pddl_str = None
+
+    def _create_pddl_str(self):
         predicates = "\n\t".join([lit.pddl_str() for lit in self.predicates.values()])
         operators = "\n\t".join([op.pddl_str() for op in self.operators.values()])
         if self.constants:
@@ -395,9 +445,7 @@ class PDDLDomain:
         """.format(self.domain_name, requirements, self._types_pddl_str(),
                    constants, predicates, " ".join(map(str, self.actions)), operators,
                    self._derived_preds_pddl_str())
-
-        with open(fname, 'w') as f:
-            f.write(domain_str)
+        return domain_str
 
     def _types_pddl_str(self):
         if self.type_hierarchy:
@@ -604,17 +652,40 @@ class PDDLDomainParser(PDDLParser, PDDLDomain):
                 op_name, params, preconds, effects)
 
 
+class _SortedLiteralFragments:
+    """Emit the PDDL strings of non-derived literals sorted by repr.
+
+    The sorted fragments of the last serialized state are kept, so that a
+    subset of it (e.g., the object-restricted states written repeatedly
+    while planning) is emitted by filtering that list instead of re-sorting.
+    """
+    def __init__(self):
+        # (frozenset of literals, [(literal, PDDL string)] in sorted order)
+        self._reference = None
+
+    def fragments(self, literals):
+        if not isinstance(literals, (set, frozenset)):
+            literals = frozenset(literals)
+        reference = self._reference
+        # Filtering costs O(len(reference)), so only worth it for large subsets
+        if reference is not None and 4*len(literals) >= len(reference[0]) \
+                and literals <= reference[0]:
+            return [frag for lit, frag in reference[1] if lit in literals]
+        entries = [(lit, lit.pddl_str()) for lit in sorted(literals, key=str)
+                   if not lit.predicate.is_derived]
+        if reference is None or not literals <= reference[0]:
+            self._reference = (frozenset(literals), entries)
+        return [frag for _, frag in entries]
+
+
+_INIT_FRAGMENTS = _SortedLiteralFragments()
+
+
 class PDDLProblemParser(PDDLParser):
     """PDDL problem parsing class.
     """
     def __init__(self, problem_fname, domain_name, types, predicates, action_names, constants=None):
-        self.problem_fname = problem_fname
-        self.domain_name = domain_name
-        self.types = types
-        self.predicates = predicates
-        self.action_names = action_names
-        self.uses_typing = not ("default" in self.types)
-        self.constants = constants or []
+        self._setup(problem_fname, domain_name, types, predicates, action_names, constants)
 
         self.problem_name = None
         # Set of objects, each is a structs.TypedEntity object.
@@ -625,29 +696,40 @@ class PDDLProblemParser(PDDLParser):
         self.goal = None
 
         ## Read files.
-        with open(problem_fname, "r") as f:
-            self.problem = f.read().lower()
-        self.problem = self._purge_comments(self.problem)
-        assert ";" not in self.problem
+        self._read_problem()
 
         ## Run parsing.
         self._parse_problem()
 
+    def _setup(self, problem_fname, domain_name, types, predicates, action_names, constants):
+        self.problem_fname = problem_fname
+        self.domain_name = domain_name
+        self.types = types
+        self.predicates = predicates
+        self.action_names = action_names
+        self.uses_typing = not ("default" in self.types)
+        self.constants = constants or []
+
+    def _read_problem(self):
+        with open(self.problem_fname, "r") as f:
+            self.problem = f.read().lower()
+        self.problem = self._purge_comments(self.problem)
+
     def _parse_problem(self):
-        patt = r"\(problem(.*?)\)"
-        self.problem_name = re.search(patt, self.problem).groups()[0].strip()
-        patt = r"\(:domain(.*?)\)"
-        domain_name = re.search(patt, self.problem).groups()[0].strip()
+        # Tokenize once and index the top-level sections by keyword
+        define = self._parse_expression(self.problem)
+        assert define[0] == "define"
+        sections = {expr[0]: expr for expr in define[1:]}
+        self.problem_name = sections["problem"][1]
+        domain_name = sections[":domain"][1]
         assert domain_name == self.domain_name, "Problem file doesn't match the domain file!"
-        self._parse_problem_objects()
-        self._parse_problem_initial_state()
-        self._parse_problem_goal()
-
-    def _parse_problem_objects(self):
-        start_ind = re.search(r"\(:objects", self.problem).start()
-        objects = self._find_balanced_expression(self.problem, start_ind)
-        objects = objects[9:-1].strip()
-        if objects == "":
+        self._parse_problem_objects(sections[":objects"])
+        self._parse_problem_initial_state(sections[":init"])
+        self._parse_problem_goal(sections[":goal"])
+
+    def _parse_problem_objects(self, objects):
+        objects = objects[1:]
+        if not objects:
             self.objects = []
         else:
             self.objects = self.parse_objects(objects, self.types, 
@@ -655,14 +737,12 @@ class PDDLProblemParser(PDDLParser):
         # Add constants to objects
         self.objects += self.constants
 
-    def _parse_problem_initial_state(self):
-        start_ind = re.search(r"\(:init", self.problem).start()
-        init = self._find_balanced_expression(self.problem, start_ind)
-        fluents = self._find_all_balanced_expressions(init[6:-1].strip())
+    def _parse_problem_initial_state(self, init):
         initial_lits = set()
-        params = {obj.name: obj.var_type for obj in self.objects}
-        for fluent in fluents:
-            lit = self._parse_into_literal(fluent, params)
+        # Reuse the object entities rather than creating new ones per fluent
+        params = {obj.name: obj for obj in self.objects}
+        for fluent in init[1:]:
+            lit = self._parse_expression_into_literal(fluent, params)
             if lit.predicate.name in self.action_names:
                 continue
             initial_lits.add(lit)
@@ -673,12 +753,10 @@ class PDDLProblemParser(PDDLParser):
                 initial_lits.add(eq(obj, obj))
         self.initial_state = frozenset(initial_lits)
 
-    def _parse_problem_goal(self):
-        start_ind = re.search(r"\(:goal", self.problem).start()
-        goal = self._find_balanced_expression(self.problem, start_ind)
-        goal = goal[6:-1].strip()
+    def _parse_problem_goal(self, goal):
+        assert len(goal) == 2
         params = {obj.name: obj.var_type for obj in self.objects}
-        self.goal = self._parse_into_literal(goal, params)
+        self.goal = self._parse_expression_into_literal(goal[1], params)
 
     @staticmethod
     def pddl_string(objects, initial_state, problem_name, domain_name, goal,
@@ -687,8 +765,7 @@ class PDDLProblemParser(PDDLParser):
         """
         objects_typed = "\n\t".join(list(sorted(map(lambda o: str(o).replace(":", " - "),
                                                     objects))))
-        init_state = "\n\t".join([lit.pddl_str() for lit in sorted(initial_state)
-                                  if not lit.predicate.is_derived])
+        init_state = "\n\t".join(_INIT_FRAGMENTS.fragments(initial_state))
 
         problem_str = FAST_DOWNWARD_STR if fast_downward_order else PROBLEM_STR
         return problem_str.format(
@@ -745,41 +822,181 @@ class PDDLProblemParser(PDDLParser):
         )
 
 
+class LazyPDDLProblemParser(PDDLProblemParser):
+    """A PDDLProblemParser that defers reading and parsing its file until
+    one of the parsed fields (problem_name, objects, initial_state, goal)
+    is first accessed.
+
+    If cache_dir is given, parsed fields are pickled there, keyed by the
+    problem file path, its mtime and domain_hash, so that later processes
+    skip parsing the same file.
+    """
+    _PARSED_FIELDS = ("problem_name", "objects", "initial_state", "goal")
+
+    def __init__(self, problem_fname, domain_name, types, predicates, action_names,
+                 constants=None, cache_dir=None, domain_hash=None):
+        self._setup(problem_fname, domain_name, types, predicates, action_names, constants)
+        self._cache_dir = cache_dir
+        self._domain_hash = domain_hash
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set yet
+        if name == "problem":
+            self._read_problem()
+            return self.problem
+        if name not in self._PARSED_FIELDS:
+            raise AttributeError(name)
+        self._load()
+        return self.__dict__[name]
+
+    @property
+    def is_loaded(self):
+        """Whether the problem has been parsed or read from the cache.
+        """
+        return "goal" in self.__dict__
+
+    def _load(self):
+        cache_fname = self._cache_fname()
+        if cache_fname is not None and os.path.exists(cache_fname):
+            try:
+                with open(cache_fname, "rb") as f:
+                    fields = pickle.load(f)
+                self.__dict__.update(zip(self._PARSED_FIELDS, fields))
+                return
+            except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+                pass
+        self._read_problem()
+        self._parse_problem()
+        if cache_fname is not None:
+            self._write_cache(cache_fname)
+
+    def _cache_fname(self):
+        if self._cache_dir is None:
+            return None
+        key = "{}|{}|{}|{}".format(PROBLEM_CACHE_VERSION,
+            os.path.abspath(self.problem_fname),
+            os.stat(self.problem_fname).st_mtime_ns, self._domain_hash)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self._cache_dir, digest + ".pkl")
+
+    def _write_cache(self, cache_fname):
+        fields = tuple(getattr(self, field) for field in self._PARSED_FIELDS)
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            # Write to a temp file and rename so concurrent readers never
+            # see a partial pickle
+            fd, tmp_fname = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(fields, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_fname, cache_fname)
+        except OSError:
+            # Caching is best-effort
+            pass
+
+
+def domain_hash(domain):
+    """Hash of a parsed domain's PDDL text and action names, used to key
+    cached problems.
+    """
+    actions = " ".join(sorted(map(str, domain.actions)))
+    text = "{}|{}|{}".format(domain.domain, actions, domain.operators_as_actions)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class InvalidPlanStep(Exception):
+    """Raised when a planner's plan step cannot be mapped to an action.
+    """
+    pass
+
+
+class PlanDecoder:
+    """Convert plan steps output by a planner into ground action literals.
+
+    Built once per (domain, objects) with name lookup tables, so decoding a
+    plan step costs O(arity).
+
+    Parameters
+    ----------
+    operators : [ Operator ]
+    action_predicates : [ Predicate ]
+    objects : { TypedEntity }
+        Objects (including constants) that plan steps may refer to.
+    operators_as_actions : bool
+        See PDDLEnv.
+    """
+    def __init__(self, operators, action_predicates, objects, operators_as_actions=False):
+        self.operators_as_actions = operators_as_actions
+        self._object_name_to_object = {}
+        self._ambiguous_object_names = set()
+        for obj in objects:
+            # TypedEntity compares as its name, so compare name and type
+            if str(self._object_name_to_object.setdefault(obj.name, obj)) != str(obj):
+                self._ambiguous_object_names.add(obj.name)
+        self._name_to_action_predicate = {a.name.lower(): a for a in action_predicates}
+        # Operator name -> (operator, lifted action literal in its preconditions)
+        self._name_to_operator = {}
+        if not operators_as_actions:
+            action_predicates = set(action_predicates)
+            for op in operators:
+                action_literal = None
+                for cond in op.preconds.literals:
+                    if cond.predicate in action_predicates:
+                        action_literal = cond
+                        break
+                self._name_to_operator[op.name.lower()] = (op, action_literal)
+
+    def decode(self, plan_steps):
+        """Decode a list of plan steps, e.g. ["move a b", ...].
+        """
+        return [self.decode_step(plan_step) for plan_step in plan_steps]
+
+    def decode_step(self, plan_step):
+        """Decode a single plan step into a ground action literal.
+        """
+        plan_step_split = plan_step.split()
+        if not plan_step_split:
+            raise InvalidPlanStep("Empty plan step")
+        name, object_names = plan_step_split[0].lower(), plan_step_split[1:]
+        args = [self._get_object(obj_name, plan_step) for obj_name in object_names]
+
+        if self.operators_as_actions:
+            action_predicate = self._name_to_action_predicate.get(name)
+            if action_predicate is None:
+                raise InvalidPlanStep("Unknown action '{}' in plan step `{}`".format(
+                    name, plan_step))
+            if action_predicate.arity != len(args):
+                raise InvalidPlanStep("Wrong number of arguments in plan step `{}`".format(
+                    plan_step))
+            return action_predicate(*args)
+
+        # Get the operator from its name
+        if name not in self._name_to_operator:
+            raise InvalidPlanStep("Unknown operator '{}' in plan step `{}`".format(
+                name, plan_step))
+        operator, action_literal = self._name_to_operator[name]
+        if len(args) != len(operator.params):
+            raise InvalidPlanStep("Wrong number of arguments in plan step `{}`".format(
+                plan_step))
+        if action_literal is None:
+            raise InvalidPlanStep("Operator '{}' has no action predicate in its "
+                                  "preconditions: `{}`".format(name, plan_step))
+        assignments = dict(zip(operator.params, args))
+        return ground_literal(action_literal, assignments)
+
+    def _get_object(self, obj_name, plan_step):
+        if obj_name in self._ambiguous_object_names:
+            raise InvalidPlanStep("Ambiguous object '{}' in plan step `{}`".format(
+                obj_name, plan_step))
+        try:
+            return self._object_name_to_object[obj_name]
+        except KeyError:
+            raise InvalidPlanStep("Unknown object '{}' in plan step `{}`".format(
+                obj_name, plan_step)) from None
+
+
 def parse_plan_step(plan_step, operators, action_predicates, objects, operators_as_actions=False):
-    plan_step_split = plan_step.split()
-
-    if operators_as_actions:
-        action_predicate = [a for a in action_predicates \
-            if a.name.lower() == plan_step_split[0].lower()][0]
-        object_names = plan_step_split[1:]
-        args = []
-        for name in object_names:
-            matches = [o for o in objects if o.name == name]
-            assert len(matches) == 1
-            args.append(matches[0])
-        return action_predicate(*args)
-
-    # Get the operator from its name
-    operator = None
-    for op in operators:
-        if op.name.lower() == plan_step_split[0]:
-            operator = op
-            break
-    assert operator is not None, "Unknown operator '{}'".format(plan_step_split[0])
-
-    assert len(plan_step_split) == len(operator.params) + 1
-    object_names = plan_step_split[1:]
-    args = []
-    for name in object_names:
-        matches = [o for o in objects if o.name == name]
-        assert len(matches) == 1
-        args.append(matches[0])
-    assignments = dict(zip(operator.params, args))
-
-    for cond in operator.preconds.literals:
-        if cond.predicate in action_predicates:
-            ground_action = ground_literal(cond, assignments)
-            return ground_action
-
-    import ipdb; ipdb.set_trace()
-    raise Exception("Unrecognized plan step: `{}`".format(str(plan_step)))
+    """Decode a single plan step. Prefer PlanDecoder when decoding a whole plan.
+    """
+    decoder = PlanDecoder(operators, action_predicates, objects,
+                          operators_as_actions=operators_as_actions)
+    return decoder.decode_step(plan_step)
@@ -5,41 +5,58 @@ each episode, since objects, and therefore possible
 groundings, may change with each new PDDL problem.
 """
 from pddlgym.structs import LiteralConjunction, Literal, ground_literal
-from pddlgym.parser import PDDLProblemParser
+from pddlgym.downward_task import DownwardTaskBuilder
 from pddlgym.downward_translate.instantiate import explore as downward_explore
-from pddlgym.downward_translate.pddl_parser import open as downward_open
 from pddlgym.utils import nostdout
 from gymnasium.spaces import Space
 from collections import defaultdict
 
-import os
-import tempfile
-import itertools
-
-TMP_PDDL_DIR = "/dev/shm" if os.path.exists("/dev/shm") else None
-
 
 class LiteralSpace(Space):
+    """Space of the ground literals of some predicates.
 
+    If a domain is given, groundings are restricted to argument combinations
+    that satisfy the static preconditions of some operator using the literal,
+    given the static facts of the current state.
+    """
     def __init__(self, predicates,
                  lit_valid_test=lambda state,lit: True,
                  type_hierarchy=None,
-                 type_to_parent_types=None):
+                 type_to_parent_types=None,
+                 domain=None):
         self.predicates = sorted(predicates)
         self.num_predicates = len(predicates)
         self._objects = None
+        self._all_ground_literals = None
         self._lit_valid_test = lit_valid_test
         self.type_hierarchy = type_hierarchy
         self._type_to_parent_types = type_to_parent_types
+        if domain is None:
+            self._static_predicate_names = None
+            self._static_constraints = {}
+        else:
+            self._static_predicate_names = get_static_predicate_names(domain)
+            self._static_constraints = get_static_constraints(
+                domain, self.predicates, self._static_predicate_names)
+        self._static_facts = None
         super().__init__()
 
     def _update_objects_from_state(self, state):
         """Given a state, extract the objects and if they have changed, 
         recompute all ground literals
         """
-        # Check whether the objects have changed
-        # If so, we need to recompute the ground literals
-        if state.objects == self._objects:
+        self._update_index(state)
+        if self._all_ground_literals is None:
+            self._all_ground_literals = sorted(self._compute_all_ground_literals(state))
+
+    def _update_index(self, state):
+        """Organize the objects of the state by type and index its static
+        facts, if they have changed. Invalidates the ground literals then.
+        """
+        # Check whether the objects (or the static facts that the groundings
+        # are restricted to) have changed
+        static_facts = self._get_static_facts(state)
+        if state.objects == self._objects and static_facts == self._static_facts:
             return
 
         # Organize objects by type
@@ -53,7 +70,26 @@ class LiteralSpace(Space):
                     self._type_to_objs[t].append(obj)
 
         self._objects = state.objects
-        self._all_ground_literals = sorted(self._compute_all_ground_literals(state))
+        if static_facts != self._static_facts:
+            self._static_facts = static_facts
+            self._index_static_facts()
+        self._all_ground_literals = None
+
+    def _get_static_facts(self, state):
+        if self._static_predicate_names is None:
+            return None
+        return frozenset((lit.predicate.name, tuple(lit.variables))
+                         for lit in state.literals
+                         if lit.predicate.name in self._static_predicate_names)
+
+    def _index_static_facts(self):
+        """Map (predicate name, argument index, other arguments) to the
+        objects at that index in the static facts.
+        """
+        self._static_index = defaultdict(set)
+        for name, args in self._static_facts or ():
+            for slot, obj in enumerate(args):
+                self._static_index[(name, slot, args[:slot] + args[slot+1:])].add(obj)
 
     def sample_literal(self, state):
         while True:
@@ -75,16 +111,149 @@ class LiteralSpace(Space):
         return set(l for l in self._all_ground_literals \
                    if self._lit_valid_test(state, l))
 
+    def ground_literals(self, state):
+        """Generate the ground literals of the state's objects, regardless of
+        validity, without building the sorted list that sample() draws from.
+        """
+        self._update_index(state)
+        return self._compute_all_ground_literals(state)
+
     def _compute_all_ground_literals(self, state):
-        all_ground_literals = set()
+        """Lazily generate the ground literals of all predicates.
+        """
         for predicate in self.predicates:
-            choices = [self._type_to_objs[vt] for vt in predicate.var_types]
-            for choice in itertools.product(*choices):
-                if len(set(choice)) != len(choice):
+            yield from self._ground_predicate(predicate)
+
+    def _ground_predicate(self, predicate):
+        """Generate the groundings of a predicate without repeated objects,
+        pruning partial assignments that violate the static constraints.
+        """
+        choices = [self._type_to_objs[vt] for vt in predicate.var_types]
+        alternatives = self._static_constraints.get(predicate)
+        if alternatives is None:
+            checks = generators = None
+        else:
+            choice_sets = [set(c) for c in choices]
+            # Check each static fact as soon as its last argument is bound,
+            # and look up the candidates for that argument in the static facts
+            checks = [[[] for _ in alternatives] for _ in range(len(choices) + 1)]
+            generators = [[None for _ in alternatives] for _ in range(len(choices))]
+            for k, alternative in enumerate(alternatives):
+                for name, positions in alternative:
+                    i = max(positions, default=-1)
+                    checks[i + 1][k].append((name, positions))
+                    if i >= 0 and generators[i][k] is None and positions.count(i) == 1:
+                        generators[i][k] = (name, positions, positions.index(i))
+        args = []
+
+        def satisfied(alive, step_checks):
+            return [k for k in alive if all(
+                (name, tuple(args[j] for j in positions)) in self._static_facts
+                for name, positions in step_checks[k])]
+
+        def candidates(i, alive):
+            objs = set()
+            for k in alive:
+                if generators[i][k] is None:
+                    return choices[i]
+                name, positions, slot = generators[i][k]
+                key = (name, slot, tuple(args[j] for j in positions if j != i))
+                objs.update(self._static_index.get(key, ()))
+            return sorted(objs & choice_sets[i])
+
+        def extend(alive):
+            i = len(args)
+            if i == len(choices):
+                yield predicate(*args)
+                return
+            for obj in (choices[i] if alive is None else candidates(i, alive)):
+                if obj in args:
                     continue
-                lit = predicate(*choice)
-                all_ground_literals.add(lit)
-        return all_ground_literals
+                args.append(obj)
+                if alive is None:
+                    yield from extend(None)
+                else:
+                    next_alive = satisfied(alive, checks[i + 1])
+                    if next_alive:
+                        yield from extend(next_alive)
+                args.pop()
+
+        if checks is None:
+            yield from extend(None)
+        else:
+            alive = satisfied(range(len(alternatives)), checks[0])
+            if alive:
+                yield from extend(alive)
+
+
+def get_static_predicate_names(domain):
+    """Names of the state predicates that no operator effect changes.
+    """
+    fluent_names = {action.name for action in domain.actions}
+    for operator in domain.operators.values():
+        _collect_predicate_names(operator.effects, fluent_names)
+    return {name for name, pred in domain.predicates.items()
+            if name not in fluent_names and not pred.is_derived}
+
+
+def _collect_predicate_names(struct, names):
+    if isinstance(struct, Literal):
+        names.add(struct.predicate.name)
+    elif hasattr(struct, "literals"):
+        for lit in struct.literals:
+            _collect_predicate_names(lit, names)
+    elif hasattr(struct, "body"):
+        _collect_predicate_names(struct.body, names)
+
+
+def get_static_constraints(domain, predicates, static_predicate_names):
+    """Static preconditions that the groundings of each predicate must meet.
+
+    For every use of the predicate by an operator (a positive precondition
+    on it, or the operator itself when operators are actions), the positive
+    static preconditions over only the used variables form one alternative,
+    given as [(static predicate name, argument positions)]. A grounding is
+    feasible if it satisfies some alternative. Predicates for which some
+    operator imposes no such precondition, or that no operator uses, are
+    unconstrained and omitted.
+    """
+    constraints = {}
+    for predicate in predicates:
+        alternatives = []
+        for operator in domain.operators.values():
+            preconds = operator.preconds
+            if isinstance(preconds, Literal):
+                preconds = LiteralConjunction([preconds])
+            if not isinstance(preconds, LiteralConjunction):
+                # Not analyzed, so the operator may use any grounding
+                alternatives.append([])
+                continue
+            nested_names = set()
+            for lit in preconds.literals:
+                if not isinstance(lit, Literal):
+                    _collect_predicate_names(lit, nested_names)
+            if predicate.name in nested_names:
+                alternatives.append([])
+            # Argument lists with which the operator uses the predicate
+            uses = [lit.variables for lit in preconds.literals
+                    if isinstance(lit, Literal) and lit.predicate == predicate]
+            if domain.operators_as_actions and operator.name == predicate.name:
+                uses.append(operator.params)
+            for variables in uses:
+                var_to_position = {var: i for i, var in enumerate(variables)}
+                alternative = []
+                for other in preconds.literals:
+                    if (isinstance(other, Literal)
+                            and other.predicate.name in static_predicate_names
+                            and not (other.is_negative or other.is_anti
+                                     or other.negated_as_failure)
+                            and all(v in var_to_position for v in other.variables)):
+                        alternative.append((other.predicate.name,
+                            tuple(var_to_position[v] for v in other.variables)))
+                alternatives.append(alternative)
+        if alternatives and all(alternatives):
+            constraints[predicate] = alternatives
+    return constraints
 
 
 class LiteralActionSpace(LiteralSpace):
@@ -107,25 +276,30 @@ class LiteralActionSpace(LiteralSpace):
             assert isinstance(operator.preconds, LiteralConjunction)
             assert all([isinstance(l, Literal) for l in operator.preconds.literals])
         self._action_predicate_to_operators = action_predicate_to_operators
+        self._downward_task_builder = DownwardTaskBuilder(domain)
 
         super().__init__(predicates,
             type_hierarchy=type_hierarchy,
             type_to_parent_types=type_to_parent_types)
 
     def _update_objects_from_state(self, state):
-        # Check whether the objects have changed
+        # Check whether the objects have changed (or only the index was
+        # updated, by ground_literals)
         # If so, we need to recompute things
-        if state.objects == self._objects:
+        if state.objects == self._objects and self._all_ground_literals is not None:
             return
 
         # Parent class update
         super()._update_objects_from_state(state)
 
         # Recompute all ground operators
-        # Associate each ground action literal with ground preconditions
-        self._ground_action_to_pos_preconds = {}
-        self._ground_action_to_neg_preconds = {}
-        for ground_action in self._all_ground_literals:
+        # Index the ground preconditions: each ground action keeps a count of
+        # its unsatisfied preconditions, and each literal lists the actions
+        # whose count changes when it is added to or deleted from the state.
+        self._lit_to_pos_dependents = defaultdict(list)
+        self._lit_to_neg_dependents = defaultdict(list)
+        self._num_pos_preconds = []
+        for idx, ground_action in enumerate(self._all_ground_literals):
             operator = self._action_predicate_to_operators[ground_action.predicate]
             lifted_preconds = operator.preconds.literals
             subs = dict(zip(operator.params, ground_action.variables))
@@ -136,8 +310,48 @@ class LiteralActionSpace(LiteralSpace):
                     neg_preconds.add(p.positive)
                 else:
                     pos_preconds.add(p)
-            self._ground_action_to_pos_preconds[ground_action] = pos_preconds
-            self._ground_action_to_neg_preconds[ground_action] = neg_preconds
+            for p in pos_preconds:
+                self._lit_to_pos_dependents[p].append(idx)
+            for p in neg_preconds:
+                self._lit_to_neg_dependents[p].append(idx)
+            self._num_pos_preconds.append(len(pos_preconds))
+        self._lit_to_pos_dependents = dict(self._lit_to_pos_dependents)
+        self._lit_to_neg_dependents = dict(self._lit_to_neg_dependents)
+        self._reset_unsatisfied_counts()
+
+    def _reset_unsatisfied_counts(self):
+        """Set the counters to those of a state without any literals.
+        """
+        self._num_unsatisfied = list(self._num_pos_preconds)
+        self._applicable = {idx for idx, count in enumerate(self._num_unsatisfied)
+                            if count == 0}
+        self._indexed_literals = frozenset()
+
+    def _update_unsatisfied_counts(self, literals):
+        """Bring the counters up to date with the given state literals by
+        propagating only the difference to the previously seen literals.
+        """
+        num_unsatisfied = self._num_unsatisfied
+        applicable = self._applicable
+        for lit in literals - self._indexed_literals:
+            for idx in self._lit_to_pos_dependents.get(lit, ()):
+                num_unsatisfied[idx] -= 1
+                if num_unsatisfied[idx] == 0:
+                    applicable.add(idx)
+            for idx in self._lit_to_neg_dependents.get(lit, ()):
+                num_unsatisfied[idx] += 1
+                if num_unsatisfied[idx] == 1:
+                    applicable.discard(idx)
+        for lit in self._indexed_literals - literals:
+            for idx in self._lit_to_pos_dependents.get(lit, ()):
+                num_unsatisfied[idx] += 1
+                if num_unsatisfied[idx] == 1:
+                    applicable.discard(idx)
+            for idx in self._lit_to_neg_dependents.get(lit, ()):
+                num_unsatisfied[idx] -= 1
+                if num_unsatisfied[idx] == 0:
+                    applicable.add(idx)
+        self._indexed_literals = literals
 
     def sample_literal(self, state):
         valid_literals = self.all_ground_literals(state)
@@ -150,52 +364,25 @@ class LiteralActionSpace(LiteralSpace):
     def all_ground_literals(self, state, valid_only=True):
         self._update_objects_from_state(state)
         assert valid_only, "The point of this class is to avoid the cross product!"
-        valid_literals = set()
-        for ground_action in self._all_ground_literals:
-            pos_preconds = self._ground_action_to_pos_preconds[ground_action]
-            if not pos_preconds.issubset(state.literals):
-                continue
-            neg_preconds = self._ground_action_to_neg_preconds[ground_action]
-            if len(neg_preconds & state.literals) > 0:
-                continue
-            valid_literals.add(ground_action)
-        return valid_literals
+        self._update_unsatisfied_counts(frozenset(state.literals))
+        return {self._all_ground_literals[idx] for idx in self._applicable}
 
     def _compute_all_ground_literals(self, state):
         """Call FastDownward's instantiator.
         """
-        # Generate temporary files to hand over to instantiator.
-        _, domain_fname = tempfile.mkstemp(dir=TMP_PDDL_DIR, text=True)
-        self.domain.write(domain_fname)
-        p_desc, problem_fname = tempfile.mkstemp(dir=TMP_PDDL_DIR, text=True)
-        with os.fdopen(p_desc, "w") as f:
-            PDDLProblemParser.create_pddl_file(
-                file_or_filepath=f,
-                objects=state.objects,
-                initial_state=state.literals,
-                problem_name="myproblem",
-                domain_name=self.domain.domain_name,
-                goal=state.goal,
-                fast_downward_order=True)
-        # Call instantiator.
-        task = downward_open(domain_fname, problem_fname)
+        task = self._downward_task_builder(state)
         with nostdout():
             _, _, actions, _, _ = downward_explore(task)
         # Post-process to our representation.
         obj_name_to_obj = {obj.name: obj for obj in state.objects}
+        pred_name_to_pred = {p.name: p for p in self.predicates}
         all_ground_literals = set()
         for action in actions:
             name = action.name.strip().strip("()").split()
             pred_name, obj_names = name[0], name[1:]
             if len(set(obj_names)) != len(obj_names):
                 continue
-            pred = None
-            for p in self.predicates:
-                if p.name == pred_name:
-                    assert pred is None
-                    pred = p
-                    break
-            assert pred is not None
+            pred = pred_name_to_pred[pred_name]
             objs = [obj_name_to_obj[obj_name] for obj_name in obj_names]
             all_ground_literals.add(pred(*objs))
         return all_ground_literals
@@ -192,6 +192,11 @@ class Literal:
         self._str = str(self.predicate) + '(' + ','.join(map(str, self.variables)) + ')'
         self._hash = hash(self._str)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # String hashes are salted per process, so a pickled hash is stale
+        self._hash = hash(self._str)
+
     def set_variables(self, variables):
         self.variables = variables
         self._update_variable_caches()
@@ -204,6 +209,7 @@ class Literal:
         # Recompute cache
         self._str = str(self.predicate) + '(' + ','.join(map(str, self.variables)) + ')'
         self._hash = hash(self._str)
+        self._pddl_str = None
 
     def __str__(self):
         return self._str
@@ -253,6 +259,13 @@ class Literal:
                 for v in self.variables]
 
     def pddl_str(self):
+        # Cached, since states are serialized many times per solve
+        pddl_str = self.__dict__.get("_pddl_str")
+        if pddl_str is None:
+            pddl_str = self._pddl_str = self._create_pddl_str()
+        return pddl_str
+
+    def _create_pddl_str(self):
         if self.is_anti:
             return "(not ({} {}))".format(self.predicate.inverted_anti, " ".join(
                 self.pddl_variables()))
@@ -11,6 +11,31 @@ from planning import PDDLPlanner, PlanningFailure
 
 FD_URL = "https://github.com/ronuchit/downward.git"
 
+# Search statistics printed by FD, and how to parse their values
+SEARCH_STATISTICS = {
+    "expanded": (r"\bExpanded (\d+) state\(s\)\.", int),
+    "evaluated": (r"\bEvaluated (\d+) state\(s\)\.", int),
+    "generated": (r"\bGenerated (\d+) state\(s\)\.", int),
+    "search_time": (r"\bSearch time: ([\d.]+)s", float),
+    "total_time": (r"\bTotal time: ([\d.]+)s", float),
+}
+
+
+def parse_search_statistics(output):
+    """Parse the search statistics from the output of FD.
+
+    Unlike the wall time of the FD process, the numbers of expanded,
+    evaluated and generated states do not depend on the load of the
+    machine. If FD reports a statistic several times, e.g. once per search
+    iteration, the last (cumulative) value is kept; statistics missing from
+    the output, e.g. after a timeout, are None.
+    """
+    statistics = {}
+    for name, (pattern, value_type) in SEARCH_STATISTICS.items():
+        values = re.findall(pattern, output)
+        statistics[name] = value_type(values[-1]) if values else None
+    return statistics
+
 
 class FD(PDDLPlanner):
     """Fast-downward planner.
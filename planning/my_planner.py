@@ -6,11 +6,36 @@ import time
 import tempfile
 import numpy as np
 import json
+import weakref
+from pddlgym.downward_task import DownwardTaskBuilder
 from pddlgym.structs import State, Literal
 from pddlgym.spaces import LiteralSpace
 from pddlgym.parser import PDDLProblemParser
 from planning import Planner, PlanningFailure, PlanningTimeout, validate_strips_plan
+from planning import tracing
 
+# Domain -> DownwardTaskBuilder, see restrict_to_relevant_objects
+_task_builders = weakref.WeakKeyDictionary()
+
+
+@tracing.traced("relevance_prefilter")
+def restrict_to_relevant_objects(domain, state):
+    """Drop the objects that cannot contribute to the goal, and the literals
+    that mention them, before the objects are scored.
+
+    The objects are found by the translator's backward relevance analysis
+    (see DownwardTaskBuilder.relevant_objects).
+    """
+    task_builder = _task_builders.get(domain)
+    if task_builder is None:
+        task_builder = _task_builders[domain] = DownwardTaskBuilder(domain)
+    objects = task_builder.relevant_objects(state)
+    literals = {lit for lit in state.literals
+                if all(var in objects for var in lit.variables)}
+    return State(frozenset(literals), objects, state.goal)
+
+
+@tracing.traced("complementary_rules")
 def apply_complementary_rules(state, cur_objects, complementary_rules):
     new_cur_objects = cur_objects.copy()
 
@@ -42,6 +67,7 @@ def apply_complementary_rules(state, cur_objects, complementary_rules):
 
     return new_cur_objects, dummy_state
 
+@tracing.traced("relaxation_rules")
 def apply_relaxation_rules(state, relaxation_rules, domain, force_include_goal_objects=True):
     relaxed_objects = set(state.objects)
     relaxed_literals = set(state.literals)
@@ -119,7 +145,8 @@ class IncrementalPlanner(Planner):
     def __init__(self, is_strips_domain, base_planner, search_guider, seed,
                  gamma=0.9, # parameter for incrementing by score
                  max_iterations=1000,
-                 force_include_goal_objects=True):
+                 force_include_goal_objects=True,
+                 relevance_prefilter=False):
         super().__init__()
         assert isinstance(base_planner, Planner)
         print("Initializing {} with base planner {}, "
@@ -133,21 +160,25 @@ class IncrementalPlanner(Planner):
         self._guidance = search_guider
         self._rng = np.random.RandomState(seed=seed)
         self._force_include_goal_objects = force_include_goal_objects
+        self._relevance_prefilter = relevance_prefilter
 
     def __call__(self, domain, state, timeout):
+        if self._relevance_prefilter:
+            state = restrict_to_relevant_objects(domain, state)
         act_preds = [domain.predicates[a] for a in list(domain.actions)]
         act_space = LiteralSpace(
-            act_preds, type_to_parent_types=domain.type_to_parent_types)
-        dom_file = tempfile.NamedTemporaryFile(delete=False).name
-        prob_file = tempfile.NamedTemporaryFile(delete=False).name
-        domain.write(dom_file)
-        lits = set(state.literals)
-        if not domain.operators_as_actions:
-            lits |= set(act_space.all_ground_literals(
-                state, valid_only=False))
-        PDDLProblemParser.create_pddl_file(
-            prob_file, state.objects, lits, "myproblem",
-            domain.domain_name, state.goal, fast_downward_order=True)
+            act_preds, type_to_parent_types=domain.type_to_parent_types,
+            domain=domain)
+        with tracing.span("write_pddl", num_objects=len(state.objects)):
+            dom_file = tempfile.NamedTemporaryFile(delete=False).name
+            prob_file = tempfile.NamedTemporaryFile(delete=False).name
+            domain.write(dom_file)
+            lits = set(state.literals)
+            if not domain.operators_as_actions:
+                lits.update(act_space.ground_literals(state))
+            PDDLProblemParser.create_pddl_file(
+                prob_file, state.objects, lits, "myproblem",
+                domain.domain_name, state.goal, fast_downward_order=True)
         cur_objects = set()
         start_time = time.time()
         if self._force_include_goal_objects:
@@ -155,8 +186,9 @@ class IncrementalPlanner(Planner):
             for lit in state.goal.literals:
                 cur_objects |= set(lit.variables)
         # Get scores once.
-        object_to_score = {obj: self._guidance.score_object(obj, state)
-                           for obj in state.objects if obj not in cur_objects}
+        with tracing.span("score_objects"):
+            object_to_score = {obj: self._guidance.score_object(obj, state)
+                               for obj in state.objects if obj not in cur_objects}
         # Initialize threshold.
         threshold = self._gamma
         vis_info = {
@@ -215,7 +247,8 @@ class ComplementaryPlanner(Planner):
                  gamma=0.9, # parameter for incrementing by score
                  max_iterations=1000,
                  force_include_goal_objects=True,
-                 complementary_rules=None):
+                 complementary_rules=None,
+                 relevance_prefilter=False):
         super().__init__()
         assert isinstance(base_planner, Planner)
         print("Initializing {} with base planner {}, "
@@ -229,23 +262,27 @@ class ComplementaryPlanner(Planner):
         self._guidance = search_guider
         self._rng = np.random.RandomState(seed=seed)
         self._force_include_goal_objects = force_include_goal_objects
+        self._relevance_prefilter = relevance_prefilter
         with open(complementary_rules, "r") as file:
             self._complementary_rules = json.load(file)
 
     def __call__(self, domain, state, timeout):
+        if self._relevance_prefilter:
+            state = restrict_to_relevant_objects(domain, state)
         act_preds = [domain.predicates[a] for a in list(domain.actions)]
         act_space = LiteralSpace(
-            act_preds, type_to_parent_types=domain.type_to_parent_types)
-        dom_file = tempfile.NamedTemporaryFile(delete=False).name
-        prob_file = tempfile.NamedTemporaryFile(delete=False).name
-        domain.write(dom_file)
-        lits = set(state.literals)
-        if not domain.operators_as_actions:
-            lits |= set(act_space.all_ground_literals(
-                state, valid_only=False))
-        PDDLProblemParser.create_pddl_file(
-            prob_file, state.objects, lits, "myproblem",
-            domain.domain_name, state.goal, fast_downward_order=True)
+            act_preds, type_to_parent_types=domain.type_to_parent_types,
+            domain=domain)
+        with tracing.span("write_pddl", num_objects=len(state.objects)):
+            dom_file = tempfile.NamedTemporaryFile(delete=False).name
+            prob_file = tempfile.NamedTemporaryFile(delete=False).name
+            domain.write(dom_file)
+            lits = set(state.literals)
+            if not domain.operators_as_actions:
+                lits.update(act_space.ground_literals(state))
+            PDDLProblemParser.create_pddl_file(
+                prob_file, state.objects, lits, "myproblem",
+                domain.domain_name, state.goal, fast_downward_order=True)
         cur_objects = set()
         start_time = time.time()
         if self._force_include_goal_objects:
@@ -253,8 +290,9 @@ class ComplementaryPlanner(Planner):
             for lit in state.goal.literals:
                 cur_objects |= set(lit.variables)
         # Get scores once.
-        object_to_score = {obj: self._guidance.score_object(obj, state)
-                           for obj in state.objects if obj not in cur_objects}
+        with tracing.span("score_objects"):
+            object_to_score = {obj: self._guidance.score_object(obj, state)
+                               for obj in state.objects if obj not in cur_objects}
         # Initialize threshold.
         threshold = self._gamma
         vis_info = {
@@ -328,7 +366,8 @@ class PureRelaxationPlanner(Planner):
                  gamma=0.9, # parameter for incrementing by score
                  max_iterations=1000,
                  force_include_goal_objects=True,
-                 relaxation_rules=None):
+                 relaxation_rules=None,
+                 relevance_prefilter=False):
         super().__init__()
         assert isinstance(base_planner, Planner)
         print("Initializing {} with base planner {}, "
@@ -342,23 +381,27 @@ class PureRelaxationPlanner(Planner):
         self._guidance = search_guider
         self._rng = np.random.RandomState(seed=seed)
         self._force_include_goal_objects = force_include_goal_objects
+        self._relevance_prefilter = relevance_prefilter
         with open(relaxation_rules, "r") as file:
             self._relaxation_rules = json.load(file)
 
     def __call__(self, domain, state, timeout):
+        if self._relevance_prefilter:
+            state = restrict_to_relevant_objects(domain, state)
         act_preds = [domain.predicates[a] for a in list(domain.actions)]
         act_space = LiteralSpace(
-            act_preds, type_to_parent_types=domain.type_to_parent_types)
-        dom_file = tempfile.NamedTemporaryFile(delete=False).name
-        prob_file = tempfile.NamedTemporaryFile(delete=False).name
-        domain.write(dom_file)
-        lits = set(state.literals)
-        if not domain.operators_as_actions:
-            lits |= set(act_space.all_ground_literals(
-                state, valid_only=False))
-        PDDLProblemParser.create_pddl_file(
-            prob_file, state.objects, lits, "myproblem",
-            domain.domain_name, state.goal, fast_downward_order=True)
+            act_preds, type_to_parent_types=domain.type_to_parent_types,
+            domain=domain)
+        with tracing.span("write_pddl", num_objects=len(state.objects)):
+            dom_file = tempfile.NamedTemporaryFile(delete=False).name
+            prob_file = tempfile.NamedTemporaryFile(delete=False).name
+            domain.write(dom_file)
+            lits = set(state.literals)
+            if not domain.operators_as_actions:
+                lits.update(act_space.ground_literals(state))
+            PDDLProblemParser.create_pddl_file(
+                prob_file, state.objects, lits, "myproblem",
+                domain.domain_name, state.goal, fast_downward_order=True)
         cur_objects = set()
         start_time = time.time()
         if self._force_include_goal_objects:
@@ -366,8 +409,9 @@ class PureRelaxationPlanner(Planner):
             for lit in state.goal.literals:
                 cur_objects |= set(lit.variables)
         # Get scores once.
-        object_to_score = {obj: self._guidance.score_object(obj, state)
-                           for obj in state.objects if obj not in cur_objects}
+        with tracing.span("score_objects"):
+            object_to_score = {obj: self._guidance.score_object(obj, state)
+                               for obj in state.objects if obj not in cur_objects}
         # Initialize threshold.
         threshold = self._gamma
         vis_info = {
@@ -465,7 +509,8 @@ class FlaxPlanner(Planner):
                  max_iterations=1000,
                  force_include_goal_objects=True,
                  complementary_rules=None,
-                 relaxation_rules=None):
+                 relaxation_rules=None,
+                 relevance_prefilter=False):
         super().__init__()
         assert isinstance(base_planner, Planner)
         print("Initializing {} with base planner {}, "
@@ -479,25 +524,29 @@ class FlaxPlanner(Planner):
         self._guidance = search_guider
         self._rng = np.random.RandomState(seed=seed)
         self._force_include_goal_objects = force_include_goal_objects
+        self._relevance_prefilter = relevance_prefilter
         with open(complementary_rules, "r") as file:
             self._complementary_rules = json.load(file)
         with open(relaxation_rules, "r") as file:
             self._relaxation_rules = json.load(file)
 
     def __call__(self, domain, state, timeout):
+        if self._relevance_prefilter:
+            state = restrict_to_relevant_objects(domain, state)
         act_preds = [domain.predicates[a] for a in list(domain.actions)]
         act_space = LiteralSpace(
-            act_preds, type_to_parent_types=domain.type_to_parent_types)
-        dom_file = tempfile.NamedTemporaryFile(delete=False).name
-        prob_file = tempfile.NamedTemporaryFile(delete=False).name
-        domain.write(dom_file)
-        lits = set(state.literals)
-        if not domain.operators_as_actions:
-            lits |= set(act_space.all_ground_literals(
-                state, valid_only=False))
-        PDDLProblemParser.create_pddl_file(
-            prob_file, state.objects, lits, "myproblem",
-            domain.domain_name, state.goal, fast_downward_order=True)
+            act_preds, type_to_parent_types=domain.type_to_parent_types,
+            domain=domain)
+        with tracing.span("write_pddl", num_objects=len(state.objects)):
+            dom_file = tempfile.NamedTemporaryFile(delete=False).name
+            prob_file = tempfile.NamedTemporaryFile(delete=False).name
+            domain.write(dom_file)
+            lits = set(state.literals)
+            if not domain.operators_as_actions:
+                lits.update(act_space.ground_literals(state))
+            PDDLProblemParser.create_pddl_file(
+                prob_file, state.objects, lits, "myproblem",
+                domain.domain_name, state.goal, fast_downward_order=True)
         cur_objects = set()
         start_time = time.time()
         if self._force_include_goal_objects:
@@ -505,8 +554,9 @@ class FlaxPlanner(Planner):
             for lit in state.goal.literals:
                 cur_objects |= set(lit.variables)
         # Get scores once.
-        object_to_score = {obj: self._guidance.score_object(obj, state)
-                           for obj in state.objects if obj not in cur_objects}
+        with tracing.span("score_objects"):
+            object_to_score = {obj: self._guidance.score_object(obj, state)
+                               for obj in state.objects if obj not in cur_objects}
         # Initialize threshold.
         threshold = self._gamma
         vis_info = {
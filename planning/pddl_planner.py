@@ -7,37 +7,52 @@ import abc
 import tempfile
 import subprocess
 from pddlgym.spaces import LiteralSpace
-from pddlgym.parser import parse_plan_step, PDDLProblemParser
-from planning import Planner, PlanningTimeout
+from pddlgym.parser import PlanDecoder, PDDLProblemParser, InvalidPlanStep
+from planning import Planner, PlanningTimeout, PlanningFailure
+from planning import tracing
 
 
 class PDDLPlanner(Planner):
     """An abstract PDDL planner for PDDLGym.
     """
+    def __init__(self):
+        super().__init__()
+        self._plan_decoder = None
+        self._plan_decoder_key = None
+
     def __call__(self, domain, state, timeout):
         act_preds = [domain.predicates[a] for a in list(domain.actions)]
+        # With the domain, groundings that fail the static preconditions of
+        # every operator using them are never written
         act_space = LiteralSpace(
-            act_preds, type_to_parent_types=domain.type_to_parent_types)
-        dom_file = tempfile.NamedTemporaryFile(delete=False).name
-        prob_file = tempfile.NamedTemporaryFile(delete=False).name
-        domain.write(dom_file)
-        lits = set(state.literals)
-        if not domain.operators_as_actions:
-            lits |= set(act_space.all_ground_literals(state, valid_only=False))
-        PDDLProblemParser.create_pddl_file(
-            prob_file, state.objects, lits, "myproblem",
-            domain.domain_name, state.goal, fast_downward_order=True)
+            act_preds, type_to_parent_types=domain.type_to_parent_types,
+            domain=domain)
+        with tracing.span("write_pddl", num_objects=len(state.objects)):
+            dom_file = tempfile.NamedTemporaryFile(delete=False).name
+            prob_file = tempfile.NamedTemporaryFile(delete=False).name
+            domain.write(dom_file)
+            lits = set(state.literals)
+            if not domain.operators_as_actions:
+                lits.update(act_space.ground_literals(state))
+            PDDLProblemParser.create_pddl_file(
+                prob_file, state.objects, lits, "myproblem",
+                domain.domain_name, state.goal, fast_downward_order=True)
         cmd_str = self._get_cmd_str(dom_file, prob_file, timeout)
         start_time = time.time()
-        output = subprocess.getoutput(cmd_str)
-        self._cleanup()
+        with tracing.span("planner_subprocess",
+                          planner=self.__class__.__name__):
+            output = subprocess.getoutput(cmd_str)
+            self._cleanup()
         os.remove(dom_file)
         os.remove(prob_file)
         if time.time()-start_time > timeout:
             raise PlanningTimeout("Planning timed out!")
-        pddl_plan = self._output_to_plan(output)
-        plan = [self._plan_step_to_action(domain, state, act_preds, plan_step)
-                for plan_step in pddl_plan]
+        with tracing.span("decode_plan"):
+            pddl_plan = self._output_to_plan(output)
+            try:
+                plan = self._get_plan_decoder(domain, state, act_preds).decode(pddl_plan)
+            except InvalidPlanStep as e:
+                raise PlanningFailure("Could not decode the plan: {}".format(e)) from e
         return plan
 
     @abc.abstractmethod
@@ -52,12 +67,17 @@ class PDDLPlanner(Planner):
     def _cleanup(self):
         raise NotImplementedError("Override me!")
 
-    @staticmethod
-    def _plan_step_to_action(domain, state, act_predicates, plan_step):
-        return parse_plan_step(
-            plan_step,
-            domain.operators.values(),
-            act_predicates,
-            state.objects,
-            operators_as_actions=domain.operators_as_actions,
-        )
+    def _get_plan_decoder(self, domain, state, act_predicates):
+        """Reuse the plan decoder while the domain and objects are unchanged.
+        """
+        key = (domain, state.objects)
+        if self._plan_decoder is None or self._plan_decoder_key[0] is not domain \
+                or self._plan_decoder_key[1] != state.objects:
+            self._plan_decoder = PlanDecoder(
+                domain.operators.values(),
+                act_predicates,
+                state.objects,
+                operators_as_actions=domain.operators_as_actions,
+            )
+            self._plan_decoder_key = key
+        return self._plan_decoder
@@ -0,0 +1,175 @@
+"""Hierarchical span timers for the translate-plan-validate pipeline.
+
+Code is instrumented with the span() context manager or the traced()
+decorator. Spans nest according to the call structure and are only recorded
+while a Trace is active (see Trace.activate); otherwise they cost next to
+nothing. A finished trace can be exported as JSON lines or in the Chrome
+trace format (viewable in chrome://tracing or Perfetto).
+"""
+
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+
+class Span:
+    """A timed section of code.
+    """
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "cpu_start",
+                 "cpu_end", "thread_id", "attrs")
+
+    def __init__(self, name, span_id, parent_id, attrs):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        self.end = None
+        self.cpu_end = None
+
+    def set(self, **attrs):
+        """Attach attributes, e.g. results that are only known at the end.
+        """
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def cpu_time(self):
+        return self.cpu_end - self.cpu_start
+
+
+class Trace:
+    """Collects the spans of one unit of work, e.g. solving one problem.
+
+    Parameters
+    ----------
+    name : str
+        Name of the root span.
+    **attrs
+        Attributes of the root span, e.g. the domain and problem.
+    """
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self._span_ids = itertools.count()
+        self._lock = threading.Lock()
+        self.root = None
+
+    def start_span(self, name, parent, attrs):
+        with self._lock:
+            span_id = next(self._span_ids)
+        parent_id = None if parent is None else parent.span_id
+        return Span(name, span_id, parent_id, attrs)
+
+    def finish_span(self, span):
+        span.end = time.perf_counter()
+        span.cpu_end = time.thread_time()
+        with self._lock:
+            self.spans.append(span)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Record all spans opened within the block, under a root span.
+        """
+        self.root = self.start_span(self.name, None, dict(self.attrs))
+        token = _current.set((self, self.root))
+        try:
+            yield self.root
+        finally:
+            _current.reset(token)
+            self.finish_span(self.root)
+
+    def to_dicts(self):
+        """Return the finished spans ordered by start time.
+        """
+        if self.root is None:
+            return []
+        origin = self.root.start
+        return [{"name": span.name,
+                 "id": span.span_id,
+                 "parent": span.parent_id,
+                 "start": span.start - origin,
+                 "duration": span.duration,
+                 "cpu_time": span.cpu_time,
+                 "thread": span.thread_id,
+                 "attrs": span.attrs}
+                for span in sorted(self.spans, key=lambda s: (s.start, s.span_id))]
+
+    def write_jsonl(self, fname):
+        """Append the spans to a JSON lines file, one span per line.
+        """
+        with open(fname, "a") as f:
+            for record in self.to_dicts():
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def write_chrome_trace(self, fname):
+        """Write the spans in the Chrome trace event format.
+        """
+        pid = os.getpid()
+        events = [{"name": record["name"],
+                   "ph": "X",
+                   "ts": record["start"] * 1e6,
+                   "dur": record["duration"] * 1e6,
+                   "pid": pid,
+                   "tid": record["thread"],
+                   "args": dict(record["attrs"], cpu_time=record["cpu_time"])}
+                  for record in self.to_dicts()]
+        with open(fname, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f,
+                      default=str)
+
+    def write(self, fname, trace_format="jsonl"):
+        if trace_format == "jsonl":
+            self.write_jsonl(fname)
+        elif trace_format == "chrome":
+            self.write_chrome_trace(fname)
+        else:
+            raise ValueError("Unknown trace format '{}'.".format(trace_format))
+
+
+# (active trace, innermost open span) of the current context
+_current = contextvars.ContextVar("tracing_current", default=None)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time the block as a child of the innermost open span.
+
+    Yields the Span, or None if no trace is active.
+    """
+    current = _current.get()
+    if current is None:
+        yield None
+        return
+    trace, parent = current
+    new_span = trace.start_span(name, parent, attrs)
+    token = _current.set((trace, new_span))
+    try:
+        yield new_span
+    finally:
+        _current.reset(token)
+        trace.finish_span(new_span)
+
+
+def traced(name=None):
+    """Decorator that runs the function inside a span.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
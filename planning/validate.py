@@ -4,6 +4,7 @@
 import tempfile
 import os
 import subprocess
+from planning import tracing
 
 VALIDATE_CMD = f"{os.getcwd()}/VAL/build/linux64/Release/bin/Validate"
 
@@ -15,6 +16,7 @@ def verify_validate_installed():
     return "VAL: The PDDL+ plan validation tool" in output
 
 
+@tracing.traced("validate")
 def validate_strips_plan(domain_file, problem_file, plan):
     """Return True for a successfully validated plan, False otherwise.
     """
@@ -1,135 +1,34 @@
 import argparse
-import io
-import time
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
 import os
-import gymnasium as gym
-from minigrid.envs import MazeNamoEnv
-import pickle as pkl
-import imageio
-from my_utils.pddl_utils import *
-import pddlgym
-from pddlgym.structs import LiteralConjunction
-from planning import PlanningTimeout, PlanningFailure, \
-    validate_strips_plan, IncrementalPlanner, FlaxPlanner
+from my_utils.planning_session import PlanningSession
+from my_utils.results_store import ResultsStore, method_name
 
 
-def compare_one_problem(problem_map_dir, problem_idx, args):
-    problem_map_file = f"{problem_map_dir}/namo_map_{problem_idx}.pkl"
-    with open(problem_map_file, "rb") as f:
-        problem_dict = pkl.load(f)
+PLANNER_TYPES = ["pure", "ploi", "flax"]
 
-    grid = problem_dict["grid"]
-    robot_pos = problem_dict["robot_pos"]
-    robot_direction = problem_dict["robot_direction"]
-
-    vec_env: MazeNamoEnv = gym.make(
-        "MiniGrid-MazeNamo-v0",
-        # render_mode="human",
-        render_mode="rgb_array",
-        width=args.problem_size,
-        height=args.problem_size,
-        size=None,
-        agent_start_dir=DIRECTIONS.index(robot_direction),
-    )
-
-    mazenamo_env = vec_env.env.env
-    np.save("mazenamo_grid.npy", grid)
-    mazenamo_env.gen_grid(args.problem_size, args.problem_size)
-    mazenamo_env.reset()
-
-    planner = create_planner(args.test_planner_name)
-    pddlgym_env_names = {"MazeNamo": "Mazenamo"}
-    assert args.domain_name in pddlgym_env_names
-    domain_name = pddlgym_env_names[args.domain_name]
-    is_strips_domain = True
 
+def compare_one_problem(session, problem_idx, args, store=None):
     print(f"Solving problem mazenamo_{args.problem_size}x{args.problem_size}"
           f"_{args.problem_mode}_{problem_idx}...", flush=True)
-    seed = args.seed
-    print("Starting seed {}".format(seed), flush=True)
-
-    guider = create_guider(args.guider_name, args.train_planner_name,
-                            1, is_strips_domain, 1, seed)
-    guider.seed(seed)
-    guider.train(domain_name)
-
-    pure_planner = planner
-    ploi_planner = IncrementalPlanner(
-        is_strips_domain=is_strips_domain,
-        base_planner=planner, search_guider=guider, seed=seed)
-    flax_planner = FlaxPlanner(
-        is_strips_domain=is_strips_domain,
-        base_planner=planner, search_guider=guider, seed=seed, 
-        complementary_rules=args.cmpl_rules, relaxation_rules=args.relx_rules)
-
-    print("Running testing...")
-    env = pddlgym.make("PDDLEnv{}-v0".format(domain_name+"Test"))
-    _idx = None
-    for i, prob in enumerate(env.problems):
-        if f"namo_problem_{problem_idx}.pddl" in prob.problem_fname:
-            _idx = i
-            env.fix_problem_index(_idx)
-            break
-    state, _ = env.reset()
-    if type(state.goal).__name__ == "Literal":
-        state = state.with_goal(LiteralConjunction([state.goal]))
-
-    # pure
-    start = time.time()
-    pure_plan = []
-    try:
-        pure_plan = pure_planner(env.domain, state, timeout=args.timeout)
-    except (PlanningTimeout, PlanningFailure) as e:
-        print("\t\tPlanning failed with error: {}".format(e), flush=True)
-    # Validate plan on the full test problem.
-    if not validate_strips_plan(
-            domain_file=env.domain.domain_fname,
-            problem_file=env.problems[_idx].problem_fname,
-            plan=pure_plan):
-        print("\t\tPlanning returned an invalid plan")
-    pure_time = time.time() - start
-    print("Get plan of length {} in {:.5f} seconds".format(
-        len(pure_plan), pure_time), flush=True)
-
-    # ploi
-    start = time.time()
-    ploi_plan = []
-    try:
-        ploi_plan, vis_info = ploi_planner(env.domain, state, timeout=args.timeout)
-    except (PlanningTimeout, PlanningFailure) as e:
-        print("\t\tPlanning failed with error: {}".format(e), flush=True)
-    # Validate plan on the full test problem.
-    if not validate_strips_plan(
-            domain_file=env.domain.domain_fname,
-            problem_file=env.problems[_idx].problem_fname,
-            plan=ploi_plan):
-        print("\t\tPlanning returned an invalid plan")
-    ploi_time = time.time() - start
-    print("Get plan of length {} in {:.5f} seconds".format(
-        len(ploi_plan), ploi_time), flush=True)
-
-    # flax
-    start = time.time()
-    flax_plan = []
-    try:
-        flax_plan, vis_info = flax_planner(env.domain, state, timeout=args.timeout)
-    except (PlanningTimeout, PlanningFailure) as e:
-        print("\t\tPlanning failed with error: {}".format(e), flush=True)
-    # Validate plan on the full test problem.
-    if not validate_strips_plan(
-            domain_file=env.domain.domain_fname,
-            problem_file=env.problems[_idx].problem_fname,
-            plan=flax_plan):
-        print("\t\tPlanning returned an invalid plan")
-    flax_time = time.time() - start
-    print("Get plan of length {} in {:.5f} seconds".format(
-        len(flax_plan), flax_time), flush=True)
-    
-    return {"pure_time": round(pure_time, 2), "ploi_time": round(ploi_time, 2), "flax_time": round(flax_time, 2),
-            "pure_len": len(pure_plan), "ploi_len": len(ploi_plan), "flax_len": len(flax_plan)}
+    problem_name = f"mazenamo_problem_{problem_idx}.pddl"
+    compare_result = {}
+    for planner_type in PLANNER_TYPES:
+        method = method_name(planner_type, args.test_planner_name, args.guider_name,
+                             args.relevance_prefilter)
+        result = None if store is None else store.get(
+            session.test_domain_name, method, session.seed, problem_name)
+        if result is not None:
+            print(f"\t{planner_type}: loaded from the results store", flush=True)
+        else:
+            result = session.solve(planner_type, problem_name, args.timeout)
+            if store is not None:
+                store.record(method, result)
+        planning_time = result["planning_time"]
+        compare_result[f"{planner_type}_time"] = round(
+            args.timeout if planning_time is None else planning_time, 2)
+        compare_result[f"{planner_type}_len"] = result["plan_length"] or 0
+    return compare_result
 
 
 
@@ -146,14 +45,27 @@ if __name__ == "__main__":
     parser.add_argument("--timeout", type=float, default=40)
     parser.add_argument("--cmpl_rules", type=str, default="config/complementary_rules.json")
     parser.add_argument("--relx_rules", type=str, default="config/relaxation_rules_1.json")
+    parser.add_argument("--results_db", type=str, default=None,
+                        help="record results in this SQLite database and reuse "
+                             "the results already in it")
+    parser.add_argument("--relevance_prefilter", action="store_true",
+                        help="before scoring objects, drop those that cannot "
+                             "contribute to the goal according to a backward "
+                             "relevance analysis")
     args = parser.parse_args()
 
+    session = PlanningSession(
+        args.domain_name, PLANNER_TYPES, args.test_planner_name,
+        args.guider_name, args.seed, train_planner_name=args.train_planner_name,
+        cmpl_rules=args.cmpl_rules, relx_rules=args.relx_rules,
+        relevance_prefilter=args.relevance_prefilter)
+    store = None if args.results_db is None else ResultsStore(args.results_db)
     problem_map_dir = f"namo_problems/map_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
     if args.problem_idx == "all":
         compare_results = {}
         for file_name in os.listdir(problem_map_dir):
             problem_idx = file_name.split('.')[0].split('_')[-1]
-            compare_result = compare_one_problem(problem_map_dir, problem_idx, args)
+            compare_result = compare_one_problem(session, problem_idx, args, store)
             print(f"Problem {problem_idx}: {compare_result}")
             compare_results[f"{args.problem_size}x{args.problem_size}_{args.problem_mode}_{problem_idx}"] = compare_result
         for k, v in compare_results.items():
@@ -163,5 +75,7 @@ if __name__ == "__main__":
         avg_flax_time = np.mean([v["flax_time"] for v in compare_results.values()])
         print(f"Avg pure time: {avg_pure_time}, Avg ploi time: {avg_ploi_time}, Avg flax time: {avg_flax_time}")
     else:
-        compare_result = compare_one_problem(problem_map_dir, args.problem_idx, args)
+        compare_result = compare_one_problem(session, args.problem_idx, args, store)
         print(compare_result)
+    if store is not None:
+        store.close()
@@ -19,20 +19,21 @@ Design:
   - loc-empty is true initially for locations with no package, with at least
     one reserved empty location per city.
 
-Problems are classified into easy/medium/hard/expert based on Fast Downward runtime.
+Problems are classified into easy/medium/hard/expert based on the search effort
+of Fast Downward (expanded states by default), with thresholds calibrated per
+problem size and stored in config/difficulty_thresholds.json.
 """
 
 import os
-import re
-import time
+import json
 import random
 import pickle as pkl
 import argparse
-import subprocess
 import collections
 from typing import Dict, List, Tuple, Optional
 
-from my_utils.pddl_utils import _create_planner
+from my_utils.problem_generation import generate_problems, next_free_index, write_atomic, \
+    load_or_calibrate_thresholds, classify_effort, effort, problem_metrics, EFFORT_METRICS
 
 LOGISTICS_DOMAIN_PATH = "pddl_files/domains/difficultlogistics.pddl"
 
@@ -602,27 +603,16 @@ def world_to_pddl(
 # Difficulty helpers
 # -------------------------------------------------------------------
 
-def get_timeout_config(total_locations: int) -> Dict[str, float]:
+def get_time_limit(total_locations: int) -> float:
+    """FD time limit per candidate; the difficulty is classified by search effort."""
     if total_locations <= 20:
-        return {"min": 0.05, "easy": 1.0, "medium": 3.0, "hard": 8.0, "expert": 30.0}
+        return 30.0
     elif total_locations <= 40:
-        return {"min": 0.1, "easy": 2.0, "medium": 6.0, "hard": 15.0, "expert": 60.0}
+        return 60.0
     elif total_locations <= 80:
-        return {"min": 0.2, "easy": 4.0, "medium": 12.0, "hard": 30.0, "expert": 120.0}
+        return 120.0
     else:
-        return {"min": 0.5, "easy": 10.0, "medium": 30.0, "hard": 90.0, "expert": 300.0}
-
-
-def classify_difficulty(time_cost: float, timeout_cfg: Dict[str, float]) -> str:
-    if timeout_cfg["min"] <= time_cost < timeout_cfg["easy"]:
-        return "easy"
-    if timeout_cfg["easy"] <= time_cost < timeout_cfg["medium"]:
-        return "medium"
-    if timeout_cfg["medium"] <= time_cost < timeout_cfg["hard"]:
-        return "hard"
-    if timeout_cfg["hard"] <= time_cost < timeout_cfg["expert"]:
-        return "expert"
-    return None
+        return 300.0
 
 
 # -------------------------------------------------------------------
@@ -698,6 +688,16 @@ def main():
     parser.add_argument("--seed", type=int, default=None)
     parser.add_argument("--planner-name", type=str, default="fd-lama-first")
     parser.add_argument("--domain-name", type=str, default="difficultlogistics")
+    parser.add_argument("--num-workers", type=int, default=None,
+                        help="FD processes solving candidates in parallel, default one per core.")
+    parser.add_argument("--effort-metric", type=str, default="expanded", choices=EFFORT_METRICS,
+                        help="FD search statistic the difficulty is classified by.")
+    parser.add_argument("--thresholds-file", type=str,
+                        default="config/difficulty_thresholds.json",
+                        help="Calibrated effort thresholds per domain and size.")
+    parser.add_argument("--calibration-samples", type=int, default=100)
+    parser.add_argument("--recalibrate", action="store_true",
+                        help="Calibrate the effort thresholds again.")
 
     args = parser.parse_args()
 
@@ -705,7 +705,6 @@ def main():
         random.seed(args.seed)
 
     modes = ["easy", "medium", "hard", "expert"]
-    problem_idx = {m: 0 for m in modes}
     problem_dir = {m: {} for m in modes}
 
     approx_total_locations = args.num_cities * (
@@ -726,9 +725,7 @@ def main():
         for path in problem_dir[mode].values():
             os.makedirs(path, exist_ok=True)
 
-    pddl_planner = _create_planner(args.planner_name)
-
-    while True:
+    def sample(open_modes):
         try:
             world = generate_random_logistics_world(
                 num_cities=args.num_cities,
@@ -750,7 +747,7 @@ def main():
             )
         except ValueError as e:
             print(f"Failed to generate world: {e}")
-            continue
+            return None
 
         # Debug stats
         print("---- world stats ----")
@@ -760,96 +757,77 @@ def main():
             except TypeError:
                 print(f"{k}: {v}")
 
-        tmp_problem_path = os.path.join(
-            args.root_dir, "tmp_difficultlogistics_problem.pddl"
-        )
         pddl_str = world_to_pddl(
             world=world,
             problem_name="difficultlogistics_problem",
             domain_name=args.domain_name,
         )
 
-        with open(tmp_problem_path, "w") as f:
-            f.write(pddl_str)
-
         total_locations = sum(len(l) for l in world["city_locs"].values())
-        timeout_cfg = get_timeout_config(total_locations)
-
-        cmd_str = pddl_planner._get_cmd_str(
-            args.domain_file,
-            tmp_problem_path,
-            timeout=timeout_cfg["expert"],
-        )
-
-        start_time = time.time()
-        output = subprocess.getoutput(cmd_str)
-        pddl_planner._cleanup()
-        time_cost = time.time() - start_time
-
-        if os.path.exists(tmp_problem_path):
-            os.remove(tmp_problem_path)
+        candidate = {
+            "world": world,
+            "pddl_str": pddl_str,
+            "total_locations": total_locations,
+        }
+        return candidate, pddl_str, get_time_limit(total_locations)
+
+    def min_plan_length(candidate):
+        # Minimal plan length based on number of goals (not total packages)
+        num_goals = len(candidate["world"]["pkg_goal_loc"])
+        return max(5, num_goals * 5)
 
-        if "Solution found!" not in output:
-            print(f"No plan found (or timeout). Time {time_cost:.2f}s.")
-            continue
+    def accept(candidate, result):
+        return len(result["plan"]) >= min_plan_length(candidate)
 
-        fd_plan = re.findall(r"(.+) \(\d+?\)", output.lower())
+    thresholds = load_or_calibrate_thresholds(
+        args.thresholds_file, f"{args.domain_name}_{size_tag}", sample, accept,
+        args.domain_file, modes, metric=args.effort_metric,
+        num_samples=args.calibration_samples, planner_name=args.planner_name,
+        num_workers=args.num_workers, recalibrate=args.recalibrate)
 
-        # Minimal plan length based on number of goals (not total packages)
-        num_goals = len(world["pkg_goal_loc"])
-        min_plan_length = max(5, num_goals * 5)
+    def classify(candidate, result):
+        fd_plan = result["plan"]
+        value = effort(result, args.effort_metric)
 
-        if not fd_plan or len(fd_plan) < min_plan_length:
+        if not accept(candidate, result):
             print(
                 f"Problem too easy or too trivial. "
-                f"Time {time_cost:.2f}s, plan length {len(fd_plan)}, "
-                f"min length {min_plan_length}."
+                f"{args.effort_metric} {value}, plan length {len(fd_plan)}, "
+                f"min length {min_plan_length(candidate)}."
             )
-            continue
+            return None
 
-        mode = classify_difficulty(time_cost, timeout_cfg)
+        mode = classify_effort(value, thresholds, modes)
         if mode is None:
             print(
-                f"Problem too hard / exceeded expert threshold. "
-                f"Time {time_cost:.2f}s."
+                f"Problem too easy / below easy threshold. "
+                f"{args.effort_metric} {value}."
             )
-            continue
-
-        if problem_idx[mode] >= args.max_per_mode:
-            print(f"Mode {mode} already has {args.max_per_mode} problems; skipping.")
-            continue
-
-        idx = problem_idx[mode]
-
-        # Save world
-        world_path = os.path.join(
-            problem_dir[mode]["world"], f"difficultlogistics_world_{idx}.pkl"
-        )
-        with open(world_path, "wb") as f:
-            pkl.dump(world, f)
-
-        # Save PDDL
-        pddl_path = os.path.join(
-            problem_dir[mode]["pddl"], f"difficultlogistics_problem_{idx}.pddl"
-        )
-        with open(pddl_path, "w") as f:
-            f.write(pddl_str)
-
-        # Save plan
-        sol_path = os.path.join(
-            problem_dir[mode]["solution"], f"difficultlogistics_solution_{idx}.txt"
-        )
-        with open(sol_path, "w") as f:
-            for move in fd_plan:
-                f.write(str(move) + "\n")
-
-        print(
-            f"Found a {mode} difficultlogistics problem! "
-            f"idx={idx}, time={time_cost:.2f}s, plan_len={len(fd_plan)}, "
-            f"locations={total_locations}, goals={num_goals}."
-        )
-
-        problem_idx[mode] += 1
+            return None
+        return mode
+
+    def save(mode, idx, candidate, result):
+        # The PDDL file is written last: generation resumes after the last one.
+        write_atomic(os.path.join(
+            problem_dir[mode]["world"], f"difficultlogistics_world_{idx}.pkl"),
+            pkl.dumps(candidate["world"]))
+        write_atomic(os.path.join(
+            problem_dir[mode]["solution"], f"difficultlogistics_solution_{idx}.txt"),
+            "".join(str(move) + "\n" for move in result["plan"]))
+        write_atomic(os.path.join(
+            problem_dir[mode]["solution"], f"difficultlogistics_metrics_{idx}.json"),
+            json.dumps(problem_metrics(mode, result, thresholds), indent=2))
+        write_atomic(os.path.join(
+            problem_dir[mode]["pddl"], f"difficultlogistics_problem_{idx}.pddl"),
+            candidate["pddl_str"])
+
+    start_indices = {
+        mode: next_free_index(problem_dir[mode]["pddl"], "difficultlogistics_problem_", ".pddl")
+        for mode in modes}
+    generate_problems(sample, classify, save, modes, args.max_per_mode,
+                      args.domain_file, planner_name=args.planner_name,
+                      num_workers=args.num_workers, start_indices=start_indices,
+                      time_limits=thresholds["time_limits"])
 
 
 if __name__ == "__main__":
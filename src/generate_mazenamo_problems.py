@@ -1,14 +1,12 @@
-import re
-import subprocess
-import sys
-import time
+import argparse
 import numpy as np
 import random
 import os
-import gymnasium as gym
-from minigrid.envs import MazeNamoEnv
+import json
 import pickle as pkl
-from my_utils.pddl_utils import _create_planner
+from my_utils.grid_pddl import mazenamo_problem
+from my_utils.problem_generation import generate_problems, next_free_index, write_atomic, \
+    load_or_calibrate_thresholds, classify_effort, effort, problem_metrics, EFFORT_METRICS
 
 # Constants for different types of grid elements
 EMPTY = 0
@@ -58,132 +56,33 @@ def place_randomly(grid, value):
         raise ValueError("No empty positions left to place objects.")
     return tuple(random.choice(empty_positions))
 
-def grid_to_pddl(w, h, grid, robot_pos, robot_direction, tmp_pddl_path = "tmp_mazenamo_problem.pddl", no_wall_in_pddl = False):
-    objects = ["r - robot"]
-    goal = []
-    init_state = ["(rAt r p{})".format(robot_pos[1] * h + robot_pos[0]), "(handempty)", "({} r)".format(robot_direction)]
-
-    # add pos
-    object_idx = 1
-    for i in range(h):
-        for j in range(w):
-            if no_wall_in_pddl:
-                if i == 0 or i == h - 1 or j == 0 or j == w - 1:
-                    object_idx += 1
-                    continue
-            pos_idx = i * h + j
-            objects.append("p{} - pos".format(pos_idx))
-            o = grid[pos_idx]
-            if o is not None:
-                if o.type != "goal":
-                    objects.append("o{} - obstacle".format(object_idx))
-                    init_state.append("(oAt o{} p{})".format(object_idx, pos_idx))
-                if o.type == "moveable_heavy_box":
-                    init_state.append("(isHeavy o{})".format(object_idx))
-                    init_state.append("(isMoveable o{})".format(object_idx))
-                    init_state.append("(onGround o{})".format(object_idx))
-                    init_state.append("(clear o{})".format(object_idx))
-                elif o.type == "moveable_light_box":
-                    init_state.append("(isLight o{})".format(object_idx))
-                    init_state.append("(isMoveable o{})".format(object_idx))
-                    init_state.append("(onGround o{})".format(object_idx))
-                    init_state.append("(clear o{})".format(object_idx))
-                elif o.type == "goal":
-                    goal.append("(rAt r p{})".format(pos_idx))
-                    init_state.append("(posEmpty p{})".format(pos_idx))
-            else:
-                init_state.append("(posEmpty p{})".format(pos_idx))
-            object_idx += 1
-
-            if no_wall_in_pddl:
-                if i < h - 2:
-                    init_state.append("(upTo p{} p{})".format(pos_idx, pos_idx + w))
-                if i > 1:
-                    init_state.append("(downTo p{} p{})".format(pos_idx, pos_idx - w))
-                if j < w - 2:
-                    init_state.append("(leftTo p{} p{})".format(pos_idx, pos_idx + 1))
-                if j > 1:
-                    init_state.append("(rightTo p{} p{})".format(pos_idx, pos_idx - 1))
-            else:
-                if i < h - 1:
-                    init_state.append("(upTo p{} p{})".format(pos_idx, pos_idx + w))
-                if i > 0:
-                    init_state.append("(downTo p{} p{})".format(pos_idx, pos_idx - w))
-                if j < w - 1:
-                    init_state.append("(leftTo p{} p{})".format(pos_idx, pos_idx + 1))
-                if j > 0:
-                    init_state.append("(rightTo p{} p{})".format(pos_idx, pos_idx - 1))
-
-    objects = "\n\t\t".join(objects)
-    goal = "\n\t\t".join(goal)
-    init_state = "\n\t\t".join(init_state)
-
-    pddl_str = \
-    """(define (problem mazenamo_problem)
-    (:domain mazenamo)
-    (:objects\n\t\t{}
-    )
-    (:init\n\t\t{}
-    )
-    (:goal\n\t\t{}
-    )
-    )""".format(objects, init_state, goal)
-
-    with open(tmp_pddl_path, "w") as f:
-        f.write(pddl_str)
-    # print("pddl_str", pddl_str)
-    return pddl_str
-
-
 if __name__ == "__main__":
-    pddl_domain_file_path = "pddl_files/domains/mazenamo.pddl"
-    tmp_pddl_problem_path = "tmp_mazenamo_problem.pddl"
-    MAX_PROBLEM_NUM = 200
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problem_size", type=int, default=12)
+    parser.add_argument("--max_problem_num", type=int, default=200)
+    parser.add_argument("--num_workers", type=int, default=None,
+                        help="FD processes solving candidates in parallel, default one per core")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--effort_metric", type=str, default="expanded", choices=EFFORT_METRICS,
+                        help="FD search statistic the difficulty is classified by")
+    parser.add_argument("--thresholds_file", type=str, default="config/difficulty_thresholds.json")
+    parser.add_argument("--calibration_samples", type=int, default=100)
+    parser.add_argument("--recalibrate", action="store_true")
+    args = parser.parse_args()
 
-    problem_size = 12
+    pddl_domain_file_path = "pddl_files/domains/mazenamo.pddl"
+    MAX_PROBLEM_NUM = args.max_problem_num
 
-    if problem_size == 8:
-        timeout = {
-            "min": 0.1,
-            "easy": 1,
-            "medium": 2,
-            "hard": 5,
-            "expert": 10,
-        }
-    elif problem_size == 10:
-        timeout = {
-            "min": 0.1,
-            "easy": 2,
-            "medium": 6,
-            "hard": 10,
-            "expert": 30,
-        }
-    elif problem_size == 12:
-        timeout = {
-            "min": 3,
-            "easy": 10,
-            "medium": 25,
-            "hard": 40,
-            "expert": 120,
-        }
-    elif problem_size == 15:
-        timeout = {
-            "min": 10,
-            "easy": 30,
-            "medium": 60,
-            "hard": 120,
-            "expert": 300,
-        }
+    problem_size = args.problem_size
+    if args.seed is not None:
+        random.seed(args.seed)
+    # FD time limit per candidate; the difficulty is classified by search effort
+    time_limit = {8: 10, 10: 30, 12: 120, 15: 300}[problem_size]
     min_plan_length = int(0.1 * problem_size**2)
 
-    problem_idx = {
-        "easy": 0,
-        "medium": 0,
-        "hard": 0,
-        "expert": 0,
-    }
+    modes = ["easy", "medium", "hard", "expert"]
     problem_dir = {}
-    for mode in ["easy", "medium", "hard", "expert"]:
+    for mode in modes:
         problem_dir[mode] = {}
         for dir in ["map", "pddl", "solution_sat"]:
             # problem_dir[mode][dir] = f"pddl_files/problems/mazenamo_problems/{dir}_{problem_size}x{problem_size}_{mode}"
@@ -191,78 +90,54 @@ if __name__ == "__main__":
             if not os.path.exists(problem_dir[mode][dir]):
                 os.makedirs(problem_dir[mode][dir])
     
-    pddl_planner = _create_planner("fd-lama-first")
-
-    while True:
+    def sample(open_modes):
         grid, robot_pos, robot_direction = generate_random_map(problem_size)
 
-        # Save the grid to a .npy file
-        np.save("mazenamo_grid.npy", grid)
-
-        # print("direction", robot_direction, DIRECTIONS.index(robot_direction))
-        vec_env: MazeNamoEnv = gym.make(
-            # "MiniGrid-MazeNamoEnv-v0",
-            "MiniGrid-MazeNamo-v0",
-            render_mode="human",
-            width=problem_size,
-            height=problem_size,
-            size=None,
-            agent_start_dir=DIRECTIONS.index(robot_direction),
-        )
-        mazenamo_env = vec_env.env.env
-        mazenamo_env.gen_grid(problem_size, problem_size)
-
-        gym_grid = mazenamo_env.grid.grid
-
-        # Convert the grid to PDDL and save the problem file in tmp_pddl_path
-        pddl_str = grid_to_pddl(problem_size, problem_size, gym_grid, robot_pos, robot_direction)
-
-        cmd_str = pddl_planner._get_cmd_str(pddl_domain_file_path, tmp_pddl_problem_path, timeout=timeout["expert"])
-        start_time = time.time()
-        output = subprocess.getoutput(cmd_str)
-        pddl_planner._cleanup()
-        os.remove(tmp_pddl_problem_path)
-        os.remove("mazenamo_grid.npy")
-
-        time_cost = time.time() - start_time
-
-        if "Solution found!" not in output:
-            print(f"Plan not found with FD! Spent {time_cost}s.")
-            continue
-
-        mode = None
-        if time_cost >= timeout["min"] and time_cost < timeout["easy"]:
-            mode = "easy"
-        elif time_cost >= timeout["easy"] and time_cost < timeout["medium"]:
-            mode = "medium"
-        elif time_cost >= timeout["medium"] and time_cost < timeout["hard"]:
-            mode = "hard"
-        elif time_cost >= timeout["hard"] and time_cost < timeout["expert"]:
-            mode = "expert"
-
-        fd_plan = re.findall(r"(.+) \(\d+?\)", output.lower())
-        if mode is None or not fd_plan or len(fd_plan) < min_plan_length:
-            print(f"Problem too easy! Spent {time_cost}s. Plan length {len(fd_plan)}.")
-            continue
-
-        if problem_idx[mode] >= MAX_PROBLEM_NUM:
-            print(f"Too many {mode} problems!")
-            continue
-
-        problem_dict = {
+        # Convert the grid to PDDL
+        pddl_str = mazenamo_problem(grid, robot_direction, robot_pos).pddl_str()
+        candidate = {
             "grid": grid,
             "robot_pos": robot_pos,
             "robot_direction": robot_direction,
+            "pddl_str": pddl_str,
         }
-
-        with open(f"{problem_dir[mode]['map']}/mazenamo_map_{problem_idx[mode]}.pkl", "wb") as f:
-            pkl.dump(problem_dict, f)
-
-        with open(f"{problem_dir[mode]['pddl']}/mazenamo_problem_{problem_idx[mode]}.pddl", "w") as f:
-            f.write(pddl_str)
-
-        with open(f"{problem_dir[mode]['solution_sat']}/mazenamo_solution_{problem_idx[mode]}.txt", "w") as f:
-            for move in fd_plan:
-                f.write(str(move) + '\n')
-        print(f"Find a/an {mode} problem! Solved in {time_cost}s. Plan length {len(fd_plan)}.")
-        problem_idx[mode] += 1
+        return candidate, pddl_str, time_limit
+
+    def accept(candidate, result):
+        return len(result["plan"]) >= min_plan_length
+
+    thresholds = load_or_calibrate_thresholds(
+        args.thresholds_file, f"mazenamo_{problem_size}x{problem_size}", sample, accept,
+        pddl_domain_file_path, modes, metric=args.effort_metric,
+        num_samples=args.calibration_samples, planner_name="fd-lama-first",
+        num_workers=args.num_workers, recalibrate=args.recalibrate)
+
+    def classify(candidate, result):
+        fd_plan = result["plan"]
+        value = effort(result, args.effort_metric)
+        mode = classify_effort(value, thresholds, modes)
+        if mode is None or not accept(candidate, result):
+            print(f"Problem too easy! {args.effort_metric} {value}. Plan length {len(fd_plan)}.")
+            return None
+        return mode
+
+    def save(mode, idx, candidate, result):
+        problem_dict = {
+            "grid": candidate["grid"],
+            "robot_pos": candidate["robot_pos"],
+            "robot_direction": candidate["robot_direction"],
+        }
+        # The pddl file is written last: generation resumes after the last one.
+        write_atomic(f"{problem_dir[mode]['map']}/mazenamo_map_{idx}.pkl", pkl.dumps(problem_dict))
+        write_atomic(f"{problem_dir[mode]['solution_sat']}/mazenamo_solution_{idx}.txt",
+                     "".join(str(move) + '\n' for move in result["plan"]))
+        write_atomic(f"{problem_dir[mode]['solution_sat']}/mazenamo_metrics_{idx}.json",
+                     json.dumps(problem_metrics(mode, result, thresholds), indent=2))
+        write_atomic(f"{problem_dir[mode]['pddl']}/mazenamo_problem_{idx}.pddl", candidate["pddl_str"])
+
+    start_indices = {mode: next_free_index(problem_dir[mode]["pddl"], "mazenamo_problem_", ".pddl")
+                     for mode in modes}
+    generate_problems(sample, classify, save, modes, MAX_PROBLEM_NUM,
+                      pddl_domain_file_path, planner_name="fd-lama-first",
+                      num_workers=args.num_workers, start_indices=start_indices,
+                      time_limits=thresholds["time_limits"])
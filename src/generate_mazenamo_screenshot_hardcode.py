@@ -147,9 +147,6 @@ if __name__ == "__main__":
 
     grid, robot_pos, robot_direction = generate_hardcode_map()
 
-    # Save the grid to a .npy file
-    np.save("mazenamo_grid.npy", grid)
-
     # print("direction", robot_direction, DIRECTIONS.index(robot_direction))
     vec_env: MazeNamoEnv = gym.make(
         "MiniGrid-MazeNamo-v0",
@@ -160,8 +157,7 @@ if __name__ == "__main__":
         agent_start_dir=DIRECTIONS.index(robot_direction),
     )
     mazenamo_env = vec_env.env.env
-    mazenamo_env.gen_grid(problem_size, problem_size)
-    mazenamo_env.reset()
+    mazenamo_env.reset(options={"grid": grid})
     imageio.imwrite(f"vis/mazenamo_{problem_size}x{problem_size}_hardcode_original_problem.jpg", mazenamo_env.get_frame(highlight=False))
 
     gym_grid = mazenamo_env.grid.grid
@@ -243,7 +239,6 @@ if __name__ == "__main__":
 
         if "gnn_ignored_objects" in vis_info and vis_info["gnn_ignored_objects"] is not None:
             _grid = get_gnn_relaxed_grid(grid.copy(), vis_info["gnn_ignored_objects"])
-            np.save("mazenamo_grid.npy", _grid)
             _vec_env: MazeNamoEnv = gym.make(
                 "MiniGrid-MazeNamo-v0",
                 render_mode="rgb_array",
@@ -253,13 +248,11 @@ if __name__ == "__main__":
                 agent_start_dir=DIRECTIONS.index(robot_direction),
             )
             _mazenamo_env = _vec_env.env.env
-            _mazenamo_env.gen_grid(problem_size, problem_size)
-            _mazenamo_env.reset()
+            _mazenamo_env.reset(options={"grid": _grid})
             imageio.imwrite(f"{vis_log_dir}/mazenamo_{problem_size}x{problem_size}_{problem_idx}_{planner_type}_gnn-relaxed_problem_{seed}.jpg", _mazenamo_env.get_frame(highlight=False))
 
             for threshold, ignored_objects in vis_info["gnn_ignored_objects_threshold_dict"].items():
                 _grid = get_gnn_relaxed_grid(grid.copy(), ignored_objects)
-                np.save("mazenamo_grid.npy", _grid)
                 _vec_env: MazeNamoEnv = gym.make(
                     "MiniGrid-MazeNamo-v0",
                     render_mode="rgb_array",
@@ -269,13 +262,11 @@ if __name__ == "__main__":
                     agent_start_dir=DIRECTIONS.index(robot_direction),
                 )
                 _mazenamo_env = _vec_env.env.env
-                _mazenamo_env.gen_grid(problem_size, problem_size)
-                _mazenamo_env.reset()
+                _mazenamo_env.reset(options={"grid": _grid})
                 imageio.imwrite(f"{vis_log_dir}/mazenamo_{problem_size}x{problem_size}_{problem_idx}_{planner_type}_gnn-relaxed_problem_{seed}_{threshold:.5f}.jpg", _mazenamo_env.get_frame(highlight=False))
 
         if "cmpl_ignored_objects" in vis_info and vis_info["cmpl_ignored_objects"] is not None:
             _grid = get_gnn_relaxed_grid(grid.copy(), vis_info["cmpl_ignored_objects"])
-            np.save("mazenamo_grid.npy", _grid)
             _vec_env: MazeNamoEnv = gym.make(
                 "MiniGrid-MazeNamo-v0",
                 # render_mode="human",
@@ -286,13 +277,11 @@ if __name__ == "__main__":
                 agent_start_dir=DIRECTIONS.index(robot_direction),
             )
             _mazenamo_env = _vec_env.env.env
-            _mazenamo_env.gen_grid(problem_size, problem_size)
-            _mazenamo_env.reset()
+            _mazenamo_env.reset(options={"grid": _grid})
             imageio.imwrite(f"{vis_log_dir}/mazenamo_{problem_size}x{problem_size}_{problem_idx}_{planner_type}_enhanced_problem_{seed}.jpg", _mazenamo_env.get_frame(highlight=False))
 
         if "relx_ignored_objects" in vis_info and vis_info["relx_ignored_objects"] is not None:
             _grid = get_rule_relaxed_grid(grid.copy(), vis_info["relx_ignored_objects"])
-            np.save("mazenamo_grid.npy", _grid)
             _vec_env: MazeNamoEnv = gym.make(
                 "MiniGrid-MazeNamo-v0",
                 # render_mode="human",
@@ -303,8 +292,7 @@ if __name__ == "__main__":
                 agent_start_dir=DIRECTIONS.index(robot_direction),
             )
             _mazenamo_env = _vec_env.env.env
-            _mazenamo_env.gen_grid(problem_size, problem_size)
-            _mazenamo_env.reset()
+            _mazenamo_env.reset(options={"grid": _grid})
             frames = [_mazenamo_env.get_frame(highlight=False)]
             for move in vis_info["relaxed_plan"]:
                 action_name = move.__str__().split('(')[0]
@@ -1,12 +1,13 @@
-import re
-import subprocess
-import time
+import argparse
 import numpy as np
 import random
 import os
+import json
 import pickle as pkl
 
-from my_utils.pddl_utils import _create_planner
+from my_utils.grid_pddl import sokomindplus_problem
+from my_utils.problem_generation import generate_problems, next_free_index, write_atomic, \
+    load_or_calibrate_thresholds, classify_effort, effort, problem_metrics, EFFORT_METRICS
 
 # -----------------------------
 # Grid cell types
@@ -140,120 +141,22 @@ def grid_to_pddl_sokomindplus(
         leftTo pA pB means "pA is left of pB".
         rightTo pA pB means "pA is right of pB".
         We only create these relations between non-wall cells.
+      The facts are computed for all cells at once, see
+      my_utils.grid_pddl.sokomindplus_problem.
     - Goal:
         Only the goal boxes appear in the goal:
         (:goal (and (oAt b<i0> p<gidx0>) (oAt b<i1> p<gidx1>) ... ))
     """
 
-    assert len(goal_box_indices) == len(goal_positions)
-    num_boxes = len(box_positions)
+    assert grid.shape == (size, size)
+    pddl_str = sokomindplus_problem(
+        grid, robot_pos, box_positions, goal_box_indices, goal_positions,
+        problem_name=problem_name, domain_name=domain_name).pddl_str()
 
-    # ---------- Objects ----------
-    object_lines = []
-    object_lines.append("r - robot")
-
-    # Box objects
-    for i in range(num_boxes):
-        object_lines.append(f"b{i} - obj")
-
-    # Position objects (including walls; walls just have no adjacency)
-    for y in range(size):
-        for x in range(size):
-            idx = y * size + x
-            object_lines.append(f"p{idx} - pos")
-
-    # ---------- Init ----------
-    init_lines = []
-
-    # Robot initial position
-    r_idx = robot_pos[0] * size + robot_pos[1]
-    init_lines.append(f"(rAt r p{r_idx})")
-
-    # Boxes initial positions + isBox
-    box_set = set(box_positions)
-    for i, (y, x) in enumerate(box_positions):
-        idx = y * size + x
-        init_lines.append(f"(oAt b{i} p{idx})")
-        init_lines.append(f"(isBox b{i})")
-
-    # posEmpty: all non-wall cells that do NOT contain a box
-    for y in range(size):
-        for x in range(size):
-            if grid[y, x] == WALL:
-                continue
-            if (y, x) in box_set:
-                continue
-            idx = y * size + x
-            init_lines.append(f"(posEmpty p{idx})")
-
-    # Adjacency relations between non-wall cells
-    for y in range(size):
-        for x in range(size):
-            if grid[y, x] == WALL:
-                continue
-
-            idx = y * size + x
-
-            # Cell above: (y-1, x)
-            if y > 0 and grid[y - 1, x] != WALL:
-                up_idx = (y - 1) * size + x
-                # upTo above, current
-                init_lines.append(f"(upTo p{up_idx} p{idx})")
-                # downTo current, above
-                init_lines.append(f"(downTo p{idx} p{up_idx})")
-
-            # Cell below: (y+1, x)
-            if y < size - 1 and grid[y + 1, x] != WALL:
-                down_idx = (y + 1) * size + x
-                # downTo below, current
-                init_lines.append(f"(downTo p{down_idx} p{idx})")
-                # upTo current, below
-                init_lines.append(f"(upTo p{idx} p{down_idx})")
-
-            # Cell to the left: (y, x-1)
-            if x > 0 and grid[y, x - 1] != WALL:
-                left_idx = y * size + (x - 1)
-                # leftTo left, current
-                init_lines.append(f"(leftTo p{left_idx} p{idx})")
-                # rightTo current, left
-                init_lines.append(f"(rightTo p{idx} p{left_idx})")
-
-            # Cell to the right: (y, x+1)
-            if x < size - 1 and grid[y, x + 1] != WALL:
-                right_idx = y * size + (x + 1)
-                # rightTo right, current
-                init_lines.append(f"(rightTo p{right_idx} p{idx})")
-                # leftTo current, right
-                init_lines.append(f"(leftTo p{idx} p{right_idx})")
-
-    # ---------- Goal: only goal boxes ----------
-    goal_lines = []
-    for (box_i, (gy, gx)) in zip(goal_box_indices, goal_positions):
-        g_idx = gy * size + gx
-        goal_lines.append(f"(oAt b{box_i} p{g_idx})")
-
-    objects_str = "\n        ".join(object_lines)
-    init_str = "\n        ".join(init_lines)
-    goal_str = "\n          ".join(goal_lines)
-
-    pddl_str = f"""(define (problem {problem_name})
-  (:domain {domain_name})
-  (:objects
-        {objects_str}
-  )
-  (:init
-        {init_str}
-  )
-  (:goal
-        (and
-          {goal_str}
-        )
-  )
-)"""
-
-    os.makedirs(os.path.dirname(tmp_pddl_path), exist_ok=True)
-    with open(tmp_pddl_path, "w") as f:
-        f.write(pddl_str)
+    if tmp_pddl_path is not None:
+        os.makedirs(os.path.dirname(tmp_pddl_path) or ".", exist_ok=True)
+        with open(tmp_pddl_path, "w") as f:
+            f.write(pddl_str)
 
     return pddl_str
 
@@ -263,68 +166,44 @@ def grid_to_pddl_sokomindplus(
 # -----------------------------
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problem_size", type=int, default=20)
+    parser.add_argument("--max_problem_num", type=int, default=200)
+    parser.add_argument("--num_workers", type=int, default=None,
+                        help="FD processes solving candidates in parallel, default one per core")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--effort_metric", type=str, default="expanded", choices=EFFORT_METRICS,
+                        help="FD search statistic the difficulty is classified by")
+    parser.add_argument("--thresholds_file", type=str, default="config/difficulty_thresholds.json")
+    parser.add_argument("--calibration_samples", type=int, default=100)
+    parser.add_argument("--recalibrate", action="store_true")
+    args = parser.parse_args()
+
     # Path to sokomindplus domain
     pddl_domain_file_path = "pddl_files/domains/sokomindplus.pddl"
-    tmp_pddl_problem_path = "tmp_sokomindplus_problem.pddl"
-    MAX_PROBLEM_NUM = 200
-
-    problem_size = 20
-
-    # Timeouts and difficulty thresholds per size
-    if problem_size == 10:
-        timeout = {
-            "min": 0.05,
-            "easy": 1,
-            "medium": 3,
-            "hard": 5,
-            "expert": 15,
-        }
-    elif problem_size == 15:
-        timeout = {
-            "min": 0.1,
-            "easy": 2,
-            "medium": 6,
-            "hard": 10,
-            "expert": 30,
-        }
-    elif problem_size == 18:
-        timeout = {
-            "min": 3,
-            "easy": 10,
-            "medium": 25,
-            "hard": 40,
-            "expert": 120,
-        }
-    else:  # default for 20
-        timeout = {
-            "min": 10,
-            "easy": 30,
-            "medium": 60,
-            "hard": 120,
-            "expert": 300,
-        }
+    MAX_PROBLEM_NUM = args.max_problem_num
+
+    problem_size = args.problem_size
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # FD time limit per candidate (20 by default); the difficulty is
+    # classified by search effort
+    time_limit = {10: 15, 15: 30, 18: 120}.get(problem_size, 300)
 
     # Minimal plan length filter to discard trivial instances
     min_plan_length = int(0.1 * problem_size ** 2)
 
-    problem_idx = {
-        "easy": 0,
-        "medium": 0,
-        "hard": 0,
-        "expert": 0,
-    }
-
+    modes = ["easy", "medium", "hard", "expert"]
     problem_dir = {}
-    for mode in ["easy", "medium", "hard", "expert"]:
+    for mode in modes:
         problem_dir[mode] = {}
         for d in ["map", "pddl", "solution_sat"]:
             path = f"pddl_files/problems/sokomindplus_problems/{d}_{problem_size}x{problem_size}_{mode}"
             problem_dir[mode][d] = path
             os.makedirs(path, exist_ok=True)
 
-    pddl_planner = _create_planner("fd-lama-first")
-
-    while True:
+    def sample(open_modes):
         try:
             grid, robot_pos, box_positions, goal_box_indices, goal_positions = \
                 generate_random_sokomindplus_map(
@@ -339,10 +218,7 @@ if __name__ == "__main__":
             # Map too crowded or otherwise unsatisfied constraints,
             # just try again.
             print(f"Failed to generate a valid map: {e}")
-            continue
-
-        # Save grid for later visualization / analysis
-        np.save("sokomindplus_grid.npy", grid)
+            return None
 
         # Build PDDL problem
         pddl_str = grid_to_pddl_sokomindplus(
@@ -354,85 +230,57 @@ if __name__ == "__main__":
             goal_positions,
             problem_name="sokomindplus_problem",
             domain_name="sokomindplus",
-            tmp_pddl_path=tmp_pddl_problem_path,
+            tmp_pddl_path=None,
         )
-
-        # Call Fast Downward
-        cmd_str = pddl_planner._get_cmd_str(
-            pddl_domain_file_path,
-            tmp_pddl_problem_path,
-            timeout=timeout["expert"],
-        )
-        start_time = time.time()
-        output = subprocess.getoutput(cmd_str)
-        pddl_planner._cleanup()
-
-        # Clean up temporary files
-        if os.path.exists(tmp_pddl_problem_path):
-            os.remove(tmp_pddl_problem_path)
-        if os.path.exists("sokomindplus_grid.npy"):
-            os.remove("sokomindplus_grid.npy")
-
-        time_cost = time.time() - start_time
-
-        if "Solution found!" not in output:
-            print(f"Plan not found with FD! Spent {time_cost:.2f}s.")
-            continue
-
-        # Classify difficulty based on solving time
-        mode = None
-        if timeout["min"] <= time_cost < timeout["easy"]:
-            mode = "easy"
-        elif timeout["easy"] <= time_cost < timeout["medium"]:
-            mode = "medium"
-        elif timeout["medium"] <= time_cost < timeout["hard"]:
-            mode = "hard"
-        elif timeout["hard"] <= time_cost < timeout["expert"]:
-            mode = "expert"
-
-        # Extract plan
-        fd_plan = re.findall(r"(.+) \(\d+?\)", output.lower())
-
-        if mode is None or not fd_plan or len(fd_plan) < min_plan_length:
-            print(
-                f"Problem too easy or too fast! "
-                f"Time {time_cost:.2f}s, plan length {len(fd_plan)}."
-            )
-            continue
-
-        if problem_idx[mode] >= MAX_PROBLEM_NUM:
-            print(f"Too many {mode} problems, skipping more of this mode.")
-            continue
-
-        # Save map metadata
-        idx = problem_idx[mode]
-        problem_dict = {
+        candidate = {
             "grid": grid,
             "robot_pos": robot_pos,
             "box_positions": box_positions,
             "goal_box_indices": goal_box_indices,
             "goal_positions": goal_positions,
+            "pddl_str": pddl_str,
         }
+        return candidate, pddl_str, time_limit
+
+    def accept(candidate, result):
+        return len(result["plan"]) >= min_plan_length
+
+    thresholds = load_or_calibrate_thresholds(
+        args.thresholds_file, f"sokomindplus_{problem_size}x{problem_size}", sample, accept,
+        pddl_domain_file_path, modes, metric=args.effort_metric,
+        num_samples=args.calibration_samples, planner_name="fd-lama-first",
+        num_workers=args.num_workers, recalibrate=args.recalibrate)
+
+    def classify(candidate, result):
+        # Classify difficulty based on search effort
+        fd_plan = result["plan"]
+        value = effort(result, args.effort_metric)
+        mode = classify_effort(value, thresholds, modes)
+        if mode is None or not accept(candidate, result):
+            print(
+                f"Problem too easy! "
+                f"{args.effort_metric} {value}, plan length {len(fd_plan)}."
+            )
+            return None
+        return mode
 
-        with open(
-            f"{problem_dir[mode]['map']}/sokomindplus_map_{idx}.pkl", "wb"
-        ) as f:
-            pkl.dump(problem_dict, f)
-
-        with open(
-            f"{problem_dir[mode]['pddl']}/sokomindplus_problem_{idx}.pddl", "w"
-        ) as f:
-            f.write(pddl_str)
-
-        with open(
-            f"{problem_dir[mode]['solution_sat']}/sokomindplus_solution_{idx}.txt",
-            "w",
-        ) as f:
-            for move in fd_plan:
-                f.write(str(move) + "\n")
-
-        print(
-            f"Found an {mode} problem! "
-            f"Solved in {time_cost:.2f}s, plan length {len(fd_plan)}."
-        )
-        problem_idx[mode] += 1
+    def save(mode, idx, candidate, result):
+        # Save map metadata
+        problem_dict = {key: candidate[key] for key in [
+            "grid", "robot_pos", "box_positions", "goal_box_indices", "goal_positions"]}
+        # The pddl file is written last: generation resumes after the last one.
+        write_atomic(f"{problem_dir[mode]['map']}/sokomindplus_map_{idx}.pkl",
+                     pkl.dumps(problem_dict))
+        write_atomic(f"{problem_dir[mode]['solution_sat']}/sokomindplus_solution_{idx}.txt",
+                     "".join(str(move) + "\n" for move in result["plan"]))
+        write_atomic(f"{problem_dir[mode]['solution_sat']}/sokomindplus_metrics_{idx}.json",
+                     json.dumps(problem_metrics(mode, result, thresholds), indent=2))
+        write_atomic(f"{problem_dir[mode]['pddl']}/sokomindplus_problem_{idx}.pddl",
+                     candidate["pddl_str"])
+
+    start_indices = {mode: next_free_index(problem_dir[mode]["pddl"], "sokomindplus_problem_", ".pddl")
+                     for mode in modes}
+    generate_problems(sample, classify, save, modes, MAX_PROBLEM_NUM,
+                      pddl_domain_file_path, planner_name="fd-lama-first",
+                      num_workers=args.num_workers, start_indices=start_indices,
+                      time_limits=thresholds["time_limits"])
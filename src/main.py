@@ -1,68 +1,164 @@
 import os
+import json
 import time
+import shutil
 import argparse
+import tempfile
+import multiprocessing
 import pddlgym
 from pddlgym.structs import LiteralConjunction
 from planning import PlanningTimeout, PlanningFailure, \
-    validate_strips_plan, verify_validate_installed, IncrementalPlanner, ComplementaryPlanner, PureRelaxationPlanner, FlaxPlanner
+    validate_strips_plan, verify_validate_installed
+from planning import tracing
 from guidance import NoSearchGuidance, GNNSearchGuidance
-from my_utils.pddl_utils import _create_planner
+from my_utils.pddl_utils import _create_planner, create_planner_to_test
+from my_utils.results_store import ResultsStore, method_name, object_counts, plan_record
 
 
-def _test_planner(planner_type, planner, domain_name, num_problems, timeout):
+def _solve_problem(planner_type, planner, env, domain_name, problem_idx,
+                   timeout, seed=0, trace_dir=None, trace_format="jsonl",
+                   save_plans=False):
+    """Solve and validate one test problem and return its result record.
+
+    With save_plans, the record also holds the plan and vis_info (see
+    my_utils.results_store.plan_record).
+    """
+    problem_name = env.problems[problem_idx].problem_fname.split("/")[-1]
+    result = {"domain": domain_name, "planner_type": planner_type,
+              "seed": seed, "problem_idx": problem_idx, "problem": problem_name,
+              "timeout": timeout, "outcome": None, "valid": None,
+              "failure_reason": None, "planning_time": None, "plan_length": None}
+    trace = tracing.Trace("solve", domain=domain_name, problem=problem_name,
+                          planner_type=planner_type, seed=seed)
+    try:
+        with trace.activate() as root:
+            with tracing.span("reset"):
+                env.fix_problem_index(problem_idx)
+                state, _ = env.reset()
+            if type(state.goal).__name__ == "Literal":
+                state = state.with_goal(LiteralConjunction([state.goal]))
+            start = time.time()
+            try:
+                with tracing.span("plan"):
+                    if planner_type == "pure":
+                        plan, vis_info = planner(env.domain, state, timeout=timeout), None
+                    else:
+                        plan, vis_info = planner(env.domain, state, timeout=timeout)
+            except (PlanningTimeout, PlanningFailure) as e:
+                print("\t\tPlanning failed with error: {}".format(e), flush=True)
+                result["outcome"] = e.__class__.__name__
+                result["failure_reason"] = str(e)
+                root.set(outcome=result["outcome"])
+                return result
+            result.update(object_counts(state, vis_info))
+            if save_plans:
+                result.update(plan_record(plan, vis_info))
+            # Validate plan on the full test problem.
+            if not validate_strips_plan(
+                    domain_file=env.domain.domain_fname,
+                    problem_file=env.problems[problem_idx].problem_fname,
+                    plan=plan):
+                print("\t\tPlanning returned an invalid plan")
+                result["outcome"] = "InvalidPlan"
+                result["valid"] = False
+                root.set(outcome=result["outcome"])
+                return result
+
+            result["planning_time"] = time.time()-start
+            result["plan_length"] = len(plan)
+            result["outcome"] = "Success"
+            result["valid"] = True
+            root.set(outcome="Success", plan_length=result["plan_length"])
+            print("\t\tSuccess, got plan of length {} in {:.5f} seconds".format(
+                result["plan_length"], result["planning_time"]), flush=True)
+            return result
+    finally:
+        result["stage_times"] = _stage_times(trace)
+        if trace_dir is not None:
+            extension = ".json" if trace_format == "chrome" else ".jsonl"
+            trace.write(os.path.join(trace_dir, "{}_seed{}_{}{}".format(
+                domain_name, seed, problem_name, extension)), trace_format)
+
+
+def _stage_times(trace):
+    """Total wall time per span name, excluding the root span.
+    """
+    stage_times = {}
+    for record in trace.to_dicts():
+        if record["parent"] is not None:
+            stage_times[record["name"]] = stage_times.get(record["name"], 0) + record["duration"]
+    return stage_times
+
+
+def _summarize(results, num_problems, timeout):
+    """Aggregate the result records of one seed.
+    """
+    solved = [result for result in results if result["outcome"] == "Success"]
+    failure_problem_list = [result["problem"] for result in results
+                            if result["outcome"] in ("PlanningTimeout", "PlanningFailure")]
+    if not solved:
+        return timeout, 0, 0, []
+    success_num = len(solved)
+    avg_planning_time = sum(result["planning_time"] for result in solved)/success_num
+    success_rate = success_num/num_problems
+    avg_plan_length = sum(result["plan_length"] for result in solved)/success_num
+    print("Avg planning time: {:.5f}".format(avg_planning_time), flush=True)
+    print("Success rate: {:.5f}".format(success_rate), flush=True)
+    return avg_planning_time, success_rate, avg_plan_length, failure_problem_list
+
+
+def _test_planner(planner_type, planner, domain_name, num_problems, timeout,
+                  seed=0, trace_dir=None, trace_format="jsonl", results_file=None,
+                  store=None, method=None, save_plans=False, guider=None):
     print("Running testing...")
+    if trace_dir is not None:
+        os.makedirs(trace_dir, exist_ok=True)
     env = pddlgym.make("PDDLEnv{}-v0".format(domain_name))
     num_problems = min(num_problems, len(env.problems))
-
-    success_num = 0
-    planning_time_list = []
-    plan_length_list = []
-    failure_problem_list = []
+    results = _stored_results(store, domain_name, method, [seed])[seed]
 
     for problem_idx in range(num_problems):
+        problem_name = _problem_name(env, problem_idx)
+        if problem_name in results:
+            print("\tSkipping problem {} of {}, already in the results store".format(
+                problem_idx+1, num_problems), flush=True)
+            continue
         print("\tTesting problem {} of {}".format(problem_idx+1, num_problems),
               flush=True)
-        env.fix_problem_index(problem_idx)
-        state, _ = env.reset()
-        if type(state.goal).__name__ == "Literal":
-            state = state.with_goal(LiteralConjunction([state.goal]))
-        start = time.time()
-        try:
-            if planner_type == "pure":
-                plan = planner(env.domain, state, timeout=timeout)
-            else:
-                plan, vis_info = planner(env.domain, state, timeout=timeout)
-        except (PlanningTimeout, PlanningFailure) as e:
-            print("\t\tPlanning failed with error: {}".format(e), flush=True)
-            failure_problem_list.append(env.problems[problem_idx].problem_fname.split("/")[-1])
-            continue
-        # Validate plan on the full test problem.
-        if not validate_strips_plan(
-                domain_file=env.domain.domain_fname,
-                problem_file=env.problems[problem_idx].problem_fname,
-                plan=plan):
-            print("\t\tPlanning returned an invalid plan")
-            continue
+        if guider is not None:
+            # Reseed per problem, as _run_job does, so results are the same
+            # with any number of workers.
+            guider.seed(seed)
+        results[problem_name] = _solve_problem(
+            planner_type, planner, env, domain_name, problem_idx, timeout,
+            seed=seed, trace_dir=trace_dir, trace_format=trace_format,
+            save_plans=save_plans)
+        _report_result(results[problem_name], results_file, store, method)
+    return _summarize(_results_of_problems(results, env, num_problems),
+                      num_problems, timeout)
 
 
-        planning_time = time.time()-start
-        planning_time_list.append(planning_time)
-        success_num += 1
-        plan_length = len(plan)
-        plan_length_list.append(plan_length)
-        print("\t\tSuccess, got plan of length {} in {:.5f} seconds".format(
-            plan_length, planning_time), flush=True)
-        
-        
-    if success_num != 0:
-        avg_planning_time = sum(planning_time_list)/success_num
-        success_rate = success_num/num_problems
-        avg_plan_length = sum(plan_length_list)/success_num
-        print("Avg planning time: {:.5f}".format(avg_planning_time), flush=True)
-        print("Success rate: {:.5f}".format(success_rate), flush=True)
-        return avg_planning_time, success_rate, avg_plan_length, failure_problem_list
-    else:
-        return timeout, 0, 0, []
+def _problem_name(env, problem_idx):
+    return env.problems[problem_idx].problem_fname.split("/")[-1]
+
+
+def _stored_results(store, domain_name, method, seeds):
+    """Return a dict from seed to a dict from problem name to the stored result.
+    """
+    results = {seed: {} for seed in seeds}
+    if store is not None:
+        for seed in seeds:
+            for result in store.load(domain=domain_name, method=method, seed=seed):
+                results[seed][result["problem"]] = result
+    return results
+
+
+def _results_of_problems(results, env, num_problems):
+    """The results of the first num_problems problems, in problem order.
+    """
+    return [results[_problem_name(env, problem_idx)]
+            for problem_idx in range(num_problems)
+            if _problem_name(env, problem_idx) in results]
 
 
 def _create_guider(guider_name, planner_name, num_train_problems,
@@ -90,9 +186,147 @@ def _create_guider(guider_name, planner_name, num_train_problems,
     raise Exception("Unrecognized guider name '{}'.".format(guider_name))
 
 
+def _report_result(result, results_file=None, store=None, method=None):
+    """Save one result record as soon as it is known.
+
+    The record is appended to a JSON lines file and/or recorded in a
+    ResultsStore.
+    """
+    if results_file is not None:
+        with open(results_file, "a") as f:
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    if store is not None:
+        store.record(method, result)
+
+
+# Per-process state of the evaluation workers, set up by _init_worker
+_worker = {}
+
+
+def _init_worker(config, cpu_queue):
+    """Pin the worker to its own core.
+
+    Everything that can fail is set up lazily by _run_job, since a pool
+    restarts workers whose initializer raises.
+    """
+    try:
+        cpu = cpu_queue.get(timeout=1)
+    except Exception:
+        # A replacement for a dead worker gets no core of its own
+        cpu = None
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    _worker.update(config)
+    _worker["cpu"] = cpu
+    _worker["guiders"] = {}
+
+
+def _run_job(job):
+    """Solve one (seed, problem) job in a worker.
+
+    The job runs in its own temporary directory, which is also the default
+    directory of the tempfile module, so the PDDL files, the FD sas file and
+    the files FD writes to the working directory are never shared with
+    another job.
+    """
+    seed, problem_idx = job
+    if "env" not in _worker:
+        _worker["env"] = pddlgym.make("PDDLEnv{}Test-v0".format(_worker["domain_name"]))
+        _worker["planner"] = _create_planner(_worker["test_planner_name"])
+    guider = _worker["guiders"].get(seed)
+    if guider is None:
+        # Training was done by the parent, so this loads the saved model.
+        guider = _create_guider(_worker["guider_name"], _worker["train_planner_name"],
+                                _worker["num_train_problems"], _worker["is_strips_domain"],
+                                _worker["num_epochs"], seed)
+        guider.seed(seed)
+        guider.train(_worker["domain_name"], timeout=_worker["train_timeout"])
+        _worker["guiders"][seed] = guider
+    # Reseed per job so results do not depend on the order jobs are run in.
+    guider.seed(seed)
+    planner_to_test = create_planner_to_test(
+        _worker["planner_type"], _worker["planner"], guider,
+        _worker["is_strips_domain"], seed, _worker["cmpl_rules"],
+        _worker["relx_rules"], _worker["relevance_prefilter"])
+
+    job_dir = tempfile.mkdtemp(prefix="seed{}_problem{}_".format(seed, problem_idx))
+    cwd = os.getcwd()
+    tempdir = tempfile.tempdir
+    os.chdir(job_dir)
+    tempfile.tempdir = job_dir
+    try:
+        result = _solve_problem(
+            _worker["planner_type"], planner_to_test, _worker["env"],
+            _worker["domain_name"]+"Test", problem_idx,
+            _worker["test_timeout"], seed=seed, trace_dir=_worker["trace_dir"],
+            trace_format=_worker["trace_format"], save_plans=_worker["save_plans"])
+    finally:
+        tempfile.tempdir = tempdir
+        os.chdir(cwd)
+        shutil.rmtree(job_dir, ignore_errors=True)
+    result["cpu"] = _worker["cpu"]
+    return result
+
+
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _test_planner_parallel(config, seeds, num_problems, num_workers,
+                           results_file=None, store=None, method=None):
+    """Run all (seed, problem) jobs on a pool of worker processes.
+
+    Each worker is pinned to a core of its own, so at most one job runs per
+    core and planning times stay comparable to a sequential run. Results are
+    saved (see _report_result) as jobs complete, and jobs with a result in
+    the store are skipped.
+
+    Returns a dict from seed to the result records of that seed.
+    """
+    domain_name = config["domain_name"]+"Test"
+    env = pddlgym.make("PDDLEnv{}-v0".format(domain_name))
+    num_problems = min(num_problems, len(env.problems))
+    results = _stored_results(store, domain_name, method, seeds)
+    jobs = [(seed, problem_idx) for seed in seeds
+            for problem_idx in range(num_problems)
+            if _problem_name(env, problem_idx) not in results[seed]]
+    num_workers = max(1, min(num_workers, len(jobs)))
+
+    cpus = _available_cpus()
+    pin = hasattr(os, "sched_setaffinity")
+    if pin and num_workers > len(cpus):
+        print("Only {} cores available, using {} workers".format(
+            len(cpus), len(cpus)), flush=True)
+        num_workers = len(cpus)
+    # Spawn, not fork, so workers do not inherit threads (e.g. of torch)
+    ctx = multiprocessing.get_context("spawn")
+    cpu_queue = ctx.Queue()
+    for i in range(num_workers):
+        cpu_queue.put(cpus[i % len(cpus)] if pin else None)
+
+    print("Running {} jobs on {} workers...".format(len(jobs), num_workers),
+          flush=True)
+    if jobs:
+        with ctx.Pool(num_workers, initializer=_init_worker,
+                      initargs=(config, cpu_queue)) as pool:
+            for result in pool.imap_unordered(_run_job, jobs, chunksize=1):
+                results[result["seed"]][result["problem"]] = result
+                _report_result(result, results_file, store, method)
+                print("\tSeed {}, problem {}: {}".format(
+                    result["seed"], result["problem"], result["outcome"]), flush=True)
+    return {seed: _results_of_problems(results[seed], env, num_problems)
+            for seed in seeds}, num_problems
+
+
 def _run(domain_name, train_planner_name, test_planner_name,
          guider_name, num_seeds, num_train_problems, num_test_problems,
-         planner_type, train_timeout, test_timeout, num_epochs, cmpl_rules, relx_rules):
+         planner_type, train_timeout, test_timeout, num_epochs, cmpl_rules, relx_rules,
+         trace_dir=None, trace_format="jsonl", num_workers=1, results_file=None,
+         results_db=None, save_plans=False, relevance_prefilter=False):
     assert verify_validate_installed(), "`validate` installation not found, please follow the README"
     print("Starting run:")
     print("\tDomain: {}".format(domain_name))
@@ -111,47 +345,73 @@ def _run(domain_name, train_planner_name, test_planner_name,
     assert domain_name in pddlgym_env_names
     domain_name = pddlgym_env_names[domain_name]
     is_strips_domain = True
+    if trace_dir is not None:
+        # Workers change their working directory
+        trace_dir = os.path.abspath(trace_dir)
+        os.makedirs(trace_dir, exist_ok=True)
+    if results_file is not None:
+        results_file = os.path.abspath(results_file)
+        os.makedirs(os.path.dirname(results_file), exist_ok=True)
+    # Problems with a result in the store are skipped, so a sweep can be resumed
+    store = None if results_db is None else ResultsStore(results_db)
+    method = method_name(planner_type, test_planner_name, guider_name,
+                         relevance_prefilter)
 
     planning_time_list, success_rate_list, plan_length_list = [], [], []
     total_failure_problem_set = set()
-    for seed in range(num_seeds):
-        print("Starting seed {}".format(seed), flush=True)
+    if num_workers > 1:
+        # Train (or load) the guiders up front; the workers load the saved models.
+        for seed in range(num_seeds):
+            print("Training seed {}".format(seed), flush=True)
+            guider = _create_guider(guider_name, train_planner_name,
+                                    num_train_problems, is_strips_domain,
+                                    num_epochs, seed)
+            guider.seed(seed)
+            guider.train(domain_name, timeout=train_timeout)
+        config = dict(
+            domain_name=domain_name, train_planner_name=train_planner_name,
+            test_planner_name=test_planner_name, guider_name=guider_name,
+            num_train_problems=num_train_problems, planner_type=planner_type,
+            train_timeout=train_timeout, test_timeout=test_timeout,
+            num_epochs=num_epochs, cmpl_rules=cmpl_rules, relx_rules=relx_rules,
+            is_strips_domain=is_strips_domain, trace_dir=trace_dir,
+            trace_format=trace_format, save_plans=save_plans,
+            relevance_prefilter=relevance_prefilter)
+        results, num_problems = _test_planner_parallel(
+            config, list(range(num_seeds)), num_test_problems, num_workers,
+            results_file=results_file, store=store, method=method)
+        for seed in range(num_seeds):
+            print("Seed {}".format(seed), flush=True)
+            planning_time, success_rate, plan_length, failure_problem_list = _summarize(
+                results[seed], num_problems, test_timeout)
+            planning_time_list.append(planning_time)
+            success_rate_list.append(success_rate)
+            plan_length_list.append(plan_length)
+            total_failure_problem_set.update(failure_problem_list)
+    else:
+        for seed in range(num_seeds):
+            print("Starting seed {}".format(seed), flush=True)
+
+            guider = _create_guider(guider_name, train_planner_name,
+                                    num_train_problems, is_strips_domain,
+                                    num_epochs, seed)
+            guider.seed(seed)
+            guider.train(domain_name, timeout=train_timeout)
+
+            planner_to_test = create_planner_to_test(
+                planner_type, planner, guider, is_strips_domain, seed,
+                cmpl_rules, relx_rules, relevance_prefilter)
+
+            planning_time, success_rate, plan_length, failure_problem_list = _test_planner(planner_type, planner_to_test, domain_name+"Test",
+                          num_problems=num_test_problems, timeout=test_timeout,
+                          seed=seed, trace_dir=trace_dir, trace_format=trace_format,
+                          results_file=results_file, store=store, method=method,
+                          save_plans=save_plans, guider=guider)
+            planning_time_list.append(planning_time)
+            success_rate_list.append(success_rate)
+            plan_length_list.append(plan_length)
+            total_failure_problem_set.update(failure_problem_list)
 
-        guider = _create_guider(guider_name, train_planner_name,
-                                num_train_problems, is_strips_domain,
-                                num_epochs, seed)
-        guider.seed(seed)
-        guider.train(domain_name, timeout=train_timeout)
-
-        if planner_type == "pure":
-            planner_to_test = planner
-        elif planner_type == "ploi":
-            planner_to_test = IncrementalPlanner(
-                is_strips_domain=is_strips_domain,
-                base_planner=planner, search_guider=guider, seed=seed)
-        elif planner_type == "cmpl":
-            planner_to_test = ComplementaryPlanner(
-                is_strips_domain=is_strips_domain,
-                base_planner=planner, search_guider=guider, seed=seed, 
-                complementary_rules=cmpl_rules)
-        elif planner_type == "relx":
-            planner_to_test = PureRelaxationPlanner(
-                is_strips_domain=is_strips_domain,
-                base_planner=planner, search_guider=guider, seed=seed, 
-                relaxation_rules=relx_rules)
-        elif planner_type == "flax":
-            planner_to_test = FlaxPlanner(
-                is_strips_domain=is_strips_domain,
-                base_planner=planner, search_guider=guider, seed=seed, 
-                complementary_rules=cmpl_rules, relaxation_rules=relx_rules)
-
-        planning_time, success_rate, plan_length, failure_problem_list = _test_planner(planner_type, planner_to_test, domain_name+"Test",
-                      num_problems=num_test_problems, timeout=test_timeout)
-        planning_time_list.append(planning_time)
-        success_rate_list.append(success_rate)
-        plan_length_list.append(plan_length)
-        total_failure_problem_set.update(failure_problem_list)
-        
     print("\n\nFinished run\n\n\n\n")
     print(f"planning time list: {planning_time_list}")
     print(f"success rate list: {success_rate_list}")
@@ -160,6 +420,8 @@ def _run(domain_name, train_planner_name, test_planner_name,
     print(f"total avg success rate: {sum(success_rate_list)/num_seeds}")
     print(f"total avg plan length: {sum(plan_length_list)/num_seeds}")
     print(f"total failure problem set: {total_failure_problem_set}")
+    if store is not None:
+        store.close()
 
 
 if __name__ == "__main__":
@@ -177,10 +439,30 @@ if __name__ == "__main__":
     parser.add_argument("--num_epochs", type=int, default=301)
     parser.add_argument("--cmpl_rules", type=str, default="config/mazenamo_complementary_rules.json")
     parser.add_argument("--relx_rules", type=str, default="config/mazenamo_relaxation_rules.json")
+    parser.add_argument("--trace_dir", type=str, default=None,
+                        help="write a timing trace per test problem to this directory")
+    parser.add_argument("--trace_format", type=str, default="jsonl",
+                        choices=["jsonl", "chrome"])
+    parser.add_argument("--num_workers", type=int, default=1,
+                        help="solve test problems in parallel, one process pinned per core")
+    parser.add_argument("--results_file", type=str, default=None,
+                        help="append one JSON line per solved test problem to this file")
+    parser.add_argument("--results_db", type=str, default=None,
+                        help="record results in this SQLite database and skip "
+                             "problems that already have a result")
+    parser.add_argument("--save_plans", action="store_true",
+                        help="add the plan and vis_info of each problem to the "
+                             "--results_file records, see src/render_plans.py")
+    parser.add_argument("--relevance_prefilter", action="store_true",
+                        help="before scoring objects, drop those that cannot "
+                             "contribute to the goal according to a backward "
+                             "relevance analysis")
     args = parser.parse_args()
 
     _run(args.domain_name, args.train_planner_name,
          args.test_planner_name, args.guider_name, args.num_seeds,
          args.num_train_problems, args.num_test_problems,
          args.planner_type, args.train_timeout, args.test_timeout, args.num_epochs,
-         args.cmpl_rules, args.relx_rules)
+         args.cmpl_rules, args.relx_rules, args.trace_dir, args.trace_format,
+         args.num_workers, args.results_file, args.results_db, args.save_plans,
+         args.relevance_prefilter)
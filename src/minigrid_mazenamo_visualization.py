@@ -1,43 +1,17 @@
 import argparse
 import io
-import time
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import os
-import gymnasium as gym
-from minigrid.envs import MazeNamoEnv
 import pickle as pkl
 import imageio
-from my_utils.pddl_utils import *
-import pddlgym
-from pddlgym.structs import LiteralConjunction
-from planning import PlanningTimeout, PlanningFailure, \
-    validate_strips_plan, IncrementalPlanner, ComplementaryPlanner, PureRelaxationPlanner, FlaxPlanner
+from my_utils.planning_session import PlanningSession
+from my_utils.plan_rendering import get_gnn_relaxed_grid, get_rule_relaxed_grid, \
+    write_plan_video
 
 
-def get_gnn_relaxed_grid(grid, ignored_objects):
-    size, _ = grid.shape
-    for _obj in ignored_objects:
-        obj = _obj.__str__().split(":")[0]
-        if obj[0] == "o":
-            x, y = (int(obj[1:])-1)%size, (int(obj[1:])-1)//size
-            grid[x, y] = WALL
-        elif obj[0] == "p":
-            x, y = (int(obj[1:]))%size, (int(obj[1:]))//size
-            grid[x, y] = WALL
-    return grid
-
-def get_rule_relaxed_grid(grid, ignored_objects):
-    size, _ = grid.shape
-    for _obj in ignored_objects:
-        obj = _obj.__str__().split(":")[0]
-        if obj[0] == "o":
-            x, y = (int(obj[1:])-1)%size, (int(obj[1:])-1)//size
-            grid[x, y] = EMPTY
-    return grid
-
-def visualize_one_problem(problem_map_dir, problem_idx, args):
+def visualize_one_problem(session, problem_map_dir, problem_idx, args):
     problem_map_file = f"{problem_map_dir}/namo_map_{problem_idx}.pkl"
     with open(problem_map_file, "rb") as f:
         problem_dict = pkl.load(f)
@@ -46,184 +20,52 @@ def visualize_one_problem(problem_map_dir, problem_idx, args):
     robot_pos = problem_dict["robot_pos"]
     robot_direction = problem_dict["robot_direction"]
 
-    vec_env: MazeNamoEnv = gym.make(
-        "MiniGrid-MazeNamo-v0",
-        # render_mode="human",
-        render_mode="rgb_array",
-        width=args.problem_size,
-        height=args.problem_size,
-        size=None,
-        agent_start_dir=DIRECTIONS.index(robot_direction),
-    )
-
-    mazenamo_env = vec_env.env.env
-    np.save("mazenamo_grid.npy", grid)
-    mazenamo_env.gen_grid(args.problem_size, args.problem_size)
-    mazenamo_env.reset()
+    mazenamo_env = session.minigrid_env(grid, robot_direction)
     imageio.imwrite(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}"
                     f"_{args.problem_mode}_{problem_idx}_original_problem.jpg", mazenamo_env.get_frame(highlight=False))
 
-    assert args.planner_type in ["pure", "ploi", "cmpl", "relx", "flax"], "Unknown planner type!"
-
-    planner = create_planner(args.test_planner_name)
-    pddlgym_env_names = {"MazeNamo": "Mazenamo"}
-    assert args.domain_name in pddlgym_env_names
-    domain_name = pddlgym_env_names[args.domain_name]
-    is_strips_domain = True
-
     print(f"Solving problem mazenamo_{args.problem_size}x{args.problem_size}"
           f"_{args.problem_mode}_{problem_idx} with {args.planner_type} planner...", flush=True)
-    seed = args.seed
-    print("Starting seed {}".format(seed), flush=True)
-
-    guider = create_guider(args.guider_name, args.train_planner_name,
-                            1, is_strips_domain, 1, seed)
-    guider.seed(seed)
-    guider.train(domain_name)
-
-    if args.planner_type == "pure":
-        planner_to_test = planner
-    elif args.planner_type == "ploi":
-        planner_to_test = IncrementalPlanner(
-            is_strips_domain=is_strips_domain,
-            base_planner=planner, search_guider=guider, seed=seed)
-    elif args.planner_type == "cmpl":
-        planner_to_test = ComplementaryPlanner(
-            is_strips_domain=is_strips_domain,
-            base_planner=planner, search_guider=guider, seed=seed, 
-            complementary_rules=args.cmpl_rules)
-    elif args.planner_type == "flax":
-        planner_to_test = FlaxPlanner(
-            is_strips_domain=is_strips_domain,
-            base_planner=planner, search_guider=guider, seed=seed, 
-            complementary_rules=args.cmpl_rules, relaxation_rules=args.relx_rules)
-
+    seed = session.seed
+    problem_name = f"mazenamo_problem_{problem_idx}.pddl"
     print("Running testing...")
-    env = pddlgym.make("PDDLEnv{}-v0".format(domain_name+"Test"))
-    _idx = None
-    for i, prob in enumerate(env.problems):
-        if f"namo_problem_{problem_idx}.pddl" in prob.problem_fname:
-            _idx = i
-            env.fix_problem_index(_idx)
-            break
-    state, _ = env.reset()
-    if type(state.goal).__name__ == "Literal":
-        state = state.with_goal(LiteralConjunction([state.goal]))
-    start = time.time()
-    try:
-        if args.planner_type == "pure":
-            plan = planner_to_test(env.domain, state, timeout=args.timeout)
-            vis_info = {}
-        else:
-            plan, vis_info = planner_to_test(env.domain, state, timeout=args.timeout)
-    except (PlanningTimeout, PlanningFailure) as e:
-        print("\t\tPlanning failed with error: {}".format(e), flush=True)
-    # Validate plan on the full test problem.
-    if not validate_strips_plan(
-            domain_file=env.domain.domain_fname,
-            problem_file=env.problems[_idx].problem_fname,
-            plan=plan):
-        print("\t\tPlanning returned an invalid plan")
-
-    print("Get plan of length {} in {:.5f} seconds".format(
-        len(plan), time.time()-start), flush=True)
+    result = session.solve(args.planner_type, problem_name, args.timeout)
+    plan, vis_info = result["plan"], result["vis_info"]
+    state = session.reset(problem_name)
 
-    np.save("mazenamo_grid.npy", grid)
-    mazenamo_env.gen_grid(args.problem_size, args.problem_size)
-    mazenamo_env.reset()
+    mazenamo_env = session.minigrid_env(grid, robot_direction)
 
-    frames = [mazenamo_env.get_frame(highlight=False)]
-    for move in plan:
-        action_name = move.__str__().split('(')[0]
-        action = PDDL_ACTIONNAME_TO_INT[action_name]
-        obs, rewards, dones, _, info = mazenamo_env.step(action)
-        # mazenamo_env.render()
-        frames.append(mazenamo_env.get_frame(highlight=False))
-
-    imageio.mimsave(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
-                    f"_{problem_idx}_{args.planner_type}_solution_{seed}.gif", frames, fps=5)
+    write_plan_video(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
+                     f"_{problem_idx}_{args.planner_type}_solution_{seed}.gif", mazenamo_env, plan)
 
     if "gnn_ignored_objects" in vis_info and vis_info["gnn_ignored_objects"] is not None:
         _grid = get_gnn_relaxed_grid(grid.copy(), vis_info["gnn_ignored_objects"])
-        np.save("mazenamo_grid.npy", _grid)
-        _vec_env: MazeNamoEnv = gym.make(
-            "MiniGrid-MazeNamo-v0",
-            render_mode="rgb_array",
-            width=args.problem_size,
-            height=args.problem_size,
-            size=None,
-            agent_start_dir=DIRECTIONS.index(robot_direction),
-        )
-        _namo_env = _vec_env.env.env
-        _namo_env.gen_grid(args.problem_size, args.problem_size)
-        _namo_env.reset()
+        _namo_env = session.minigrid_env(_grid, robot_direction)
         imageio.imwrite(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
                         f"_{problem_idx}_{args.planner_type}_gnn-relaxed_problem_{seed}.jpg", _namo_env.get_frame(highlight=False))
         
         if args.draw_scores:
             for threshold, ignored_objects in vis_info["gnn_ignored_objects_threshold_dict"].items():
                 _grid = get_gnn_relaxed_grid(grid.copy(), ignored_objects)
-                np.save("mazenamo_grid.npy", _grid)
-                _vec_env: MazeNamoEnv = gym.make(
-                    "MiniGrid-MazeNamo-v0",
-                    render_mode="rgb_array",
-                    width=args.problem_size,
-                    height=args.problem_size,
-                    size=None,
-                    agent_start_dir=DIRECTIONS.index(robot_direction),
-                )
-                _namo_env = _vec_env.env.env
-                _namo_env.gen_grid(args.problem_size, args.problem_size)
-                _namo_env.reset()
+                _namo_env = session.minigrid_env(_grid, robot_direction)
                 imageio.imwrite(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
                                 f"_{problem_idx}_{args.planner_type}_gnn-relaxed_problem_{seed}_{threshold:.5f}.jpg", _namo_env.get_frame(highlight=False))
 
     if "cmpl_ignored_objects" in vis_info and vis_info["cmpl_ignored_objects"] is not None:
         _grid = get_gnn_relaxed_grid(grid.copy(), vis_info["cmpl_ignored_objects"])
-        np.save("mazenamo_grid.npy", _grid)
-        _vec_env: MazeNamoEnv = gym.make(
-            "MiniGrid-MazeNamo-v0",
-            # render_mode="human",
-            render_mode="rgb_array",
-            width=args.problem_size,
-            height=args.problem_size,
-            size=None,
-            agent_start_dir=DIRECTIONS.index(robot_direction),
-        )
-        _namo_env = _vec_env.env.env
-        _namo_env.gen_grid(args.problem_size, args.problem_size)
-        _namo_env.reset()
+        _namo_env = session.minigrid_env(_grid, robot_direction)
         imageio.imwrite(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
                         f"_{problem_idx}_{args.planner_type}_enhanced_problem_{seed}.jpg", _namo_env.get_frame(highlight=False))
 
     if "relx_ignored_objects" in vis_info and vis_info["relx_ignored_objects"] is not None:
         _grid = get_rule_relaxed_grid(grid.copy(), vis_info["relx_ignored_objects"])
-        np.save("mazenamo_grid.npy", _grid)
-        _vec_env: MazeNamoEnv = gym.make(
-            "MiniGrid-MazeNamo-v0",
-            # render_mode="human",
-            render_mode="rgb_array",
-            width=args.problem_size,
-            height=args.problem_size,
-            size=None,
-            agent_start_dir=DIRECTIONS.index(robot_direction),
-        )
-        _namo_env = _vec_env.env.env
-        _namo_env.gen_grid(args.problem_size, args.problem_size)
-        _namo_env.reset()
-        frames = [_namo_env.get_frame(highlight=False)]
-        for move in vis_info["relaxed_plan"]:
-            action_name = move.__str__().split('(')[0]
-            action = PDDL_ACTIONNAME_TO_INT[action_name]
-            obs, rewards, dones, _, info = _namo_env.step(action)
-            # _namo_env.render()
-            frames.append(_namo_env.get_frame(highlight=False))
-
+        _namo_env = session.minigrid_env(_grid, robot_direction)
         if seed == 0:
             imageio.imwrite(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
-                            f"_{problem_idx}_{args.planner_type}_rule-relaxed_problem.jpg", frames[0])
-        imageio.mimsave(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
-                        f"_{problem_idx}_{args.planner_type}_rule-relaxed_solution_{seed}.gif", frames, fps=5)
+                            f"_{problem_idx}_{args.planner_type}_rule-relaxed_problem.jpg", _namo_env.get_frame(highlight=False))
+        write_plan_video(f"{args.vis_log_dir}/namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
+                         f"_{problem_idx}_{args.planner_type}_rule-relaxed_solution_{seed}.gif",
+                         _namo_env, vis_info["relaxed_plan"])
 
     if args.draw_scores and "object_to_score" in vis_info and vis_info["object_to_score"] is not None:
         def plot_scores_grid(scores: np.ndarray, filename: str) -> None:
@@ -304,9 +146,14 @@ if __name__ == "__main__":
     problem_map_dir = f"pddl_files/problems/mazenamo_problems/map_{args.problem_size}x{args.problem_size}_{args.problem_mode}"
     if not os.path.exists(args.vis_log_dir):
         os.mkdir(args.vis_log_dir)
+    assert args.planner_type in ["pure", "ploi", "cmpl", "relx", "flax"], "Unknown planner type!"
+    session = PlanningSession(
+        args.domain_name, [args.planner_type], args.test_planner_name,
+        args.guider_name, args.seed, train_planner_name=args.train_planner_name,
+        cmpl_rules=args.cmpl_rules, relx_rules=args.relx_rules)
     if args.problem_idx == "all":
         for file_name in os.listdir(problem_map_dir):
             problem_idx = file_name.split('.')[0].split('_')[-1]
-            visualize_one_problem(problem_map_dir, problem_idx, args)
+            visualize_one_problem(session, problem_map_dir, problem_idx, args)
     else:
-        visualize_one_problem(problem_map_dir, args.problem_idx, args)
+        visualize_one_problem(session, problem_map_dir, args.problem_idx, args)
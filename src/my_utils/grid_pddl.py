@@ -0,0 +1,300 @@
+"""Ground MazeNamo and SokomindPlus problems straight from integer grids.
+
+The occupancy and adjacency facts of all cells are computed at once with
+NumPy index arithmetic. They are kept as groups of object indices (see
+GroundProblem) and only turned into text when a PDDL file is needed, or into
+pddlgym literals when a State is needed, which skips writing and parsing the
+problem file.
+
+Positions are numbered row by row, p{y * width + x}.
+"""
+
+import numpy as np
+from pddlgym.structs import State, LiteralConjunction
+
+# MazeNamo cell values, see minigrid.envs.mazenamo
+MAZENAMO_EMPTY = 0
+MAZENAMO_WALL = 1
+MAZENAMO_HEAVY_OBJECT = 2
+MAZENAMO_LIGHT_OBJECT = 3
+MAZENAMO_ROBOT = 4
+MAZENAMO_GOAL = 5
+
+# SokomindPlus cell values, see generate_sokomindplus_problems
+SOKOMINDPLUS_WALL = 1
+
+
+class GroundProblem:
+    """Objects, initial facts and goal facts of a grid problem.
+
+    Objects are named by a prefix and an index, e.g. p0, p1, ... for the
+    positions, or by a name alone for single objects such as the robot r.
+    Facts are added in groups of one predicate, whose arguments are either
+    such names or (prefix, indices) pairs, with one fact per index.
+
+    Parameters
+    ----------
+    problem_name : str
+    domain_name : str
+    conjunctive_goal : bool
+        Write the goal as (and ...) even if it is a single fact.
+    """
+    def __init__(self, problem_name, domain_name, conjunctive_goal=False):
+        self.problem_name = problem_name
+        self.domain_name = domain_name
+        self.conjunctive_goal = conjunctive_goal
+        # (prefix, type name, indices or None)
+        self.objects = []
+        # (predicate, args), see add_facts
+        self.init = []
+        self.goal = []
+
+    def add_objects(self, prefix, type_name, indices=None):
+        self.objects.append((prefix, type_name, _as_indices(indices)))
+
+    def add_facts(self, predicate, *args, goal=False):
+        """Add one fact per index, e.g. add_facts("oAt", ("o", o), ("p", p)).
+        """
+        args = [arg if isinstance(arg, str) else (arg[0], _as_indices(arg[1]))
+                for arg in args]
+        (self.goal if goal else self.init).append((predicate, args))
+
+    def object_names(self):
+        """Return (name, type name) of all objects.
+        """
+        return [(name, type_name) for prefix, type_name, indices in self.objects
+                for name in _names(prefix, indices)]
+
+    @staticmethod
+    def fact_args(args):
+        """Return the argument names of each fact of a group.
+        """
+        columns = [_names(*arg) if not isinstance(arg, str) else None for arg in args]
+        num_facts = max((len(column) for column in columns if column is not None),
+                        default=1)
+        columns = [[arg] * num_facts if column is None else column
+                   for arg, column in zip(args, columns)]
+        return list(zip(*columns)) if columns else [()] * num_facts
+
+    def facts(self, goal=False):
+        """Return (predicate, argument names) of all initial or goal facts.
+        """
+        return [(predicate, names) for predicate, args in (self.goal if goal else self.init)
+                for names in self.fact_args(args)]
+
+    def pddl_str(self):
+        objects = "\n        ".join("{} - {}".format(name, type_name)
+                                    for name, type_name in self.object_names())
+        init = "\n        ".join(_fact_str(predicate, names)
+                                 for predicate, names in self.facts())
+        goal = [_fact_str(predicate, names) for predicate, names in self.facts(goal=True)]
+        if len(goal) == 1 and not self.conjunctive_goal:
+            goal = goal[0]
+        else:
+            goal = "(and\n          {}\n        )".format("\n          ".join(goal))
+        return """(define (problem {})
+  (:domain {})
+  (:objects
+        {}
+  )
+  (:init
+        {}
+  )
+  (:goal
+        {}
+  )
+)""".format(self.problem_name, self.domain_name, objects, init, goal)
+
+    def to_state(self, domain):
+        """Return the initial pddlgym State, as parsing pddl_str() would.
+
+        Parameters
+        ----------
+        domain : pddlgym.parser.PDDLDomainParser
+            E.g. env.domain of a pddlgym env of the domain.
+        """
+        # PDDL is case-insensitive and pddlgym lowercases all names. Entities
+        # are looked up by prefix and index, without formatting their names.
+        entities = {}
+        for prefix, type_name, indices in self.objects:
+            entity_type = domain.types[type_name.lower()]
+            if indices is None:
+                entities[prefix] = entity_type(prefix.lower())
+            else:
+                by_index = entities.setdefault(prefix, {})
+                by_index.update((idx, entity_type("{}{}".format(prefix.lower(), idx)))
+                                for idx in indices.tolist())
+
+        def literals(groups):
+            for predicate, args in groups:
+                predicate = domain.predicates[predicate.lower()]
+                columns = [[entities[arg]] if isinstance(arg, str) else
+                           [entities[arg[0]][idx] for idx in arg[1].tolist()]
+                           for arg in args]
+                num_facts = max(map(len, columns), default=1)
+                columns = [column * num_facts if len(column) == 1 else column
+                           for column in columns]
+                yield from map(predicate, *columns) if columns else [predicate()]
+
+        objects = frozenset(entity for by_index in entities.values()
+                            for entity in (by_index.values() if isinstance(by_index, dict)
+                                           else [by_index]))
+        init = set(literals(self.init))
+        if "=" in domain.predicates:
+            init.update(domain.predicates["="](obj, obj) for obj in objects)
+        goal = list(literals(self.goal))
+        if len(goal) == 1 and not self.conjunctive_goal:
+            goal = goal[0]
+        else:
+            goal = LiteralConjunction(goal)
+        return State(frozenset(init), objects, goal)
+
+
+def _as_indices(indices):
+    return None if indices is None else np.asarray(indices, dtype=int).ravel()
+
+
+def _names(prefix, indices):
+    if indices is None:
+        return [prefix]
+    return ["{}{}".format(prefix, idx) for idx in indices.tolist()]
+
+
+def _fact_str(predicate, names):
+    return "({})".format(" ".join((predicate,) + tuple(names)))
+
+
+def _neighbors(cells):
+    """Pairs of position indices of horizontally and vertically adjacent cells.
+
+    Returns (upper, lower) with lower one row below upper, and (left, right),
+    each restricted to pairs of cells in the boolean mask cells.
+    """
+    width = cells.shape[1]
+    # Flat indices of the first rows are already position indices
+    upper = np.flatnonzero(cells[:-1, :] & cells[1:, :])
+    left = np.flatnonzero(cells[:, :-1] & cells[:, 1:])
+    left = left // (width - 1) * width + left % (width - 1)
+    return (upper, upper + width), (left, left + 1)
+
+
+def mazenamo_problem(grid, robot_direction, robot_pos=None, no_wall_in_pddl=False,
+                     problem_name="mazenamo_problem", domain_name="mazenamo"):
+    """Ground a MazeNamo problem from its grid array.
+
+    Parameters
+    ----------
+    grid : np.ndarray
+        (width, height) array of cell values, indexed by [x, y] as in
+        MazeNamoEnv.
+    robot_direction : str
+        One of "dirIsRight", "dirIsDown", "dirIsLeft" and "dirIsUp".
+    robot_pos : tuple, optional
+        (x, y) of the robot, defaults to the robot cell of the grid.
+    no_wall_in_pddl : bool
+        Leave out the outer ring of cells.
+
+    Returns
+    -------
+    problem : GroundProblem
+        The obstacle on position p{k} is o{k + 1}.
+    """
+    grid = np.asarray(grid)
+    width, height = grid.shape
+    # Cell values by row, cells[y, x]
+    cells = grid.T
+    if robot_pos is None:
+        robot_pos = tuple(np.argwhere(grid == MAZENAMO_ROBOT)[0])
+    included = np.ones_like(cells, dtype=bool)
+    if no_wall_in_pddl:
+        included[[0, -1], :] = False
+        included[:, [0, -1]] = False
+
+    def positions(mask):
+        return np.flatnonzero(mask & included)
+
+    problem = GroundProblem(problem_name, domain_name)
+    problem.add_objects("r", "robot")
+    problem.add_objects("p", "pos", positions(included))
+    obstacles = positions(np.isin(cells, [MAZENAMO_WALL, MAZENAMO_HEAVY_OBJECT,
+                                          MAZENAMO_LIGHT_OBJECT]))
+    problem.add_objects("o", "obstacle", obstacles + 1)
+
+    problem.add_facts("rAt", "r", ("p", [robot_pos[1] * width + robot_pos[0]]))
+    problem.add_facts("handempty")
+    problem.add_facts(robot_direction, "r")
+    problem.add_facts("oAt", ("o", obstacles + 1), ("p", obstacles))
+    for cell, weight in [(MAZENAMO_HEAVY_OBJECT, "isHeavy"),
+                         (MAZENAMO_LIGHT_OBJECT, "isLight")]:
+        boxes = ("o", positions(cells == cell) + 1)
+        for predicate in [weight, "isMoveable", "onGround", "clear"]:
+            problem.add_facts(predicate, boxes)
+    problem.add_facts("posEmpty", ("p", positions(np.isin(
+        cells, [MAZENAMO_EMPTY, MAZENAMO_ROBOT, MAZENAMO_GOAL]))))
+
+    # All included cells are connected, walls included
+    (upper, lower), (left, right) = _neighbors(included)
+    problem.add_facts("upTo", ("p", upper), ("p", lower))
+    problem.add_facts("downTo", ("p", lower), ("p", upper))
+    problem.add_facts("leftTo", ("p", left), ("p", right))
+    problem.add_facts("rightTo", ("p", right), ("p", left))
+
+    problem.add_facts("rAt", "r", ("p", positions(cells == MAZENAMO_GOAL)), goal=True)
+    return problem
+
+
+def sokomindplus_problem(grid, robot_pos, box_positions, goal_box_indices, goal_positions,
+                         problem_name="sokomindplus_problem", domain_name="sokomindplus"):
+    """Ground a SokomindPlus problem from its grid array and layout.
+
+    Parameters
+    ----------
+    grid : np.ndarray
+        (size, size) array of cell values, indexed by [y, x].
+    robot_pos : tuple
+        (y, x) of the robot.
+    box_positions : list of tuple
+        (y, x) of the boxes b0, b1, ...
+    goal_box_indices : list of int
+        Boxes in the goal.
+    goal_positions : list of tuple
+        (y, x) goal position of each goal box.
+
+    Returns
+    -------
+    problem : GroundProblem
+    """
+    assert len(goal_box_indices) == len(goal_positions)
+    cells = np.asarray(grid)
+    height, width = cells.shape
+
+    def positions(yx):
+        yx = np.asarray(yx, dtype=int).reshape(-1, 2)
+        return yx[:, 0] * width + yx[:, 1]
+
+    boxes = positions(box_positions)
+    free = (cells != SOKOMINDPLUS_WALL).ravel()
+    empty = free.copy()
+    empty[boxes] = False
+
+    # The goal is always a conjunction, as in the problem files written before
+    problem = GroundProblem(problem_name, domain_name, conjunctive_goal=True)
+    problem.add_objects("r", "robot")
+    problem.add_objects("b", "obj", np.arange(len(boxes)))
+    # Walls are positions too, without adjacency
+    problem.add_objects("p", "pos", np.arange(width * height))
+
+    problem.add_facts("rAt", "r", ("p", positions(robot_pos)))
+    problem.add_facts("oAt", ("b", np.arange(len(boxes))), ("p", boxes))
+    problem.add_facts("isBox", ("b", np.arange(len(boxes))))
+    problem.add_facts("posEmpty", ("p", np.flatnonzero(empty)))
+
+    (upper, lower), (left, right) = _neighbors(free.reshape(height, width))
+    problem.add_facts("upTo", ("p", upper), ("p", lower))
+    problem.add_facts("downTo", ("p", lower), ("p", upper))
+    problem.add_facts("leftTo", ("p", left), ("p", right))
+    problem.add_facts("rightTo", ("p", right), ("p", left))
+
+    problem.add_facts("oAt", ("b", goal_box_indices), ("p", positions(goal_positions)),
+                      goal=True)
+    return problem
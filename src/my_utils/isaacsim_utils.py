@@ -125,8 +125,60 @@ def is_valid_candidate(candidate, circles, r, tol):
             tangent_found = True
     return tangent_found
 
+def neighbor_pairs(coords, max_dist):
+    """Return (i, j, d) of all ordered pairs of points i != j at a distance d < max_dist,
+    sorted by (i, j).
+
+    Points are hashed into a uniform grid of cells of size max_dist, so only
+    points in the same or adjacent cells are compared.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(coords)
+    if n == 0:
+        empty = np.zeros(0, dtype=int)
+        return empty, empty, np.zeros(0)
+    # Slightly larger cells, so rounding cannot move close points two cells apart
+    keys = np.floor(coords / (max_dist * (1 + 1e-9))).astype(np.int64)
+    keys -= keys.min(axis=0)
+    span = keys[:, 1].max() + 3
+    cell_ids = keys[:, 0] * span + keys[:, 1]
+    order = np.argsort(cell_ids, kind="stable")
+    sorted_ids = cell_ids[order]
+    pairs_i, pairs_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = (keys[:, 0] + dx) * span + keys[:, 1] + dy
+            start = np.searchsorted(sorted_ids, target, side="left")
+            counts = np.searchsorted(sorted_ids, target, side="right") - start
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            pairs_i.append(np.repeat(np.arange(n), counts))
+            pairs_j.append(order[np.repeat(start, counts) + offsets])
+    i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+    diff = coords[i] - coords[j]
+    d = np.hypot(diff[:, 0], diff[:, 1])
+    # np.hypot may differ from math.hypot (see distance) in the last bit,
+    # which only matters right at max_dist
+    for k in np.flatnonzero(np.isclose(d, max_dist, rtol=1e-12, atol=0)).tolist():
+        d[k] = distance(coords[i[k]], coords[j[k]])
+    keep = (i != j) & (d < max_dist)
+    i, j, d = i[keep], j[keep], d[keep]
+    sort = np.lexsort((j, i))
+    return i[sort], j[sort], d[sort]
+
 def sample_additional_positions(init_pos_dict, r, xmin=-10, xmax=10, ymin=-10, ymax=10):
     tmp_pos_dict = init_pos_dict.copy()
+    tol = r / 2
+    # Only circles closer than 2r + tol can overlap or touch a candidate, so
+    # the circles are hashed into cells of that size.
+    cell_size = (2 * r + tol) * (1 + 1e-9)
+    cells = {}
+
+    def cell(center):
+        return (math.floor(center[0] / cell_size), math.floor(center[1] / cell_size))
+
+    for center in tmp_pos_dict.values():
+        cells.setdefault(cell(center), []).append(center)
+
     # Randomly sample additional circles
     max_failures = 100000
     failures = 0
@@ -134,8 +186,12 @@ def sample_additional_positions(init_pos_dict, r, xmin=-10, xmax=10, ymin=-10, y
     while failures < max_failures:
         # Sample a random candidate within the region.
         candidate = (random.uniform(xmin, xmax), random.uniform(ymin, ymax))
-        if is_valid_candidate(candidate, tmp_pos_dict.values(), r, tol=r/2):
+        cx, cy = cell(candidate)
+        nearby = [center for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                  for center in cells.get((cx + dx, cy + dy), ())]
+        if is_valid_candidate(candidate, nearby, r, tol=tol):
             tmp_pos_dict[f"p{len(tmp_pos_dict)}"] = candidate
+            cells.setdefault((cx, cy), []).append(candidate)
             # draw_circle(candidate, r) 
             failures = 0  # reset failure counter after a success
         else:
@@ -169,31 +225,25 @@ def isaacsim_to_pddl(obj2pos, pos_dict, radius, robot_direction="dirIsDown", tmp
         if pos not in pos_occupied:
             init_state.append(f"(posEmpty {pos})")
 
-    for pos_1, coord_1 in pos_dict.items():
-        for pos_2, coord_2 in pos_dict.items():
-            if pos_1 == pos_2:
-                continue
-            dis = distance(coord_1, coord_2)
-            x1, y1 = coord_1
-            x2, y2 = coord_2
-            if dis < 2.1*radius:
-                if y1 > y2 and abs(x1 - x2) <= abs(y1 - y2):
-                    init_state.append(f"(upTo {pos_1} {pos_2})")
-                elif y1 < y2 and abs(x1 - x2) <= abs(y1 - y2):
-                    init_state.append(f"(downTo {pos_1} {pos_2})")
-                elif x1 < x2 and abs(y1 - y2) <= abs(x1 - x2):
-                    init_state.append(f"(leftTo {pos_1} {pos_2})")
-                elif x1 > x2 and abs(y1 - y2) <= abs(x1 - x2):
-                    init_state.append(f"(rightTo {pos_1} {pos_2})")
-            elif dis < 2.2*radius:
-                if y1 > y2 and abs(x1 - x2)*2 <= abs(y1 - y2):
-                    init_state.append(f"(upTo {pos_1} {pos_2})")
-                elif y1 < y2 and abs(x1 - x2)*2 <= abs(y1 - y2):
-                    init_state.append(f"(downTo {pos_1} {pos_2})")
-                elif x1 < x2 and abs(y1 - y2)*2 <= abs(x1 - x2):
-                    init_state.append(f"(leftTo {pos_1} {pos_2})")
-                elif x1 > x2 and abs(y1 - y2)*2 <= abs(x1 - x2):
-                    init_state.append(f"(rightTo {pos_1} {pos_2})")
+    # Directional adjacency of the positions closer than 2.2 * radius, with a
+    # narrower cone between 2.1 and 2.2 * radius
+    pos_names = list(pos_dict)
+    coords = np.array([pos_dict[pos][:2] for pos in pos_names], dtype=float).reshape(-1, 2)
+    i, j, d = neighbor_pairs(coords, 2.2*radius)
+    for k in np.flatnonzero(np.isclose(d, 2.1*radius, rtol=1e-12, atol=0)).tolist():
+        d[k] = distance(coords[i[k]], coords[j[k]])
+    x1, y1 = coords[i, 0], coords[i, 1]
+    x2, y2 = coords[j, 0], coords[j, 1]
+    cone = np.where(d < 2.1*radius, 1, 2)
+    vertical = np.abs(x1 - x2)*cone <= np.abs(y1 - y2)
+    horizontal = np.abs(y1 - y2)*cone <= np.abs(x1 - x2)
+    predicates = np.select(
+        [(y1 > y2) & vertical, (y1 < y2) & vertical,
+         (x1 < x2) & horizontal, (x1 > x2) & horizontal],
+        ["upTo", "downTo", "leftTo", "rightTo"], default="")
+    for predicate, k1, k2 in zip(predicates.tolist(), i.tolist(), j.tolist()):
+        if predicate:
+            init_state.append(f"({predicate} {pos_names[k1]} {pos_names[k2]})")
 
     objects = "\n\t\t".join(objects)
     goal = "\n\t\t".join(goal)
@@ -1,6 +1,7 @@
 import os
 from guidance import NoSearchGuidance, GNNSearchGuidance
-from planning import FD
+from planning import FD, IncrementalPlanner, ComplementaryPlanner, \
+    PureRelaxationPlanner, FlaxPlanner
 
 DIRECTIONS = ['dirIsRight', 'dirIsDown', 'dirIsLeft', 'dirIsUp']
 
@@ -83,4 +84,33 @@ def _create_guider(guider_name, planner_name, num_train_problems,
 def create_guider(guider_name, planner_name, num_train_problems,
                     is_strips_domain, num_epochs, seed):
         return _create_guider(guider_name, planner_name, num_train_problems,
-                            is_strips_domain, num_epochs, seed)
\ No newline at end of file
+                            is_strips_domain, num_epochs, seed)
+
+def create_planner_to_test(planner_type, planner, guider, is_strips_domain,
+                           seed, cmpl_rules, relx_rules, relevance_prefilter=False):
+    if planner_type == "pure":
+        return planner
+    if planner_type == "ploi":
+        return IncrementalPlanner(
+            is_strips_domain=is_strips_domain,
+            base_planner=planner, search_guider=guider, seed=seed,
+            relevance_prefilter=relevance_prefilter)
+    if planner_type == "cmpl":
+        return ComplementaryPlanner(
+            is_strips_domain=is_strips_domain,
+            base_planner=planner, search_guider=guider, seed=seed, 
+            complementary_rules=cmpl_rules,
+            relevance_prefilter=relevance_prefilter)
+    if planner_type == "relx":
+        return PureRelaxationPlanner(
+            is_strips_domain=is_strips_domain,
+            base_planner=planner, search_guider=guider, seed=seed, 
+            relaxation_rules=relx_rules,
+            relevance_prefilter=relevance_prefilter)
+    if planner_type == "flax":
+        return FlaxPlanner(
+            is_strips_domain=is_strips_domain,
+            base_planner=planner, search_guider=guider, seed=seed, 
+            complementary_rules=cmpl_rules, relaxation_rules=relx_rules,
+            relevance_prefilter=relevance_prefilter)
+    raise Exception("Unrecognized planner type '{}'.".format(planner_type))
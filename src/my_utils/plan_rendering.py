@@ -0,0 +1,322 @@
+"""Render stored MazeNamo plans without planning again.
+
+main.py --save_plans keeps the plan and vis_info of every test problem in
+its results file (see results_store.plan_record). The records are rendered
+here by a pool of worker processes, each with one MiniGrid env per grid size
+that is reset to the map of every problem. Tiles are cached per process by
+Grid.render_tile, so they are drawn once per worker and reused by every
+frame after that.
+
+Plans are written as GIFs or MP4s while they are replayed, one frame at a
+time, and the objects a planner ignored and the GNN scores are drawn over
+the tiles of the initial frame with NumPy.
+"""
+
+import os
+import re
+import json
+import pickle as pkl
+import tempfile
+import contextlib
+import multiprocessing
+import numpy as np
+import imageio
+import gymnasium as gym
+from minigrid.envs import MazeNamoEnv  # registers MiniGrid-MazeNamo-v0
+from my_utils.pddl_utils import PDDL_ACTIONNAME_TO_INT, DIRECTIONS, EMPTY, WALL, GOAL
+
+# Blended over the tiles of ignored objects and scored cells
+IGNORED_COLOR = (0, 0, 0)
+IGNORED_ALPHA = 0.6
+LOW_SCORE_COLOR = (178, 0, 0)
+HIGH_SCORE_COLOR = (0, 140, 0)
+SCORE_ALPHA = 0.5
+
+# Per-process MiniGrid envs of the workers, by grid size
+_envs = {}
+
+
+def minigrid_env(grid, robot_direction, envs):
+    """Return a MiniGrid MazeNamo env reset to the grid.
+
+    envs maps a grid size to the env created for it, which is reused for
+    all grids of that size.
+    """
+    size = grid.shape[0]
+    env = envs.get(size)
+    if env is None:
+        vec_env = gym.make(
+            "MiniGrid-MazeNamo-v0",
+            render_mode="rgb_array",
+            width=size,
+            height=size,
+            size=None,
+            agent_start_dir=DIRECTIONS.index(robot_direction),
+        )
+        env = envs[size] = vec_env.env.env
+    env.agent_start_dir = DIRECTIONS.index(robot_direction)
+    env.reset(options={"grid": grid})
+    return env
+
+
+def object_cell(obj, width):
+    """(x, y) of an obstacle o{k + 1} or position p{k}, None for other objects.
+
+    obj is a TypedEntity or its string, e.g. 'o12:obstacle'.
+    """
+    name = str(obj).split(":")[0]
+    if not re.fullmatch(r"[op]\d+", name):
+        return None
+    k = int(name[1:]) - (name[0] == "o")
+    return k % width, k // width
+
+
+def get_gnn_relaxed_grid(grid, ignored_objects):
+    width = grid.shape[0]
+    for obj in ignored_objects:
+        cell = object_cell(obj, width)
+        if cell is not None:
+            grid[cell] = WALL
+    return grid
+
+
+def get_rule_relaxed_grid(grid, ignored_objects):
+    width = grid.shape[0]
+    for obj in ignored_objects:
+        if str(obj).startswith("o"):
+            grid[object_cell(obj, width)] = EMPTY
+    return grid
+
+
+def action_index(action):
+    """MiniGrid action of a pddlgym action or its string.
+    """
+    return PDDL_ACTIONNAME_TO_INT[str(action).split("(")[0]]
+
+
+def shade_cells(frame, mask, colors, alpha):
+    """Blend colors over the tiles of the cells in mask.
+
+    Parameters
+    ----------
+    frame : np.ndarray
+        (height * tile_size, width * tile_size, 3) frame of a grid.
+    mask : np.ndarray
+        (height, width) boolean array of the cells to shade.
+    colors : np.ndarray or tuple
+        (height, width, 3) color per cell, or one RGB color.
+    alpha : float
+
+    Returns
+    -------
+    frame : np.ndarray
+        A new frame.
+    """
+    height, width = mask.shape
+    tile_size = frame.shape[0] // height
+    colors = np.broadcast_to(np.asarray(colors, dtype=float), (height, width, 3))
+    # Per-cell values are repeated over the pixels of each tile
+    pixels = np.repeat(np.repeat(mask, tile_size, axis=0), tile_size, axis=1)
+    colors = np.repeat(np.repeat(colors, tile_size, axis=0), tile_size, axis=1)
+    shaded = frame.astype(float)
+    shaded[pixels] = (1 - alpha) * shaded[pixels] + alpha * colors[pixels]
+    return np.rint(shaded).astype(np.uint8)
+
+
+def ignored_objects_overlay(frame, ignored_objects, width, height):
+    """Shade the cells of the ignored obstacles and positions.
+    """
+    mask = np.zeros((height, width), dtype=bool)
+    for obj in ignored_objects:
+        cell = object_cell(obj, width)
+        if cell is not None:
+            mask[cell[1], cell[0]] = True
+    return shade_cells(frame, mask, IGNORED_COLOR, IGNORED_ALPHA)
+
+
+def score_heatmap(frame, scores):
+    """Shade each scored cell from LOW_SCORE_COLOR to HIGH_SCORE_COLOR.
+
+    scores is a (height, width) array, NaN where there is no score.
+    """
+    scored = ~np.isnan(scores)
+    if not scored.any():
+        return frame.copy()
+    low, high = scores[scored].min(), scores[scored].max()
+    level = np.zeros_like(scores)
+    if high > low:
+        level[scored] = (scores[scored] - low) / (high - low)
+    colors = (1 - level)[..., None] * np.array(LOW_SCORE_COLOR) + \
+        level[..., None] * np.array(HIGH_SCORE_COLOR)
+    return shade_cells(frame, scored, colors, SCORE_ALPHA)
+
+
+def object_scores(object_to_score, grid):
+    """(height, width) arrays of the obstacle and position scores.
+
+    The goal position is not scored by the GNN and gets the score 1.
+    """
+    width, height = grid.shape
+    obstacle_scores = np.full((height, width), np.nan)
+    pos_scores = np.full((height, width), np.nan)
+    pos_scores[grid.T == GOAL] = 1.
+    for obj, score in object_to_score.items():
+        cell = object_cell(obj, width)
+        if cell is not None:
+            scores = obstacle_scores if str(obj).startswith("o") else pos_scores
+            scores[cell[1], cell[0]] = score
+    return obstacle_scores, pos_scores
+
+
+@contextlib.contextmanager
+def atomic_output(path):
+    """Yield a temporary path that replaces path once the block succeeds.
+
+    The temporary file keeps the extension of path, from which imageio
+    picks the format, so an interrupted run never leaves a truncated file.
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=".",
+                                    suffix=os.path.splitext(name)[1])
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_image(path, image):
+    with atomic_output(path) as tmp_path:
+        imageio.imwrite(tmp_path, image)
+
+
+def write_plan_video(path, env, plan, fps=5, tile_size=32):
+    """Replay the plan in env and encode each frame as soon as it is drawn.
+
+    The format follows the extension of path, e.g. .gif or .mp4 (which
+    needs imageio[ffmpeg]). Returns the number of frames.
+    """
+    num_frames = 0
+    with atomic_output(path) as tmp_path:
+        with imageio.get_writer(tmp_path, fps=fps) as writer:
+            writer.append_data(env.get_frame(highlight=False, tile_size=tile_size))
+            num_frames += 1
+            for action in plan:
+                env.step(action_index(action))
+                writer.append_data(env.get_frame(highlight=False, tile_size=tile_size))
+                num_frames += 1
+    return num_frames
+
+
+def problem_index(problem_name):
+    """Index of a problem file, e.g. 12 for 'mazenamo_problem_12.pddl'.
+    """
+    match = re.search(r"_(\d+)\.pddl$", problem_name)
+    if match is None:
+        raise Exception("No problem index in '{}'.".format(problem_name))
+    return int(match.group(1))
+
+
+def load_plan_records(results_file, planner_types=None, seeds=None):
+    """Return the successful records of a results file that hold a plan.
+
+    Records of a problem that was solved again replace the earlier ones.
+    Returns (records, number of successful records without a plan).
+    """
+    records = {}
+    with open(results_file) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["outcome"] != "Success":
+                continue
+            if planner_types is not None and record["planner_type"] not in planner_types:
+                continue
+            if seeds is not None and record["seed"] not in seeds:
+                continue
+            key = (record["domain"], record["planner_type"], record["seed"], record["problem"])
+            records[key] = record
+    with_plan = [record for record in records.values() if "plan" in record]
+    return with_plan, len(records) - len(with_plan)
+
+
+def render_record(job):
+    """Render the plan of one result record in a worker and return the files.
+
+    job is a tuple (record, map_file, out_dir, options), where options has
+    the keys "prefix", "video_format", "fps", "tile_size" and "draw_scores".
+    """
+    record, map_file, out_dir, options = job
+    with open(map_file, "rb") as f:
+        problem_dict = pkl.load(f)
+    grid = problem_dict["grid"]
+    robot_direction = problem_dict["robot_direction"]
+    width, height = grid.shape
+    vis_info = record["vis_info"]
+    tile_size = options["tile_size"]
+    name = "{}_{}_{}".format(options["prefix"], problem_index(record["problem"]),
+                             record["planner_type"])
+
+    def path(kind, extension):
+        return os.path.join(out_dir, "{}_{}_{}.{}".format(
+            name, kind, record["seed"], extension))
+
+    written = []
+    env = minigrid_env(grid, robot_direction, _envs)
+    frame = env.get_frame(highlight=False, tile_size=tile_size)
+    overlays = [("gnn-ignored", vis_info.get("gnn_ignored_objects")),
+                ("cmpl-ignored", vis_info.get("cmpl_ignored_objects")),
+                ("relx-ignored", vis_info.get("relx_ignored_objects"))]
+    if options["draw_scores"]:
+        overlays += [("gnn-ignored_{:.5f}".format(threshold), ignored_objects)
+                     for threshold, ignored_objects in
+                     vis_info.get("gnn_ignored_objects_threshold_dict") or []]
+    for kind, ignored_objects in overlays:
+        if ignored_objects is not None:
+            written.append(path(kind, "jpg"))
+            write_image(written[-1], ignored_objects_overlay(
+                frame, ignored_objects, width, height))
+    if options["draw_scores"] and vis_info.get("object_to_score") is not None:
+        for kind, scores in zip(["object_scores", "pos_scores"],
+                                object_scores(vis_info["object_to_score"], grid)):
+            written.append(path(kind, "png"))
+            write_image(written[-1], score_heatmap(frame, scores))
+
+    written.append(path("solution", options["video_format"]))
+    write_plan_video(written[-1], env, record["plan"], options["fps"], tile_size)
+    if vis_info.get("relx_ignored_objects") is not None and vis_info.get("relaxed_plan"):
+        relaxed_grid = get_rule_relaxed_grid(grid.copy(), vis_info["relx_ignored_objects"])
+        written.append(path("rule-relaxed_solution", options["video_format"]))
+        write_plan_video(written[-1], minigrid_env(relaxed_grid, robot_direction, _envs),
+                         vis_info["relaxed_plan"], options["fps"], tile_size)
+    return written
+
+
+def render_records(records, map_dir, out_dir, num_workers=1, prefix="mazenamo",
+                   video_format="gif", fps=5, tile_size=32, draw_scores=False):
+    """Render result records on a pool of worker processes.
+
+    The map of a record is map_dir/mazenamo_map_{idx}.pkl, where idx is the
+    index of its problem file. Yields the files written for each record as
+    records are done.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    options = {"prefix": prefix, "video_format": video_format, "fps": fps,
+               "tile_size": tile_size, "draw_scores": draw_scores}
+    jobs = []
+    for record in records:
+        map_file = os.path.join(map_dir, "mazenamo_map_{}.pkl".format(
+            problem_index(record["problem"])))
+        if not os.path.exists(map_file):
+            raise Exception("No map {} for problem {}.".format(map_file, record["problem"]))
+        jobs.append((record, map_file, out_dir, options))
+    if not jobs:
+        return
+    num_workers = max(1, min(num_workers, len(jobs)))
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(num_workers) as pool:
+        yield from pool.imap_unordered(render_record, jobs, chunksize=1)
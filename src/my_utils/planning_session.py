@@ -0,0 +1,143 @@
+"""Planners, guider and test env shared by the problems of one run.
+"""
+
+import os
+import time
+import pddlgym
+from pddlgym.structs import LiteralConjunction
+from planning import PlanningTimeout, PlanningFailure, validate_strips_plan
+from my_utils.pddl_utils import create_planner, create_guider, \
+    create_planner_to_test
+from my_utils.plan_rendering import minigrid_env
+from my_utils.results_store import object_counts
+
+PDDLGYM_ENV_NAMES = {"MazeNamo": "Mazenamo"}
+
+
+class PlanningSession:
+    """Solve many test problems of one domain with the same planners.
+
+    The guider is trained (or its model loaded), the planners are created
+    and the test problems are parsed once, when the session is created.
+    Problems are then looked up by file name through an index.
+
+    Parameters
+    ----------
+    domain_name : str
+        Domain, e.g. "MazeNamo".
+    planner_types : list of str
+        Planner types to create, any of "pure", "ploi", "cmpl", "relx" and
+        "flax".
+    test_planner_name : str
+        Base planner, e.g. "fd-lama-first".
+    guider_name : str
+        Search guidance, e.g. "gnn-bce-10".
+    seed : int
+    train_planner_name : str
+    cmpl_rules : str
+        Complementary rules file.
+    relx_rules : str
+        Relaxation rules file.
+    relevance_prefilter : bool
+        Drop the objects that cannot contribute to the goal before scoring
+        them, see planning.my_planner.restrict_to_relevant_objects.
+    """
+    def __init__(self, domain_name, planner_types, test_planner_name,
+                 guider_name, seed, train_planner_name="", cmpl_rules=None,
+                 relx_rules=None, is_strips_domain=True,
+                 relevance_prefilter=False):
+        assert domain_name in PDDLGYM_ENV_NAMES
+        self.domain_name = PDDLGYM_ENV_NAMES[domain_name]
+        self.test_domain_name = self.domain_name + "Test"
+        self.seed = seed
+
+        print("Starting seed {}".format(seed), flush=True)
+        self.guider = create_guider(guider_name, train_planner_name,
+                                    1, is_strips_domain, 1, seed)
+        self.guider.seed(seed)
+        self.guider.train(self.domain_name)
+        planner = create_planner(test_planner_name)
+        self.planners = {
+            planner_type: create_planner_to_test(
+                planner_type, planner, self.guider, is_strips_domain, seed,
+                cmpl_rules, relx_rules, relevance_prefilter)
+            for planner_type in planner_types}
+
+        self.env = pddlgym.make("PDDLEnv{}-v0".format(self.test_domain_name))
+        self._problem_indices = {
+            os.path.basename(problem.problem_fname): problem_idx
+            for problem_idx, problem in enumerate(self.env.problems)}
+        # Grid size -> MiniGrid env, see minigrid_env
+        self._minigrid_envs = {}
+
+    def problem_index(self, problem_name):
+        """Index in env.problems of the problem with this file name.
+        """
+        try:
+            return self._problem_indices[os.path.basename(problem_name)]
+        except KeyError:
+            raise Exception("No test problem '{}' in domain {}.".format(
+                problem_name, self.test_domain_name)) from None
+
+    def problem_fname(self, problem_name):
+        return self.env.problems[self.problem_index(problem_name)].problem_fname
+
+    def reset(self, problem_name):
+        """Return the initial state of the problem, with a conjunctive goal.
+        """
+        self.env.fix_problem_index(self.problem_index(problem_name))
+        state, _ = self.env.reset()
+        if type(state.goal).__name__ == "Literal":
+            state = state.with_goal(LiteralConjunction([state.goal]))
+        return state
+
+    def solve(self, planner_type, problem_name, timeout):
+        """Solve and validate the problem with one of the session's planners.
+
+        Returns a result record (see main._solve_problem) with the plan
+        (empty if planning failed) and the planner's vis_info added. As
+        there, planning_time includes validation, and planning_time and
+        plan_length are only set for valid plans.
+        """
+        state = self.reset(problem_name)
+        problem_fname = self.problem_fname(problem_name)
+        result = {"domain": self.test_domain_name, "planner_type": planner_type,
+                  "seed": self.seed, "problem_idx": self.problem_index(problem_name),
+                  "problem": os.path.basename(problem_fname), "timeout": timeout,
+                  "outcome": None, "valid": None, "failure_reason": None,
+                  "planning_time": None, "plan_length": None,
+                  "plan": [], "vis_info": {}}
+        planner = self.planners[planner_type]
+        start = time.time()
+        try:
+            if planner_type == "pure":
+                plan, vis_info = planner(self.env.domain, state, timeout=timeout), {}
+            else:
+                plan, vis_info = planner(self.env.domain, state, timeout=timeout)
+        except (PlanningTimeout, PlanningFailure) as e:
+            print("\t\tPlanning failed with error: {}".format(e), flush=True)
+            result.update(outcome=e.__class__.__name__, failure_reason=str(e))
+            return result
+        result.update(object_counts(state, vis_info))
+        result.update(plan=plan, vis_info=vis_info)
+        # Validate plan on the full test problem.
+        if not validate_strips_plan(
+                domain_file=self.env.domain.domain_fname,
+                problem_file=problem_fname,
+                plan=plan):
+            print("\t\tPlanning returned an invalid plan")
+            result.update(outcome="InvalidPlan", valid=False)
+            return result
+        # As in main._solve_problem, the planning time includes validation
+        result.update(outcome="Success", valid=True, plan_length=len(plan),
+                      planning_time=time.time() - start)
+        print("Get plan of length {} in {:.5f} seconds".format(
+            result["plan_length"], result["planning_time"]), flush=True)
+        return result
+
+    def minigrid_env(self, grid, robot_direction):
+        """Return a MiniGrid MazeNamo env reset to the grid.
+
+        One env is created per grid size and reused for all problems.
+        """
+        return minigrid_env(grid, robot_direction, self._minigrid_envs)
@@ -0,0 +1,379 @@
+"""Fill difficulty buckets with random problems solved by a pool of FD workers.
+
+The generator scripts sample candidate problems in the main process and
+hand them to worker processes that only run Fast Downward. Each candidate is
+solved in its own temporary directory, so the problem file, the sas file and
+the files FD leaves in its working directory are never shared. Results are
+classified and saved by the main process as they come in, so the indices of
+a bucket stay consecutive, and all output files are written atomically.
+
+Problems are classified by the search effort FD reports (e.g. the number of
+expanded states) rather than by wall time, so the labels do not depend on
+the machine or its load. The effort thresholds of the buckets are calibrated
+per domain and problem size from a sample of random candidates (see
+calibrate_thresholds) and kept in a JSON file, so later runs reuse them.
+Calibration also records how long FD took on the candidates of each bucket;
+once the harder buckets are full, FD is stopped after the time the slowest
+open bucket needs (see generate_problems), instead of running candidates up
+to the full time limit only to discard them.
+"""
+
+import os
+import re
+import json
+import math
+import queue
+import shlex
+import shutil
+import signal
+import tempfile
+import subprocess
+import time
+import contextlib
+import multiprocessing
+import numpy as np
+from planning.fd import parse_search_statistics
+from my_utils.pddl_utils import _create_planner
+
+EFFORT_METRICS = ["expanded", "evaluated", "generated", "search_time"]
+# Quantile of the effort of random candidates at the lower bound ("min") and
+# the upper bound of each bucket. The hardest bucket is only bounded by the
+# FD time limit.
+DEFAULT_QUANTILES = {"min": 0.2, "easy": 0.45, "medium": 0.7, "hard": 0.9}
+# The time limit of an open bucket is the FD time of its slowest calibration
+# candidate, times the factor, plus the slack in seconds.
+TIME_LIMIT_FACTOR = 2.0
+TIME_LIMIT_SLACK = 1.0
+
+# Per-process planners and running FD command of the workers
+_planners = {}
+_running = {}
+
+
+def _terminate_worker(signum, frame):
+    # The FD command runs under timeout, which passes the signal on to all
+    # of FD's processes.
+    process = _running.get("process")
+    if process is not None and process.poll() is None:
+        process.terminate()
+    os._exit(1)
+
+
+def _init_worker():
+    signal.signal(signal.SIGTERM, _terminate_worker)
+
+
+def _solve_candidate(domain_file, pddl_str, timeout, planner_name, work_dir):
+    """Solve one candidate problem with FD in a temporary directory.
+    """
+    planner = _planners.get(planner_name)
+    if planner is None:
+        planner = _planners[planner_name] = _create_planner(planner_name)
+    job_dir = tempfile.mkdtemp(prefix="candidate_", dir=work_dir)
+    cwd = os.getcwd()
+    tempdir = tempfile.tempdir
+    os.chdir(job_dir)
+    tempfile.tempdir = job_dir
+    try:
+        problem_file = os.path.join(job_dir, "problem.pddl")
+        with open(problem_file, "w") as f:
+            f.write(pddl_str)
+        cmd_str = planner._get_cmd_str(domain_file, problem_file, timeout=timeout)
+        start_time = time.time()
+        process = _running["process"] = subprocess.Popen(
+            shlex.split(cmd_str), stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, text=True)
+        output, _ = process.communicate()
+        _running.pop("process")
+        time_cost = time.time() - start_time
+        planner._cleanup()
+    finally:
+        tempfile.tempdir = tempdir
+        os.chdir(cwd)
+        shutil.rmtree(job_dir, ignore_errors=True)
+    solved = "Solution found!" in output
+    plan = re.findall(r"(.+) \(\d+?\)", output.lower()) if solved else []
+    return {"solved": solved, "time_cost": time_cost, "plan": plan,
+            "statistics": parse_search_statistics(output)}
+
+
+def write_atomic(path, data):
+    """Write str or bytes to path so that readers never see a partial file.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def next_free_index(directory, prefix, suffix):
+    """One past the largest index of the files prefix{idx}suffix in directory.
+
+    Generation resumes there, so problems that were already generated keep
+    their indices.
+    """
+    pattern = re.compile(r"{}(\d+){}$".format(re.escape(prefix), re.escape(suffix)))
+    indices = [int(match.group(1)) for match in map(pattern.match, os.listdir(directory))
+               if match is not None]
+    return max(indices, default=-1) + 1
+
+
+def _num_available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def solve_candidates(sample, domain_file, planner_name="fd-lama-first",
+                     num_workers=None):
+    """Yield (candidate, result) for random candidates solved by FD workers.
+
+    sample() returns a tuple (candidate, pddl_str, timeout), or None if
+    sampling failed. Results are yielded in the order they come in. Closing
+    the generator stops the workers; use it with contextlib.closing.
+    """
+    if num_workers is None:
+        num_workers = _num_available_cores()
+    domain_file = os.path.abspath(domain_file)
+    # Job directories live here, so those of terminated workers are removed too
+    work_dir = tempfile.mkdtemp(prefix="problem_generation_")
+    results = queue.Queue()
+    ctx = multiprocessing.get_context("spawn")
+    pool = ctx.Pool(num_workers, initializer=_init_worker)
+    in_flight = 0
+    try:
+        while True:
+            # Keep every worker busy with a candidate.
+            while in_flight < num_workers:
+                sampled = sample()
+                if sampled is None:
+                    continue
+                candidate, pddl_str, timeout = sampled
+                pool.apply_async(
+                    _solve_candidate, (domain_file, pddl_str, timeout, planner_name, work_dir),
+                    callback=lambda result, candidate=candidate: results.put((candidate, result, None)),
+                    error_callback=lambda e: results.put((None, None, e)))
+                in_flight += 1
+            candidate, result, error = results.get()
+            in_flight -= 1
+            if error is not None:
+                raise error
+            yield candidate, result
+    finally:
+        # Stop the workers still solving candidates that are no longer needed.
+        pool.terminate()
+        pool.join()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def effort(result, metric):
+    """Search effort of a solved candidate, see EFFORT_METRICS.
+    """
+    value = result["statistics"][metric]
+    if value is None:
+        raise Exception("FD did not report '{}' for a solved problem.".format(metric))
+    return value
+
+
+def classify_effort(value, thresholds, modes):
+    """Return the mode whose effort range contains value, or None.
+
+    thresholds["bounds"] holds the lower bound "min" of the easiest mode and
+    the upper bound of each mode; a mode without upper bound is unbounded.
+    """
+    bounds = thresholds["bounds"]
+    lower = bounds["min"]
+    for mode in modes:
+        upper = bounds.get(mode, math.inf)
+        if lower <= value < upper:
+            return mode
+        lower = upper
+    return None
+
+
+def calibrate_thresholds(sample, accept, domain_file, modes, metric="expanded",
+                         num_samples=100, quantiles=None,
+                         planner_name="fd-lama-first", num_workers=None):
+    """Calibrate the effort thresholds of the modes on random candidates.
+
+    Parameters
+    ----------
+    sample : callable
+        See generate_problems; it is called with all modes open.
+    accept : callable
+        accept(candidate, result) tells whether a solved candidate could be
+        kept at all, e.g. whether its plan is long enough. Only the effort
+        of accepted candidates is used.
+    domain_file : str
+    modes : list of str
+        Modes from the easiest to the hardest.
+    metric : str
+        One of EFFORT_METRICS.
+    num_samples : int
+        Number of accepted candidates.
+    quantiles : dict, optional
+        Quantile of the effort at "min" and at the upper bound of each mode
+        but the hardest. Defaults to DEFAULT_QUANTILES.
+    planner_name : str
+    num_workers : int, optional
+
+    Returns
+    -------
+    thresholds : dict
+        With the keys "metric", "bounds", "planner", "num_samples" and
+        "time_limits", the FD time limit in seconds of each mode but the
+        hardest, for when it is the hardest open mode.
+    """
+    assert metric in EFFORT_METRICS, "Unknown effort metric '{}'.".format(metric)
+    quantiles = quantiles or DEFAULT_QUANTILES
+    values = []
+    time_costs = []
+    with contextlib.closing(solve_candidates(lambda: sample(modes), domain_file,
+                                             planner_name, num_workers)) as solved:
+        for candidate, result in solved:
+            # Unsolved candidates only tell that the hardest bucket is unbounded.
+            if not result["solved"] or not accept(candidate, result):
+                continue
+            values.append(effort(result, metric))
+            time_costs.append(result["time_cost"])
+            print(f"Calibration sample {len(values)}/{num_samples}: "
+                  f"{metric} {values[-1]}.", flush=True)
+            if len(values) == num_samples:
+                break
+    bounds = {name: float(np.quantile(values, quantile))
+              for name, quantile in quantiles.items()}
+    # A mode's candidates are those below its upper bound, so a limit fit for
+    # the slowest of them also covers the easier modes.
+    values, time_costs = np.array(values), np.array(time_costs)
+    time_limits = {}
+    for mode in modes[:-1]:
+        below = time_costs[values < bounds[mode]]
+        if len(below):
+            time_limits[mode] = float(below.max()*TIME_LIMIT_FACTOR + TIME_LIMIT_SLACK)
+    return {"metric": metric, "bounds": bounds, "planner": planner_name,
+            "num_samples": len(values), "time_limits": time_limits}
+
+
+def load_or_calibrate_thresholds(thresholds_file, key, sample, accept, domain_file,
+                                 modes, metric="expanded", num_samples=100,
+                                 planner_name="fd-lama-first", num_workers=None,
+                                 recalibrate=False):
+    """Return the thresholds stored under key, calibrating them if needed.
+
+    The thresholds file maps keys such as "mazenamo_12x12" to the result of
+    calibrate_thresholds. Thresholds are calibrated again if they are
+    missing, were calibrated for another metric or planner, have no time
+    limits yet, or recalibrate is set, and are then stored in the file.
+    """
+    stored = {}
+    if os.path.exists(thresholds_file):
+        with open(thresholds_file) as f:
+            stored = json.load(f)
+    thresholds = stored.get(key)
+    if thresholds is not None and not recalibrate and "time_limits" in thresholds and \
+            thresholds["metric"] == metric and thresholds["planner"] == planner_name:
+        return thresholds
+    print(f"Calibrating {metric} thresholds of {key} on {num_samples} random problems.",
+          flush=True)
+    thresholds = calibrate_thresholds(sample, accept, domain_file, modes, metric,
+                                      num_samples, planner_name=planner_name,
+                                      num_workers=num_workers)
+    print(f"Thresholds of {key}: {thresholds['bounds']}", flush=True)
+    stored[key] = thresholds
+    write_atomic(thresholds_file, json.dumps(stored, indent=2, sort_keys=True) + "\n")
+    return thresholds
+
+
+def problem_metrics(mode, result, thresholds):
+    """Difficulty label and search effort of a problem, saved along with it.
+    """
+    return dict(result["statistics"], mode=mode, metric=thresholds["metric"],
+                planner=thresholds["planner"], plan_length=len(result["plan"]),
+                time_cost=result["time_cost"])
+
+
+def generate_problems(sample, classify, save, modes, max_per_mode, domain_file,
+                      planner_name="fd-lama-first", num_workers=None,
+                      start_indices=None, time_limits=None):
+    """Generate problems until every difficulty bucket is full.
+
+    Parameters
+    ----------
+    sample : callable
+        sample(open_modes) returns a tuple (candidate, pddl_str, timeout)
+        for a new random problem, or None if sampling failed. open_modes are
+        the modes whose buckets are not full yet.
+    classify : callable
+        classify(candidate, result) returns the mode of a solved candidate,
+        or None to discard it. result is a dict with the keys "solved",
+        "time_cost", "plan" and "statistics" (see
+        planning.fd.parse_search_statistics).
+    save : callable
+        save(mode, idx, candidate, result) writes the outputs of a problem;
+        see write_atomic.
+    modes : list of str
+    max_per_mode : int
+    domain_file : str
+    planner_name : str
+    num_workers : int, optional
+        Defaults to the number of available cores.
+    start_indices : dict, optional
+        First index per mode, see next_free_index.
+    time_limits : dict, optional
+        FD time limit per mode, see calibrate_thresholds. The timeout of a
+        candidate is capped by the limit of the hardest open mode.
+
+    Returns
+    -------
+    problem_idx : dict
+        One past the last index per mode.
+    """
+    problem_idx = {mode: 0 for mode in modes}
+    problem_idx.update(start_indices or {})
+
+    def open_modes():
+        return [mode for mode in modes if problem_idx[mode] < max_per_mode]
+
+    def sample_open():
+        hardest_open = open_modes()[-1]
+        sampled = sample(open_modes())
+        if sampled is None or hardest_open not in (time_limits or {}):
+            return sampled
+        candidate, pddl_str, timeout = sampled
+        return candidate, pddl_str, min(timeout, time_limits[hardest_open])
+
+    if not open_modes():
+        return problem_idx
+    with contextlib.closing(solve_candidates(sample_open, domain_file,
+                                             planner_name, num_workers)) as solved:
+        for candidate, result in solved:
+            if not result["solved"]:
+                print(f"Plan not found with FD! Spent {result['time_cost']:.2f}s.")
+                continue
+            mode = classify(candidate, result)
+            if mode is None:
+                continue
+            if problem_idx[mode] >= max_per_mode:
+                print(f"Too many {mode} problems!")
+                continue
+            save(mode, problem_idx[mode], candidate, result)
+            print(f"Find a/an {mode} problem! Solved in {result['time_cost']:.2f}s. "
+                  f"Plan length {len(result['plan'])}. Index {problem_idx[mode]}.", flush=True)
+            problem_idx[mode] += 1
+            if problem_idx[mode] == max_per_mode:
+                print(f"All {max_per_mode} {mode} problems generated.", flush=True)
+                # The hardest open mode is easier than this one from now on
+                hardest_open = open_modes()[-1] if open_modes() else None
+                if hardest_open is not None and hardest_open in (time_limits or {}) \
+                        and modes.index(hardest_open) < modes.index(mode):
+                    print(f"FD time limit lowered to {time_limits[hardest_open]:.1f}s "
+                          f"for {hardest_open} problems.", flush=True)
+            if not open_modes():
+                break
+    return problem_idx
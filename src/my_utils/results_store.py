@@ -0,0 +1,260 @@
+"""SQLite store of per-problem benchmark results.
+
+One row is kept per (domain, method, seed, problem), so interrupted sweeps
+can be resumed by skipping the completed entries, and runs of different
+methods can be compared problem by problem. Run
+
+    python src/my_utils/results_store.py summary results.db
+
+to print success rates, planning time statistics and IPC-style scores.
+"""
+
+import os
+import json
+import math
+import time
+import sqlite3
+import argparse
+import numpy as np
+
+COLUMNS = [
+    ("domain", "TEXT NOT NULL"),
+    ("method", "TEXT NOT NULL"),
+    ("seed", "INTEGER NOT NULL"),
+    ("problem", "TEXT NOT NULL"),
+    ("problem_idx", "INTEGER"),
+    ("planner_type", "TEXT"),
+    ("outcome", "TEXT"),
+    ("valid", "INTEGER"),
+    ("failure_reason", "TEXT"),
+    ("planning_time", "REAL"),
+    ("plan_length", "INTEGER"),
+    ("timeout", "REAL"),
+    ("num_objects", "INTEGER"),
+    ("num_goal_objects", "INTEGER"),
+    ("num_gnn_objects", "INTEGER"),
+    ("num_gnn_iterations", "INTEGER"),
+    ("num_relx_objects", "INTEGER"),
+    ("num_cmpl_objects", "INTEGER"),
+    ("stage_times", "TEXT"),
+    ("cpu", "INTEGER"),
+    ("recorded_at", "REAL"),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+# Columns stored as JSON text
+JSON_COLUMNS = {"stage_times"}
+
+
+def method_name(planner_type, test_planner_name, guider_name,
+                relevance_prefilter=False):
+    """Label of a planner configuration, e.g. 'flax/fd-lama-first/gnn-bce-10',
+    or 'flax+relevance/fd-lama-first/gnn-bce-10' with the relevance prefilter.
+    """
+    if relevance_prefilter:
+        planner_type += "+relevance"
+    return "{}/{}/{}".format(planner_type, test_planner_name, guider_name)
+
+
+def object_counts(state, vis_info):
+    """Number of objects the planner kept at each stage.
+    """
+    counts = {"num_objects": len(state.objects)}
+    if not vis_info:
+        return counts
+    counts["num_goal_objects"] = len(vis_info["force_include_goal_objects"])
+    counts["num_gnn_iterations"] = len(vis_info["gnn_ignored_objects_threshold_dict"])
+    for stage in ["gnn", "relx", "cmpl"]:
+        ignored_objects = vis_info.get("{}_ignored_objects".format(stage))
+        if ignored_objects is not None:
+            counts["num_{}_objects".format(stage)] = len(state.objects) - len(ignored_objects)
+    return counts
+
+
+def plan_record(plan, vis_info):
+    """JSON-serializable plan and vis_info of a solved problem.
+
+    Actions and objects are kept as their pddlgym strings, e.g.
+    'moveforwardwhenup(r:robot,p12:pos,p13:pos)' and 'o12:obstacle'. The
+    objects ignored per GNN threshold become [threshold, objects] pairs, since
+    JSON keys are strings. See my_utils.plan_rendering for a reader.
+    """
+    def objects(objs):
+        return None if objs is None else sorted(str(obj) for obj in objs)
+
+    record = {}
+    for key, value in (vis_info or {}).items():
+        if key == "object_to_score":
+            value = {str(obj): float(score) for obj, score in value.items()}
+        elif key == "gnn_ignored_objects_threshold_dict":
+            value = [[float(threshold), objects(objs)] for threshold, objs in value.items()]
+        elif key == "relaxed_plan":
+            value = None if value is None else [str(action) for action in value]
+        else:
+            value = objects(value)
+        record[key] = value
+    return {"plan": [str(action) for action in plan], "vis_info": record}
+
+
+class ResultsStore:
+    """Per-problem results of benchmark runs in an SQLite database.
+
+    Parameters
+    ----------
+    path : str
+        Database file, created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        # WAL lets a summary be computed while a sweep is still writing
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS results ({}, "
+                           "PRIMARY KEY (domain, method, seed, problem))".format(
+                               ", ".join("{} {}".format(name, decl)
+                                         for name, decl in COLUMNS)))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, method, result):
+        """Insert or replace the row of one solved (or failed) problem.
+
+        The result is a record as returned by main._solve_problem; keys that
+        are not columns are ignored.
+        """
+        row = dict(result, method=method, recorded_at=time.time())
+        values = []
+        for name in COLUMN_NAMES:
+            value = row.get(name)
+            if name in JSON_COLUMNS and value is not None:
+                value = json.dumps(value)
+            elif isinstance(value, bool):
+                value = int(value)
+            values.append(value)
+        self._conn.execute("INSERT OR REPLACE INTO results ({}) VALUES ({})".format(
+            ", ".join(COLUMN_NAMES), ", ".join("?" * len(COLUMN_NAMES))), values)
+        # Commit every row so an interrupted sweep loses at most one problem
+        self._conn.commit()
+
+    def load(self, domain=None, method=None, seed=None, problem=None):
+        """Return the stored results as dicts, optionally filtered.
+        """
+        conditions, params = [], []
+        for name, value in (("domain", domain), ("method", method), ("seed", seed),
+                            ("problem", problem)):
+            if value is not None:
+                conditions.append("{} = ?".format(name))
+                params.append(value)
+        query = "SELECT * FROM results"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY domain, method, seed, problem_idx, problem"
+        results = []
+        for row in self._conn.execute(query, params):
+            result = dict(row)
+            for name in JSON_COLUMNS:
+                if result[name] is not None:
+                    result[name] = json.loads(result[name])
+            if result["valid"] is not None:
+                result["valid"] = bool(result["valid"])
+            results.append(result)
+        return results
+
+    def get(self, domain, method, seed, problem):
+        """Return the stored result of one problem, or None.
+        """
+        results = self.load(domain=domain, method=method, seed=seed, problem=problem)
+        return results[0] if results else None
+
+    def summary(self, domain=None):
+        """Return one row of statistics per (domain, method).
+
+        Times are over solved problems only. The IPC scores follow the
+        satisficing tracks, averaged over seeds: a solved problem scores
+        best_length/plan_length for quality, where best_length is the
+        shortest plan any stored method found, and 1 - log(t)/log(timeout)
+        (1 if t <= 1 second) for agile planning.
+        """
+        results = self.load(domain=domain)
+        best_length = {}
+        for result in results:
+            if result["outcome"] == "Success":
+                key = (result["domain"], result["problem"])
+                best_length[key] = min(best_length.get(key, math.inf),
+                                       result["plan_length"])
+        groups = {}
+        for result in results:
+            groups.setdefault((result["domain"], result["method"]), []).append(result)
+        rows = []
+        for (domain, method), group in sorted(groups.items()):
+            solved = [result for result in group if result["outcome"] == "Success"]
+            times = np.array([result["planning_time"] for result in solved])
+            num_seeds = len({result["seed"] for result in group})
+            quality = sum(best_length[(domain, result["problem"])]/max(result["plan_length"], 1)
+                          if result["plan_length"] else 1.
+                          for result in solved)
+            agile = sum(_agile_score(result["planning_time"], result["timeout"])
+                        for result in solved)
+            rows.append({
+                "domain": domain,
+                "method": method,
+                "seeds": num_seeds,
+                "runs": len(group),
+                "solved": len(solved),
+                "success_rate": len(solved)/len(group),
+                "mean_time": float(times.mean()) if len(times) else None,
+                "median_time": float(np.median(times)) if len(times) else None,
+                "p95_time": float(np.percentile(times, 95)) if len(times) else None,
+                "mean_plan_length": float(np.mean([result["plan_length"] for result in solved]))
+                                    if solved else None,
+                "ipc_quality": quality/num_seeds,
+                "ipc_agile": agile/num_seeds,
+            })
+        return rows
+
+
+def _agile_score(planning_time, timeout):
+    if planning_time <= 1 or timeout is None or timeout <= 1:
+        return 1.
+    return max(0., 1 - math.log(planning_time)/math.log(timeout))
+
+
+def print_summary(rows):
+    header = ["domain", "method", "seeds", "runs", "solved", "success_rate",
+              "mean_time", "median_time", "p95_time", "mean_plan_length",
+              "ipc_quality", "ipc_agile"]
+    table = [header]
+    for row in rows:
+        table.append(["-" if row[name] is None else
+                      "{:.3f}".format(row[name]) if isinstance(row[name], float) else
+                      str(row[name]) for name in header])
+    widths = [max(len(line[i]) for line in table) for i in range(len(header))]
+    for line in table:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="print statistics per domain and method")
+    summary_parser.add_argument("db", type=str)
+    summary_parser.add_argument("--domain", type=str, default=None)
+    summary_parser.add_argument("--json", action="store_true",
+                                help="print the rows as JSON instead of a table")
+    args = parser.parse_args()
+
+    assert os.path.exists(args.db), "No results database at {}".format(args.db)
+    with ResultsStore(args.db) as store:
+        rows = store.summary(domain=args.domain)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_summary(rows)
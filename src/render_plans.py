@@ -0,0 +1,40 @@
+import argparse
+import time
+from my_utils.plan_rendering import load_plan_records, render_records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render the plans stored by main.py --save_plans without a display.")
+    parser.add_argument("results_file", type=str,
+                        help="JSON lines file written by main.py --results_file")
+    parser.add_argument("--problem_size", required=True, type=int)
+    parser.add_argument("--problem_mode", required=True, type=str)
+    parser.add_argument("--map_dir", type=str, default=None,
+                        help="defaults to the maps of the problem size and mode")
+    parser.add_argument("--planner_type", type=str, nargs="*", default=None)
+    parser.add_argument("--seed", type=int, nargs="*", default=None)
+    parser.add_argument("--vis_log_dir", type=str, default="vis")
+    parser.add_argument("--video_format", type=str, default="gif", choices=["gif", "mp4"])
+    parser.add_argument("--fps", type=int, default=5)
+    parser.add_argument("--tile_size", type=int, default=32)
+    parser.add_argument("--draw_scores", default=False, action="store_true",
+                        help="also draw the GNN scores and the objects ignored at each threshold")
+    parser.add_argument("--num_workers", type=int, default=1)
+    args = parser.parse_args()
+
+    map_dir = args.map_dir or (f"pddl_files/problems/mazenamo_problems/"
+                               f"map_{args.problem_size}x{args.problem_size}_{args.problem_mode}")
+    records, num_without_plan = load_plan_records(args.results_file, args.planner_type, args.seed)
+    if num_without_plan:
+        print(f"Skipping {num_without_plan} solved problems without a stored plan, "
+              f"run main.py with --save_plans.", flush=True)
+    print(f"Rendering {len(records)} plans on {args.num_workers} workers...", flush=True)
+    start = time.time()
+    for num_done, written in enumerate(render_records(
+            records, map_dir, args.vis_log_dir, num_workers=args.num_workers,
+            prefix=f"namo_{args.problem_size}x{args.problem_size}_{args.problem_mode}",
+            video_format=args.video_format, fps=args.fps, tile_size=args.tile_size,
+            draw_scores=args.draw_scores), start=1):
+        print(f"[{num_done}/{len(records)}] {written[-1]}", flush=True)
+    print(f"Rendered {len(records)} plans in {time.time() - start:.2f}s.", flush=True)
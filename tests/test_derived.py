@@ -0,0 +1,103 @@
+"""Derived predicates maintained by DerivedLiteralEvaluator must match the
+fixpoint of the rules.
+"""
+import os
+
+from pddlgym.core import PDDLEnv
+
+DOMAIN = """
+(define (domain doors)
+  (:requirements :strips :typing :derived-predicates)
+  (:types room)
+  (:predicates
+    (blocked ?a - room)
+    (connected ?a - room ?b - room)
+    (free ?a - room)
+    (reachable ?a - room ?b - room)
+  )
+  (:derived (free ?a) (not (blocked ?a)))
+  (:derived (reachable ?a ?b)
+    (or (and (connected ?a ?b) (free ?b))
+        (exists (?c - room) (and (reachable ?a ?c) (connected ?c ?b) (free ?b)))))
+  (:action block
+    :parameters (?a - room)
+    :precondition (and (free ?a))
+    :effect (and (blocked ?a)))
+  (:action unblock
+    :parameters (?a - room)
+    :precondition (and (blocked ?a))
+    :effect (and (not (blocked ?a))))
+)
+"""
+
+PROBLEM = """
+(define (problem doors1)
+  (:domain doors)
+  (:objects r1 r2 r3 r4 - room)
+  (:init {})
+  (:goal (and (reachable r1 r4)))
+)
+"""
+
+
+def _make_env(tmp_path, init):
+    domain_file = os.path.join(tmp_path, "doors.pddl")
+    problem_dir = os.path.join(tmp_path, "doors")
+    os.makedirs(problem_dir)
+    with open(domain_file, "w") as f:
+        f.write(DOMAIN)
+    with open(os.path.join(problem_dir, "problem1.pddl"), "w") as f:
+        f.write(PROBLEM.format(init))
+    env = PDDLEnv(domain_file, problem_dir, operators_as_actions=True,
+                  problem_cache_dir=os.path.join(tmp_path, "cache"))
+    assert env._derived_evaluator is not None
+    return env
+
+
+def _facts(literals, name):
+    return {tuple(obj.name for obj in lit.variables) for lit in literals
+            if lit.predicate.name == name}
+
+
+def _expected(state):
+    """Fixpoint of the doors rules, computed directly.
+    """
+    rooms = {obj.name for obj in state.objects}
+    free = {(a,) for a in rooms} - _facts(state.literals, "blocked")
+    connected = _facts(state.literals, "connected")
+    reachable = {(a, b) for a, b in connected if (b,) in free}
+    while True:
+        new = {(a, b) for a, c in reachable for c2, b in connected
+               if c == c2 and (b,) in free} - reachable
+        if not new:
+            break
+        reachable |= new
+    return ({"free({}:room)".format(a) for a, in free} |
+            {"reachable({}:room,{}:room)".format(a, b) for a, b in reachable})
+
+
+def _derived(literals):
+    return {str(lit) for lit in literals if lit.predicate.is_derived}
+
+
+def test_negation_only_rule_in_initial_state(tmp_path):
+    # No blocked fact at all, so every room is free from the start
+    env = _make_env(str(tmp_path), "(connected r1 r2) (connected r2 r3)")
+    state, _ = env.reset()
+    assert {"free(r1:room)", "free(r2:room)", "free(r3:room)",
+            "free(r4:room)"} <= _derived(state.literals)
+    assert _derived(state.literals) == _expected(state)
+
+
+def test_incremental_updates_match_recomputation(tmp_path):
+    env = _make_env(str(tmp_path), "(connected r1 r2) (connected r2 r3) "
+                                   "(connected r3 r4) (blocked r3)")
+    state, _ = env.reset()
+    assert _derived(state.literals) == _expected(state)
+    assert "free(r3:room)" not in _derived(state.literals)
+    for action_str in ["unblock(r3:room)", "block(r2:room)", "unblock(r2:room)",
+                       "block(r4:room)"]:
+        action = next(a for a in env.action_space.all_ground_literals(state)
+                      if str(a) == action_str)
+        state, _, _, _ = env.step(action)
+        assert _derived(state.literals) == _expected(state), action_str
@@ -0,0 +1,56 @@
+"""The relevance prefilter must keep every object a plan needs and drop the
+objects that cannot contribute to the goal.
+"""
+import os
+
+from pddlgym.core import PDDLEnv
+from planning.my_planner import restrict_to_relevant_objects
+
+DOMAIN = """
+(define (domain rooms)
+  (:requirements :strips :typing)
+  (:types room lamp)
+  (:predicates
+    (at ?r - room)
+    (connected ?a - room ?b - room)
+    (on ?l - lamp)
+  )
+  (:action move
+    :parameters (?a - room ?b - room)
+    :precondition (and (at ?a) (connected ?a ?b))
+    :effect (and (at ?b) (not (at ?a))))
+  (:action switch
+    :parameters (?l - lamp)
+    :precondition (and)
+    :effect (and (on ?l)))
+)
+"""
+
+PROBLEM = """
+(define (problem rooms1)
+  (:domain rooms)
+  (:objects r1 r2 r3 - room l1 l2 - lamp)
+  (:init (at r1) (connected r1 r2) (connected r2 r3))
+  (:goal (and (at r3)))
+)
+"""
+
+
+def test_prefilter_drops_only_irrelevant_objects(tmp_path):
+    tmp_path = str(tmp_path)
+    domain_file = os.path.join(tmp_path, "rooms.pddl")
+    problem_dir = os.path.join(tmp_path, "rooms")
+    os.makedirs(problem_dir)
+    with open(domain_file, "w") as f:
+        f.write(DOMAIN)
+    with open(os.path.join(problem_dir, "problem1.pddl"), "w") as f:
+        f.write(PROBLEM)
+    env = PDDLEnv(domain_file, problem_dir, operators_as_actions=True,
+                  problem_cache_dir=None)
+    state, _ = env.reset()
+
+    restricted = restrict_to_relevant_objects(env.domain, state)
+    # The plan move(r1, r2), move(r2, r3) only uses the rooms
+    assert {obj.name for obj in restricted.objects} == {"r1", "r2", "r3"}
+    assert restricted.literals == state.literals
+    assert restricted.goal == state.goal